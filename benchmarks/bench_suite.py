@@ -0,0 +1,482 @@
+#!/usr/bin/env python
+
+"""Benchmark the preprocessing, ngram and tagging hot paths on synthetic social media corpora, reporting the
+throughput and peak traced memory of each case and comparing them against a stored baseline
+
+    python benchmarks/bench_suite.py --sizes 10k 100k --save-baseline
+    python benchmarks/bench_suite.py --sizes 10k 100k --compare
+
+Every result also stores a digest of the output of its case, so a change in the results of the code is caught as
+well as a change in its speed. The corpora and stopwords are built by the suite, so the digests only depend on the
+code and the library versions (except tag_snippet, whose sentence splitting depends on the installed nltk punkt data
+and which is not digested). A case whose nltk data is not installed is reported as skipped, the reference baseline
+was measured without the punkt data so it has no tag_snippet results.
+
+A reference baseline for the 10k and 100k corpora is kept in benchmarks/baseline.json with the library versions and
+machine it was measured on. Its digests hold on any machine with the same library versions, its timings only on the
+reference machine: save a baseline of your own (--baseline my_baseline.json --save-baseline) before comparing
+timings elsewhere. A full run including the 1m corpus takes around an hour, --cases selects a subset.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from pos_ngrams.n_grams.main import NGrams
+from pos_ngrams.n_grams.processes import fortify_ngrams_with_ids, generate_ngrams
+from pos_ngrams.pos_train import train_pos_tagger
+from pos_ngrams.preprocessing.preprocess import preprocess_df
+from pos_ngrams.processing.pos_tagging import tag_snippet
+from pos_ngrams.processing.stopwords import StopwordFilter
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+SIZES = {'10k': 10000, '100k': 100000, '1m': 1000000}
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'baseline.json')
+BENCHMARK_TAGGER = 'benchmark_tagger'
+# tag_snippet tags one snippet per call, so it runs over a fixed number of rows at every size
+TAG_SNIPPET_ROWS = 20000
+
+COMMON_WORDS = ("the be to of and a in that have i it for not on with he as you do at this but his by from they we "
+                "say her she or an will my one all would there their what so up out if about who get which go me "
+                "when make can like time no just him know take people into year your good some could them see other "
+                "than then now look only come its over think also back after use two how our work first well way "
+                "even new want because any these give day most us love great happy party art running jumped played "
+                "watching loved games music movie friends weekend tonight today amazing best").split()
+SIMPLIFIED_TAGS = ['NN', 'VB', 'AD', 'AV', 'NU', 'PN', 'QL', 'NP', 'OT']
+# Cases whose output depends on installed data rather than only on the code and library versions
+UNDIGESTED_CASES = ['tag_snippet']
+DIGEST_DECIMALS = 6
+VERSIONED_PACKAGES = ['numpy', 'scipy', 'pandas', 'sklearn', 'nltk']
+
+
+class SyntheticCorpus():
+    """
+    A reproducible synthetic social media corpus: Zipf distributed words with hashtags, at mentions, urls and
+    punctuation mixed in, and a pos tuple version of the same rows where each word has one of two tags
+    """
+
+    def __init__(self, n_rows, vocab_size=20000, mean_length=12, seed=0):
+        """
+
+        :param n_rows: Int, number of rows
+        :param vocab_size: Int, number of distinct words
+        :param mean_length: Int, mean number of words per row
+        :param seed: Int, random seed
+        """
+
+        random_state = np.random.RandomState(seed)
+        vocab = COMMON_WORDS + ['%s%s' % (COMMON_WORDS[i % len(COMMON_WORDS)], _suffix(i))
+                                for i in range(vocab_size - len(COMMON_WORDS))]
+        probabilities = 1. / np.arange(1, len(vocab) + 1)
+        probabilities /= probabilities.sum()
+
+        self.n_rows = n_rows
+        self.vocab = np.array(vocab, dtype=object)
+        self.lengths = np.maximum(random_state.poisson(mean_length, n_rows), 1)
+        self.starts = np.cumsum(self.lengths) - self.lengths
+        self.word_ids = random_state.choice(len(vocab), size=int(self.lengths.sum()), p=probabilities)
+        self.word_tags = random_state.randint(len(SIMPLIFIED_TAGS), size=(len(vocab), 2))
+
+        # A word takes its second tag after a qualifier or pronoun, so the tags depend on their context
+        first_tags = self.word_tags[self.word_ids, 0]
+        previous_tags = np.concatenate([[-1], first_tags[:-1]])
+        previous_tags[self.starts] = -1
+        self.tag_choice = np.isin(previous_tags, [SIMPLIFIED_TAGS.index('QL'), SIMPLIFIED_TAGS.index('PN')])
+
+        tokens = self.vocab[self.word_ids]
+        draws = random_state.rand(len(tokens))
+        hashtags = np.flatnonzero(draws < .03)
+        mentions = np.flatnonzero((draws >= .03) & (draws < .05))
+        urls = np.flatnonzero((draws >= .05) & (draws < .06))
+        punctuated = np.flatnonzero((draws >= .06) & (draws < .14))
+        tokens[hashtags] = ['#' + token for token in tokens[hashtags].tolist()]
+        tokens[mentions] = ['@user%d' % user for user in random_state.randint(5000, size=len(mentions)).tolist()]
+        tokens[urls] = ['https://t.co/%x' % link for link in random_state.randint(1 << 30, size=len(urls)).tolist()]
+        tokens[punctuated] = [token + '!?,.'[i % 4] for i, token in enumerate(tokens[punctuated].tolist())]
+        self._tokens = tokens.tolist()
+
+    def text(self):
+        """
+        :return: List of the text snippets
+        """
+
+        tokens = self._tokens
+        return [" ".join(tokens[start:start + length])
+                for start, length in zip(self.starts.tolist(), self.lengths.tolist())]
+
+    def pos_tuples(self):
+        """
+        :return: List with the list of (word, tag) tuples of each row, repeated pairs share one tuple
+        """
+
+        tags = np.array(SIMPLIFIED_TAGS, dtype=object)[self.word_tags]
+        pairs = np.empty(2 * len(self.vocab), dtype=object)
+        pairs[:] = list(zip(np.repeat(self.vocab, 2).tolist(), tags.ravel().tolist()))
+        pairs = pairs[2 * self.word_ids + self.tag_choice].tolist()
+        return [pairs[start:start + length] for start, length in zip(self.starts.tolist(), self.lengths.tolist())]
+
+    def data(self, pos_tuples=False):
+        """
+        :param pos_tuples: Bool, build the Snippet column from the pos tuples rather than the text
+
+        :return: Pandas dataframe with Snippet, Sentiment and Reach columns
+        """
+
+        import pandas as pd
+
+        random_state = np.random.RandomState(self.n_rows)
+        snippets = self.pos_tuples() if pos_tuples else self.text()
+        return pd.DataFrame({'Snippet': pd.Series(snippets, dtype=object),
+                             'Sentiment': random_state.uniform(-1, 1, self.n_rows),
+                             'Reach': random_state.randint(0, 1000, self.n_rows)})
+
+
+STOPWORD_FILTER = StopwordFilter.from_words(COMMON_WORDS[:60])
+
+
+class Fixtures():
+    """
+    The untimed inputs of the cases at one corpus size, each is built once when a case first needs it
+    """
+
+    def __init__(self, n_rows, seed=0):
+        self.n_rows = n_rows
+        self.corpus = SyntheticCorpus(n_rows, seed=seed)
+        self._built = {}
+
+    def get(self, name):
+        if name not in self._built:
+            self._built[name] = getattr(self, '_build_' + name)()
+        return self._built[name]
+
+    def _build_text_data(self):
+        return self.corpus.data()
+
+    def _build_pos_data(self):
+        return self.corpus.data(pos_tuples=True)
+
+    def _build_preprocessed(self):
+        return preprocess_df(self.get('text_data').copy(), columns=['Preprocessed'], stopword_filter=STOPWORD_FILTER)
+
+    def _build_ngrams(self):
+        ngrams = NGrams(self.get('preprocessed'), text_field_key='Preprocessed')
+        ngrams.ngram_pipeline(min_gram=1, max_gram=3, tfidf=False)
+        return ngrams
+
+
+def bench_preprocess_df(fixtures):
+    data = fixtures.get('text_data')
+    return lambda: preprocess_df(data.copy(), stopword_filter=STOPWORD_FILTER), len(data)
+
+
+def bench_preprocess_df_pos(fixtures):
+    data = fixtures.get('pos_data')
+    return lambda: preprocess_df(data.copy(), pos_tuples=True, stopword_filter=STOPWORD_FILTER), len(data)
+
+
+def bench_generate_ngrams_count(fixtures):
+    data = fixtures.get('preprocessed')
+    return lambda: _ngrams_output(generate_ngrams(data, 2, 4, 'Preprocessed', tfidf=False)), len(data)
+
+
+def bench_generate_ngrams_tfidf(fixtures):
+    data = fixtures.get('preprocessed')
+    return lambda: _ngrams_output(generate_ngrams(data, 2, 4, 'Preprocessed', tfidf=True)), len(data)
+
+
+def _ngrams_output(generated):
+    ngrams, word_frequency_matrix, cv = generated
+    return ngrams.ngrams, ngrams.counts, word_frequency_matrix
+
+
+def bench_fortify_ngrams_with_ids(fixtures):
+    ngrams = fixtures.get('ngrams')
+    ngrams_df = ngrams.ngrams_df
+    return (lambda: fortify_ngrams_with_ids(ngrams_df.copy(), ngrams.word_frequency_matrix, take_top_x=300),
+            fixtures.n_rows)
+
+
+def bench_search_on_word(fixtures):
+    ngrams = fixtures.get('ngrams')
+    words = [word for word in ngrams.ngram_table.ngrams[:1000] if ' ' not in word][:100]
+
+    def search():
+        found = []
+        for word in words:
+            ngrams.search_on_word(word, stemmed_ngrams=False)
+            found.append(ngrams.filtered_ngrams_df['Index'].values)
+        return found
+
+    return search, len(words)
+
+
+def bench_tag_snippet(fixtures):
+    snippets = fixtures.get('text_data')['Snippet'].values.tolist()[:TAG_SNIPPET_ROWS]
+
+    def tag():
+        return [tag_snippet(snippet, 'simplified_en') for snippet in snippets]
+
+    return tag, len(snippets)
+
+
+def bench_train_pos_tagger(fixtures):
+    corpus = fixtures.corpus.pos_tuples()
+
+    def train():
+        with tempfile.TemporaryDirectory() as directory:
+            train_pos_tagger(name=BENCHMARK_TAGGER, corpus=corpus, compact=True, seed=0, cache=False, path=directory)
+            path = os.path.join(directory, BENCHMARK_TAGGER)
+            return [np.load(os.path.join(path, file_name)) for file_name in sorted(os.listdir(path))
+                    if file_name.endswith('.npy')]
+
+    return train, len(corpus)
+
+
+CASES = [('preprocess_df', bench_preprocess_df),
+         ('preprocess_df_pos', bench_preprocess_df_pos),
+         ('generate_ngrams_count', bench_generate_ngrams_count),
+         ('generate_ngrams_tfidf', bench_generate_ngrams_tfidf),
+         ('fortify_ngrams_with_ids', bench_fortify_ngrams_with_ids),
+         ('search_on_word', bench_search_on_word),
+         ('tag_snippet', bench_tag_snippet),
+         ('train_pos_tagger', bench_train_pos_tagger)]
+
+
+def run_case(func, repeat, memory=True):
+    """
+    Time func and then trace its peak memory in a separate run, its printed output is discarded
+
+    :param func: The callable to benchmark
+    :param repeat: Int, timed runs, the best is reported
+    :param memory: Bool, also trace the peak memory (tracing is too slow to share a run with the timing)
+
+    :return: Best wall clock seconds, peak traced bytes (None if not traced) and the output of the first run
+    """
+
+    timings = []
+    output = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append(time.perf_counter() - start)
+            if not i:
+                output = result
+
+        peak = None
+        if memory:
+            tracemalloc.start()
+            try:
+                func()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+    return min(timings), peak, output
+
+
+def result_digest(output):
+    """
+    A digest of the output of a case that does not depend on the machine: containers are walked in order, integers
+    are widened and floats rounded to DIGEST_DECIMALS
+
+    :param output: Dataframes, series, sparse matrices, arrays, lists, tuples and scalars, nested in any way
+
+    :return: Hex string
+    """
+
+    digest = hashlib.sha1()
+    _update_digest(digest, output)
+    return digest.hexdigest()
+
+
+def _update_digest(digest, value):
+    import pandas as pd
+    from scipy import sparse
+
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr(list(value.columns)).encode('utf-8'))
+        for column in value.columns:
+            _update_digest(digest, value[column].values)
+        _update_digest(digest, np.asarray(value.index))
+    elif isinstance(value, pd.Series):
+        _update_digest(digest, value.values)
+    elif sparse.issparse(value):
+        matrix = sparse.csr_matrix(value, copy=True)
+        matrix.sum_duplicates()
+        digest.update(repr(matrix.shape).encode('utf-8'))
+        for array in [matrix.indptr, matrix.indices, matrix.data]:
+            _update_digest(digest, array)
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.kind, value.shape)).encode('utf-8'))
+        if value.dtype.kind == 'O':
+            _update_digest(digest, value.tolist())
+        elif value.dtype.kind == 'f':
+            # Adding zero turns the negative zeros left by rounding into zeros
+            digest.update((np.round(value.astype('<f8'), DIGEST_DECIMALS) + 0.).tobytes())
+        elif value.dtype.kind in 'biu':
+            digest.update(value.astype('<i8').tobytes())
+        else:
+            digest.update(repr(value.tolist()).encode('utf-8'))
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'[')
+        for item in value:
+            _update_digest(digest, item)
+        digest.update(b']')
+    elif isinstance(value, float):
+        digest.update(repr(round(value, DIGEST_DECIMALS) + 0.).encode('utf-8'))
+    else:
+        digest.update(repr(value).encode('utf-8'))
+
+
+def environment():
+    """
+    :return: Dict of the library versions and the machine the benchmark runs on
+    """
+
+    import importlib
+
+    versions = {'python': platform.python_version()}
+    for package in VERSIONED_PACKAGES:
+        versions[package] = importlib.import_module(package).__version__
+    return {'versions': versions,
+            'machine': {'platform': platform.platform(), 'processor': platform.processor() or platform.machine(),
+                        'cpus': os.cpu_count()}}
+
+
+def compare(result, baseline, tolerance, same_versions=True):
+    """
+    :param result: Dict of the seconds, peak_mb and digest of a case
+    :param baseline: Dict of the baseline seconds, peak_mb and digest of the case, None if there is none
+    :param tolerance: Float, the fraction a measure may grow by before it counts as a regression
+    :param same_versions: Bool, whether the baseline was measured with the same library versions, a changed digest
+    only counts as a regression if it was
+
+    :return: String describing the change from the baseline, and whether it is a regression
+    """
+
+    if baseline is None:
+        return 'no baseline', False
+
+    changes = []
+    regression = False
+    if result.get('digest') and baseline.get('digest') and result['digest'] != baseline['digest']:
+        changes.append('OUTPUT CHANGED' if same_versions else 'output changed (other library versions)')
+        regression = same_versions
+    for key, label in [('seconds', 'time'), ('peak_mb', 'mem')]:
+        if result.get(key) is None or not baseline.get(key):
+            continue
+        change = result[key] / baseline[key] - 1
+        changes.append('%s %+.0f%%' % (label, 100 * change))
+        regression = regression or change > tolerance
+    return ", ".join(changes), regression
+
+
+def _suffix(i):
+    return 'x' + np.base_repr(i, 36).lower()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=list(SIZES), choices=list(SIZES), help='Corpus sizes to run')
+    parser.add_argument('--cases', nargs='+', default=[name for name, case in CASES],
+                        choices=[name for name, case in CASES], help='Cases to run')
+    parser.add_argument('--repeat', type=int, default=1, help='Timed runs per case, the best is reported')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the traced peak memory run')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the corpora')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Path of the baseline json file')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='Compare the results against the baseline and '
+                                                               'exit with 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=.2,
+                        help='Fraction a measure may grow by over the baseline before it is a regression')
+    args = parser.parse_args(args)
+
+    current = environment()
+    baseline = {}
+    same_versions = True
+    if args.compare:
+        if not os.path.isfile(args.baseline):
+            print('No baseline at ' + args.baseline + ', run with --save-baseline first')
+            return 1
+        with open(args.baseline) as baseline_file:
+            stored = json.load(baseline_file)
+        baseline = stored['results']
+        baseline_environment = stored.get('environment', {})
+        same_versions = baseline_environment.get('versions') == current['versions']
+        if not same_versions:
+            print('The baseline was measured with other library versions, changed outputs are not regressions: ' +
+                  json.dumps(baseline_environment.get('versions')))
+        if baseline_environment.get('machine') != current['machine']:
+            print('The baseline was measured on another machine, compare timings against a baseline of your own: ' +
+                  json.dumps(baseline_environment.get('machine')))
+
+    results = {}
+    regressions = []
+    print('%-25s %5s %10s %14s %10s  %s' % ('case', 'size', 'seconds', 'items/s', 'peak MB', 'vs baseline'))
+    for size in args.sizes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fixtures = Fixtures(SIZES[size], seed=args.seed)
+        for name, case in CASES:
+            if name not in args.cases:
+                continue
+            with contextlib.redirect_stdout(io.StringIO()):
+                func, n_items = case(fixtures)
+            try:
+                seconds, peak, output = run_case(func, args.repeat, memory=not args.no_memory)
+            except LookupError:
+                # nltk raises LookupError for data that is not installed, such as the punkt models of tag_snippet
+                print('%-25s %5s %10s %14s %10s  %s' % (name, size, '-', '-', '-', 'skipped, nltk data not installed'))
+                continue
+
+            key = name + '@' + size
+            results[key] = {'seconds': seconds, 'items': n_items, 'items_per_second': n_items / seconds,
+                            'peak_mb': peak / 2 ** 20 if peak is not None else None,
+                            'digest': result_digest(output) if name not in UNDIGESTED_CASES else None}
+            del output
+            change, regression = compare(results[key], baseline.get(key), args.tolerance,
+                                         same_versions=same_versions) if args.compare else ('', False)
+            if regression:
+                regressions.append(key)
+                change += '  REGRESSION'
+            print('%-25s %5s %10.3f %14.0f %10s  %s' % (name, size, seconds, n_items / seconds,
+                                                        '%.1f' % results[key]['peak_mb'] if peak is not None else '-',
+                                                        change))
+            sys.stdout.flush()
+
+    if args.save_baseline:
+        if os.path.isfile(args.baseline):
+            with open(args.baseline) as baseline_file:
+                stored = json.load(baseline_file)['results']
+        else:
+            stored = {}
+        stored.update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump({'seed': args.seed, 'environment': current, 'results': stored}, baseline_file, indent=1,
+                      sort_keys=True)
+        print('Saved the baseline to ' + args.baseline)
+
+    if regressions:
+        print('Regressions: ' + ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""Benchmark the CompactTagger against the pickled nltk tagger chain on the bundled model, tagging all the sentences in
+one batch (tag_sents) and one sentence at a time (tag, as tag_snippet does). The compact per sentence path is timed
+with its token cache empty (the first pass) and full
+
+    python benchmarks/bench_tagging.py --sentences 20000 --oov-rate 0.1
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from pos_ngrams.processing.compact_tagger import CompactTagger
+from pos_ngrams.processing.pos_tagging import compact_model_path, load_pickled_tagger
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+def make_sentences(vocab, n_sentences, oov_rate=0.1, mean_length=15, seed=0):
+    """
+    Random sentences of vocabulary words mixed with out of vocabulary words that fall through to the regex tagger
+
+    :param vocab: List of in vocabulary words
+    :param n_sentences: Int, number of sentences
+    :param oov_rate: Float, fraction of out of vocabulary tokens
+    :param mean_length: Int, mean sentence length
+    :param seed: Int, random seed
+
+    :return: List of sentences, each a list of str tokens
+    """
+
+    random_state = np.random.RandomState(seed)
+    suffixes = ['', 'ing', 'ed', 'es']
+    lengths = random_state.poisson(mean_length, n_sentences)
+    n_tokens = int(lengths.sum())
+
+    tokens = np.array(vocab, dtype=object)[random_state.randint(len(vocab), size=n_tokens)]
+    oov = np.flatnonzero(random_state.rand(n_tokens) < oov_rate)
+    tokens[oov] = ['zq%x%s' % (random_state.randint(1 << 20), suffixes[i % 4]) for i in range(len(oov))]
+    tokens = tokens.tolist()
+
+    starts = np.cumsum(lengths) - lengths
+    return [tokens[start:start + length] for start, length in zip(starts.tolist(), lengths.tolist())]
+
+
+def time_call(func, repeat):
+    """
+    :return: The best wall clock time of repeat calls to func
+    """
+
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tagger', default='simplified_en', help='Name of the tagger in models/')
+    parser.add_argument('--sentences', type=int, default=20000, help='Number of sentences to tag')
+    parser.add_argument('--oov-rate', type=float, default=0.1, help='Fraction of out of vocabulary tokens')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per engine, the best is reported')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the sentences')
+    args = parser.parse_args(args)
+
+    start = time.perf_counter()
+    nltk_tagger = load_pickled_tagger(args.tagger)
+    unpickle_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compact_tagger = CompactTagger(compact_model_path(args.tagger))
+    load_time = time.perf_counter() - start
+
+    vocab = compact_tagger.words()
+    sentences = make_sentences(vocab, args.sentences, oov_rate=args.oov_rate, seed=args.seed)
+    n_tokens = sum(len(sentence) for sentence in sentences)
+
+    if nltk_tagger.tag_sents(sentences) != compact_tagger.tag_sents(sentences):
+        print('Tagging output differs between the engines')
+        return 1
+
+    def tag_each(tagger):
+        return [tagger.tag(sentence) for sentence in sentences]
+
+    start = time.perf_counter()
+    first_pass = tag_each(CompactTagger(compact_model_path(args.tagger)))
+    compact_cold_time = time.perf_counter() - start
+    if first_pass != tag_each(nltk_tagger):
+        print('Tagging output differs between the engines')
+        return 1
+
+    nltk_time = time_call(lambda: nltk_tagger.tag_sents(sentences), args.repeat)
+    compact_time = time_call(lambda: compact_tagger.tag_sents(sentences), args.repeat)
+    nltk_sentence_time = time_call(lambda: tag_each(nltk_tagger), args.repeat)
+    compact_sentence_time = time_call(lambda: tag_each(compact_tagger), args.repeat)
+
+    print('Tagger: %s, %d sentences, %d tokens, %.0f%% oov' % (args.tagger, len(sentences), n_tokens,
+                                                               100 * args.oov_rate))
+    print('%-10s load %8.2f ms' % ('nltk', 1000 * unpickle_time))
+    print('%-10s load %8.2f ms' % ('compact', 1000 * load_time))
+    for engine, method, timing in [('nltk', 'tag_sents', nltk_time),
+                                   ('compact', 'tag_sents', compact_time),
+                                   ('nltk', 'tag', nltk_sentence_time),
+                                   ('compact', 'tag cold', compact_cold_time),
+                                   ('compact', 'tag', compact_sentence_time)]:
+        print('%-10s %-10s %8.3f s  %10.0f tokens/s' % (engine, method, timing, n_tokens / timing))
+    print('Speedup: tag_sents %.1fx, tag %.1fx' % (nltk_time / compact_time,
+                                                   nltk_sentence_time / compact_sentence_time))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
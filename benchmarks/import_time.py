@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""Check the import time budget of the tagging and preprocessing modules, each module is imported in a fresh
+interpreter and must neither exceed the budget nor pull in a heavy dependency
+
+    python benchmarks/import_time.py --budget-ms 100
+"""
+
+import argparse
+import os
+import pkgutil
+import subprocess
+import sys
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+HEAVY_MODULES = ['nltk', 'sklearn', 'pandas', 'scipy']
+
+
+def budgeted_modules():
+    """
+    :return: List of the module names held to the import time budget
+    """
+
+    import pos_ngrams.preprocessing
+
+    modules = ['pos_ngrams.processing.pos_tagging']
+    modules += ['pos_ngrams.preprocessing.' + name
+                for finder, name, is_package in pkgutil.iter_modules(pos_ngrams.preprocessing.__path__)]
+    return modules
+
+
+def measure_import(module):
+    """
+    Import a module in a fresh interpreter
+
+    :param module: Module name
+
+    :return: The cumulative import time in ms, and the list of heavy modules it loaded
+    """
+
+    code = ('import sys, %s; print(",".join(m for m in %r if m in sys.modules))' % (module, HEAVY_MODULES))
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    cumulative_us = 0
+    for line in process.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            cumulative_us = int(fields[1])
+    heavy = [name for name in process.stdout.strip().split(',') if name]
+    return cumulative_us / 1000, heavy
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=100., help='Import time budget per module in ms')
+    parser.add_argument('--repeat', type=int, default=3, help='Imports per module, the fastest is reported')
+    args = parser.parse_args(args)
+
+    sys.path.insert(0, ROOT)
+
+    failed = False
+    for module in budgeted_modules():
+        results = [measure_import(module) for i in range(args.repeat)]
+        import_ms = min(result[0] for result in results)
+        heavy = results[0][1]
+
+        status = 'ok'
+        if import_ms > args.budget_ms or heavy:
+            status = 'FAIL'
+            failed = True
+        print('%-55s %8.1f ms  %-4s %s' % (module, import_ms, status,
+                                            'loads ' + ", ".join(heavy) if heavy else ''))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
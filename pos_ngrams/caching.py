@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+"""Small in-process caches shared by the tagging and preprocessing modules"""
+
+import threading
+from collections import OrderedDict
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+class LRUCache():
+    """
+    Thread safe least recently used cache with hit and miss counters
+    """
+
+    def __init__(self, maxsize=128):
+        """
+
+        :param maxsize: Int, the maximum number of entries to hold before evicting the least recently used,
+        None for an unbounded cache
+        """
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """
+        Return the cached value for key (marking it as recently used), or default if it is not cached
+
+        :param key: Hashable cache key
+        :param default: Value returned on a miss
+
+        :return: The cached value or default
+        """
+
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Add or replace an entry, evicting the least recently used entries if the cache is full
+
+        :param key: Hashable cache key
+        :param value: Value to store
+        """
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def get_or_create(self, key, factory):
+        """
+        Return the cached value for key, creating and caching it with factory() on a miss
+
+        :param key: Hashable cache key
+        :param factory: Callable with no arguments that builds the value
+
+        :return: The cached or newly created value
+        """
+
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                value = factory()
+                self._entries[key] = value
+                self._evict()
+                return value
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def resize(self, maxsize):
+        """
+        Change the maximum size of the cache, evicting entries if it shrinks
+
+        :param maxsize: Int, the new maximum number of entries, None for unbounded
+        """
+
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def discard(self, key):
+        """
+        Remove an entry if it is cached
+
+        :param key: Hashable cache key
+        """
+
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self, reset_stats=True):
+        """
+        Empty the cache
+
+        :param reset_stats: Bool, also reset the hit and miss counters
+        """
+
+        with self._lock:
+            self._entries.clear()
+            if reset_stats:
+                self.hits = 0
+                self.misses = 0
+
+    def info(self):
+        """
+        Cache statistics
+
+        :return: Dict with hits, misses, hit_rate, size and maxsize
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'size': len(self._entries),
+                    'maxsize': self.maxsize}
+
+    def _evict(self):
+        if self.maxsize is None:
+            return
+        while len(self._entries) > max(self.maxsize, 0):
+            self._entries.popitem(last=False)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+"""Stage level instrumentation for the ngram pipeline. Each stage reports its wall time, sizes and memory delta as a
+StageRecord to the sinks it was given, with no sinks the pipeline is silent and skips the extra measurements"""
+
+import contextlib
+import time
+import tracemalloc
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+class StageRecord():
+    """
+    The measurements of one run of a stage, the metrics that do not apply to a stage are None. memory_delta (the
+    traced bytes retained by the stage) and peak_memory (the most traced bytes above those at its start) are only
+    measured while tracemalloc is tracing (for example under ngram_pipeline(track_memory=True))
+    """
+
+    FIELDS = ['stage', 'seconds', 'rows', 'tokens', 'vocabulary_size', 'nnz', 'memory_delta', 'peak_memory']
+
+    def __init__(self, stage, rows=None, tokens=None, vocabulary_size=None, nnz=None):
+        """
+
+        :param stage: String, the stage name
+        :param rows: Int, the number of rows (documents or ngrams) the stage processed
+        :param tokens: Int, the number of tokens the stage produced
+        :param vocabulary_size: Int, the number of distinct ngrams after the stage
+        :param nnz: Int, the number of stored entries of the sparse matrix the stage built
+        """
+
+        self.stage = stage
+        self.seconds = None
+        self.rows = rows
+        self.tokens = tokens
+        self.vocabulary_size = vocabulary_size
+        self.nnz = nnz
+        self.memory_delta = None
+        self.peak_memory = None
+
+    def as_dict(self):
+        """
+        :return: Dict of FIELDS to their values
+        """
+
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class Instrumentation():
+    """
+    Times the stages of the pipeline and hands their StageRecords to the sinks, a sink is any callable taking a
+    StageRecord
+    """
+
+    def __init__(self, sinks=None):
+        """
+
+        :param sinks: List of sinks, None or empty for no instrumentation
+        """
+
+        self.sinks = list(sinks or [])
+
+    @property
+    def enabled(self):
+        """
+        Bool, whether any sink is listening, metrics that cost a pass over the data are only computed when it is
+        """
+
+        return bool(self.sinks)
+
+    @contextlib.contextmanager
+    def stage(self, name, **metrics):
+        """
+        Context manager measuring one run of a stage, the metrics known only once the stage has run can be set on
+        the yielded record. The record is sent to the sinks when the stage completes without an error.
+
+        :param name: String, the stage name
+        :param metrics: The StageRecord metrics known up front
+
+        :return: The StageRecord
+        """
+
+        record = StageRecord(name, **metrics)
+        if not self.sinks:
+            yield record
+            return
+
+        tracing = tracemalloc.is_tracing()
+        with contextlib.ExitStack() as stack:
+            peak_memory = stack.enter_context(PeakMemory()) if tracing else None
+            start = time.perf_counter()
+            yield record
+            record.seconds = time.perf_counter() - start
+        if tracing and tracemalloc.is_tracing():
+            record.memory_delta = tracemalloc.get_traced_memory()[0] - peak_memory.start
+            record.peak_memory = peak_memory.peak
+
+        for sink in self.sinks:
+            sink(record)
+
+
+class PeakMemory():
+    """
+    Context manager measuring the peak of the memory traced by tracemalloc over a block. Blocks can be nested (such
+    as the stages of a traced pipeline run) as the tracemalloc peak reached so far is passed on to every open block
+    before it is reset.
+
+        with PeakMemory() as peak_memory:
+            ...
+        peak_memory.peak
+    """
+
+    _open = []
+
+    def __init__(self):
+        self.start = None
+        self.peak = None
+        self._highest = 0
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            highest = tracemalloc.get_traced_memory()[1]
+            for block in PeakMemory._open:
+                block._highest = max(block._highest, highest)
+            tracemalloc.reset_peak()
+        self.start = tracemalloc.get_traced_memory()[0]
+        PeakMemory._open.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        PeakMemory._open.remove(self)
+        highest = max(self._highest, tracemalloc.get_traced_memory()[1])
+        self.peak = max(highest - self.start, 0)
+
+
+def get_instrumentation(sink=None):
+    """
+    :param sink: None, a sink callable, a list of sinks or an Instrumentation
+
+    :return: Instrumentation reporting to the sinks
+    """
+
+    if isinstance(sink, Instrumentation):
+        return sink
+    if sink is None:
+        return Instrumentation()
+    if callable(sink):
+        return Instrumentation([sink])
+    return Instrumentation(sink)
+
+
+def count_tokens(documents):
+    """
+    :param documents: Iterable of space separated strings, or of lists of tokens
+
+    :return: Int, the total number of tokens
+    """
+
+    return sum(len(document.split()) if isinstance(document, str) else len(document) for document in documents)
+
+
+class ProfilerSink():
+    """
+    Collects the StageRecords of a run and prints a breakdown of where the time went, stages that run several times
+    (for example once per chunk) are summed
+
+        profiler = ProfilerSink()
+        ngrams = NGrams(data, sink=profiler)
+        ngrams.ngram_pipeline(preprocess_data=True)
+        profiler.print_report()
+    """
+
+    def __init__(self, verbose=False):
+        """
+
+        :param verbose: Bool, also print each stage as it completes
+        """
+
+        self.verbose = verbose
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+        if self.verbose:
+            print('%s: %.3f s' % (record.stage, record.seconds))
+
+    def reset(self):
+        """
+        Forget the collected records
+        """
+
+        self.records = []
+
+    def stages(self):
+        """
+        :return: List of dicts with the summed metrics of each stage and its number of calls, in order of first run
+        """
+
+        stages = {}
+        for record in self.records:
+            stage = stages.setdefault(record.stage, {'stage': record.stage, 'calls': 0})
+            stage['calls'] += 1
+            for field in StageRecord.FIELDS[1:]:
+                value = getattr(record, field)
+                if field == 'vocabulary_size':
+                    # The vocabulary after the latest run, not a sum over runs
+                    stage[field] = value if value is not None else stage.get(field)
+                elif field == 'peak_memory' and value is not None:
+                    stage[field] = max(value, stage.get(field) or 0)
+                elif value is not None:
+                    stage[field] = stage.get(field, 0) + value
+                else:
+                    stage.setdefault(field, None)
+        return list(stages.values())
+
+    def report(self):
+        """
+        :return: String table of the stage breakdown
+        """
+
+        stages = self.stages()
+        total = sum(stage['seconds'] for stage in stages)
+
+        lines = ['%-20s %6s %10s %7s %10s %10s %10s %10s %10s %10s' % ('stage', 'calls', 'seconds', '%', 'rows',
+                                                                      'tokens', 'vocabulary', 'nnz', 'memory MB',
+                                                                      'peak MB')]
+        for stage in stages:
+            lines.append('%-20s %6d %10.3f %7.1f %10s %10s %10s %10s %10s %10s' % (
+                stage['stage'], stage['calls'], stage['seconds'],
+                100 * stage['seconds'] / total if total else 0.,
+                _format_int(stage['rows']), _format_int(stage['tokens']), _format_int(stage['vocabulary_size']),
+                _format_int(stage['nnz']), _format_megabytes(stage['memory_delta']),
+                _format_megabytes(stage['peak_memory'])))
+        lines.append('%-20s %6s %10.3f' % ('total', '', total))
+        return "\n".join(lines)
+
+    def print_report(self):
+        """
+        Print the stage breakdown
+        """
+
+        print(self.report())
+
+
+def _format_int(value):
+    return '-' if value is None else str(int(value))
+
+
+def _format_megabytes(value):
+    return '-' if value is None else '%.1f' % (value / 2 ** 20)
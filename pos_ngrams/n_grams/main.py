@@ -2,9 +2,17 @@
 
 """Main class for performing ngrams analysis on a pandas_df containing a series of text mentions"""
 
+import sys
+import tracemalloc
+
+import numpy as np
 import pandas as pd
+from scipy import sparse
+from pos_ngrams.instrumentation import PeakMemory, get_instrumentation
 from pos_ngrams.preprocessing.preprocess import preprocess_df
-from pos_ngrams.n_grams import processes
+from pos_ngrams.preprocessing.stemming import stem_tokens
+from pos_ngrams.processing.stopwords import get_stopword_filter
+from pos_ngrams.n_grams import persistence, processes
 
 __author__ = "Peter J Usherwood"
 __python_version__ = "3.5"
@@ -15,25 +23,89 @@ class NGrams():
     The parent class for managing n-gram analysis
     """
 
-    def __init__(self, data, text_field_key='Snippet'):
+    def __init__(self, data, text_field_key='Snippet', low_memory=False, keep_columns=None, sink=None):
         """
 
         :param data: Pandas dataframe containing a text Snippet field and other metadata
         :param text_field_key: The name of the text field (by default Snippet)
+        :param low_memory: Bool, only copy the text field and keep_columns from data, build only the Preprocessed
+        column when preprocessing and drop the raw text field once it has been preprocessed
+        :param keep_columns: List of metadata columns to keep in low_memory mode (for aggregate_other_data_column),
+        by default none are kept
+        :param sink: Callable receiving a StageRecord for every stage run by ngram_pipeline, partial_fit and
+        fortify_with_id, or a list of them (see instrumentation.ProfilerSink), None is silent
         """
 
         self.text_field_key = text_field_key
-        self.data = data.copy()
+        self.instrumentation = get_instrumentation(sink)
+        self.low_memory = low_memory
+        if low_memory:
+            keep_columns = [column for column in (keep_columns or []) if column != text_field_key]
+            self.data = data[[text_field_key] + keep_columns].copy()
+        else:
+            self.data = data.copy()
         self.cv = None
-        self.ngrams_df = pd.DataFrame(['blank'], columns=['Index'])
+        self.ngram_table = None
+        self.document_index = None
+        self.token_index = None
+        self._ngram_rows = None
+        self.language = 'english'
+        self._ngrams_df = pd.DataFrame(['blank'], columns=['Index'])
         self.filtered_ngrams_df = pd.DataFrame(['blank'], columns=['Index'])
         self.ngram_word = None
         self.word_frequency_matrix = pd.DataFrame(['blank'], columns=['Index'])
         self.ids_enriched = False
+        self.counter = None
+        self._pipeline_args = None
+        self._source_text_field_key = text_field_key
+        self._keep_columns = keep_columns if low_memory else None
+        self.memory_stats = None
+
+    @property
+    def cv(self):
+        """
+        The fitted vectorizer, for loaded results it is only rebuilt (importing sklearn) when first accessed
+        """
+
+        if self._cv is None and self._cv_builder is not None:
+            self._cv = self._cv_builder()
+            self._cv_builder = None
+        return self._cv
+
+    @cv.setter
+    def cv(self, cv):
+        self._cv = cv
+        self._cv_builder = None
+
+    @property
+    def ngrams_df(self):
+        """
+        Pandas dataframe of all ngrams ordered by frequency, only built from the ngram_table when first accessed
+        """
+
+        if self._ngrams_df is None:
+            self._ngrams_df = self.ngram_table.to_frame()
+        return self._ngrams_df
+
+    @ngrams_df.setter
+    def ngrams_df(self, ngrams_df):
+        self._ngrams_df = ngrams_df
+        self._ngram_rows = None
+
+    def top_ngrams(self, k=100):
+        """
+        The k most frequent ngrams without building the full ngrams_df
+
+        :param k: Int, number of ngrams to return
+
+        :return: Pandas dataframe in the same format as ngrams_df
+        """
+
+        return self.ngram_table.to_frame(k)
 
     def ngram_pipeline(self, min_gram=2, max_gram=4, preprocess_data=False,
                        language='english', adhoc_stopwords=[], max_features=1000,
-                       tfidf=True, pos_tuples=False):
+                       tfidf=True, pos_tuples=False, incremental=False, track_memory=False):
         """
         The primary function that creates the ngrams dataframe which contains: NGram name, frequency, and index (until
         fortified with additional data).
@@ -49,69 +121,538 @@ class NGrams():
         :param max_features: Int the maximum number of features to generate
         :param tfidf: Bool, whether to use the rate countvectorizer instead of the deafult counts one
         :param pos_tuples: Bool, if tokens are a list of pos_tuples set this to true
+        :param incremental: Bool, count with an IncrementalNGramCounter that is kept for partial_fit, this holds the
+        counts over the full vocabulary in memory rather than only the max_features kept
+        :param track_memory: Bool, trace allocations with tracemalloc while the pipeline runs and store the peak and
+        retained bytes of the run in memory_stats, with the bytes held by data and the outputs from memory_usage
+        (tracing slows the pipeline down), the sink then also receives the retained and peak bytes of each stage
         """
 
+        if track_memory:
+            tracing = tracemalloc.is_tracing()
+            if not tracing:
+                tracemalloc.start()
+            try:
+                with PeakMemory() as peak_memory:
+                    self._run_pipeline(min_gram, max_gram, preprocess_data, language, adhoc_stopwords, max_features,
+                                       tfidf, pos_tuples, incremental)
+                retained = tracemalloc.get_traced_memory()[0] - peak_memory.start
+            finally:
+                if not tracing:
+                    tracemalloc.stop()
+            self.memory_stats = {'peak': peak_memory.peak, 'retained': retained}
+            self.memory_stats.update(self.memory_usage())
+        else:
+            self._run_pipeline(min_gram, max_gram, preprocess_data, language, adhoc_stopwords, max_features, tfidf,
+                               pos_tuples, incremental)
+
+        return True
+
+    def _run_pipeline(self, min_gram, max_gram, preprocess_data, language, adhoc_stopwords, max_features, tfidf,
+                      pos_tuples, incremental):
+        """
+        The body of ngram_pipeline
+        """
+
+        self.language = language
+        self._pipeline_args = {'min_gram': min_gram, 'max_gram': max_gram, 'preprocess_data': preprocess_data,
+                               'language': language, 'adhoc_stopwords': adhoc_stopwords,
+                               'max_features': max_features, 'tfidf': tfidf, 'pos_tuples': pos_tuples}
+        self._source_text_field_key = self.text_field_key
+        self.counter = None
+
         if preprocess_data:
             self.data = preprocess_df(self.data,
                                       self.text_field_key,
                                       language=language,
                                       adhoc_stopwords=adhoc_stopwords,
-                                      pos_tuples=pos_tuples)
+                                      pos_tuples=pos_tuples,
+                                      columns=['Preprocessed'] if self.low_memory else None,
+                                      stopword_filter=get_stopword_filter(language=language,
+                                                                          adhoc_list=adhoc_stopwords),
+                                      low_memory=self.low_memory,
+                                      sink=self.instrumentation)
+            if self.low_memory and self.text_field_key != 'Preprocessed':
+                self.data = self.data.drop(columns=[self.text_field_key])
             self.text_field_key = 'Preprocessed'
 
+        if incremental:
+            self.counter = processes.IncrementalNGramCounter(min_gram, max_gram, pos_tuples=pos_tuples)
+            self._count(self.data[self.text_field_key])
+            self._finalize(max_features, tfidf)
+            return
+
         ngrams, word_frequency_matrix, cv = processes.generate_ngrams(self.data,
                                                                       min_gram,
                                                                       max_gram,
                                                                       self.text_field_key,
                                                                       max_features=max_features,
                                                                       tfidf=tfidf,
-                                                                      pos_tuples=pos_tuples)
-        self.ngrams_df = ngrams
+                                                                      pos_tuples=pos_tuples,
+                                                                      sink=self.instrumentation)
+        self._set_ngrams(ngrams, word_frequency_matrix, cv)
+
+    @classmethod
+    def from_chunks(cls, chunks, text_field_key='Snippet', keep_columns=None, min_gram=2, max_gram=4,
+                    preprocess_data=False, language='english', adhoc_stopwords=[], max_features=1000, tfidf=True,
+                    pos_tuples=False, cache=None, sink=None):
+        """
+        Streaming alternative to NGrams(data).ngram_pipeline(...) for sources too large to load at once. Each chunk is
+        preprocessed and counted then dropped, so the text is never held in memory all at once. The resulting
+        ngrams_df, word_frequency_matrix and cv match the in memory pipeline over the concatenated chunks.
+
+        When chunks is a callable returning a fresh iterable of the chunks, they are read twice: the first pass only
+        counts the frequencies of every ngram and the second builds the word_frequency_matrix over the max_features
+        kept, so memory is bounded by the vocabulary of distinct ngrams with their frequencies and by the result.
+        A plain iterable is read once, which keeps the counts of every document over the full vocabulary until the
+        max_features are chosen at the end, often many times the size of the result.
+
+        :param chunks: Callable returning an iterable of pandas dataframes (the same ones on every call), for example
+        lambda: pd.read_csv(path, chunksize=100000) or lambda: pd.read_json(path, lines=True, chunksize=100000)
+        (pos tuples read from json as [word, tag] lists are counted as tuples), or such an iterable to read once
+        :param text_field_key: The name of the text field (by default Snippet)
+        :param keep_columns: List of metadata columns to keep in data (for aggregate_other_data_column), by default
+        none are kept
+        :param min_gram: Int, The minimum n
+        :param max_gram: Int, The maximim n
+        :param preprocess_data: Whether each chunk should be preprocessed prior to ngram analysis
+        :param language: If preprocessing this imput dictates the language choice of stemming and basic stopwords
+        :param adhoc_stopwords: If preprocessing this is the third input into stopwords (see stopwords)
+        :param max_features: Int the maximum number of features to generate
+        :param tfidf: Bool, whether to use the rate countvectorizer instead of the deafult counts one
+        :param pos_tuples: Bool, if tokens are a list of pos_tuples set this to true
+        :param cache: PreprocessCache or path of one, so the second pass over a callable does not preprocess the
+        chunks again (see preprocess_df)
+        :param sink: Callable receiving a StageRecord for every stage, or a list of them (see NGrams), None is silent
+
+        :return: NGrams with the ngrams generated and data holding only the keep_columns
+        """
+
+        instrumentation = get_instrumentation(sink)
+        keep_columns = list(keep_columns or [])
+        stopword_filter = None
+        if preprocess_data:
+            stopword_filter = get_stopword_filter(language=language, adhoc_list=adhoc_stopwords)
+
+        def documents(chunk):
+            if not preprocess_data:
+                return chunk[text_field_key]
+            return preprocess_df(chunk[[text_field_key]].copy(),
+                                 text_field_key,
+                                 language=language,
+                                 adhoc_stopwords=adhoc_stopwords,
+                                 pos_tuples=pos_tuples,
+                                 columns=['Preprocessed'],
+                                 stopword_filter=stopword_filter,
+                                 cache=cache,
+                                 sink=instrumentation)['Preprocessed']
+
+        two_pass = callable(chunks)
+        counter = processes.IncrementalNGramCounter(min_gram, max_gram, pos_tuples=pos_tuples,
+                                                    keep_matrix=not two_pass)
+        kept = []
+        for chunk in (chunks() if two_pass else chunks):
+            _count_documents(counter, documents(chunk), instrumentation)
+            kept.append(chunk[keep_columns].copy())
+
+        count_matrix = None
+        if two_pass:
+            counter.select(max_features)
+            matrices = []
+            for chunk in chunks():
+                text = documents(chunk)
+                with instrumentation.stage('transform', rows=len(text)):
+                    matrices.append(counter.transform(text))
+            count_matrix = sparse.vstack(matrices, format='csr') if matrices else None
+
+        data = pd.concat(kept) if kept else pd.DataFrame(columns=keep_columns)
+        ngrams = cls(data, text_field_key='Preprocessed' if preprocess_data else text_field_key, sink=instrumentation)
+        ngrams.language = language
+        ngrams._pipeline_args = {'min_gram': min_gram, 'max_gram': max_gram, 'preprocess_data': preprocess_data,
+                                 'language': language, 'adhoc_stopwords': adhoc_stopwords,
+                                 'max_features': max_features, 'tfidf': tfidf, 'pos_tuples': pos_tuples}
+        ngrams._source_text_field_key = text_field_key
+        ngrams._keep_columns = keep_columns
+        ngrams.counter = counter
+        ngrams._finalize(max_features, tfidf, count_matrix=count_matrix)
+
+        return ngrams
+
+    def partial_fit(self, new_data):
+        """
+        Add a batch of new mentions, the vocabulary, word_frequency_matrix, frequencies and idf are then updated to
+        match a fresh ngram_pipeline over all the data with the same arguments. The first call after a non
+        incremental ngram_pipeline counts the existing data once. Not available after from_chunks over a callable,
+        which does not keep the counts of the history.
+
+        Only the new rows are preprocessed and counted, and while the max_features kept do not change only their
+        counts are added to those of the history over the kept features. The rest still grows with the history: a
+        change in the kept features slices the counts of every document again, and the matrix is restacked and (with
+        tfidf) reweighted as the idf changes with every new document, in time proportional to its stored entries.
+
+        data keeps the index of every batch, so results can be joined back to the source by its labels (such as
+        mention ids). The rows of the word_frequency_matrix and the Original Data Keys are row positions in data,
+        data.index[keys] gives their labels, so the index of new_data must not repeat a label already in data.
+
+        :param new_data: Pandas dataframe with the same text field and metadata as the original data, and an index
+        that does not overlap the index of data
+        """
+
+        if self._pipeline_args is None:
+            raise ValueError('Run ngram_pipeline or from_chunks before partial_fit')
+        if self.counter is not None and not self.counter.keep_matrix:
+            raise ValueError('partial_fit needs the counts of the history, run from_chunks over an iterable instead of '
+                             'a callable')
+        if self.counter is None and self.text_field_key not in self.data.columns:
+            raise ValueError('partial_fit needs the text of the history, which is not kept by save and load:',
+                             self.text_field_key)
+        overlap = self.data.index.intersection(new_data.index)
+        if len(overlap):
+            raise ValueError('The index of new_data repeats labels already in data, give the batch its own index '
+                             '(for example its mention ids):', str(overlap[:5].tolist()))
+        args = self._pipeline_args
+
+        if self.counter is None:
+            self.counter = processes.IncrementalNGramCounter(args['min_gram'], args['max_gram'],
+                                                             pos_tuples=args['pos_tuples'])
+            self._count(self.data[self.text_field_key])
+
+        if self.low_memory:
+            new_data = new_data[[self._source_text_field_key] + self._keep_columns].copy()
+        else:
+            new_data = new_data.copy()
+        if args['preprocess_data']:
+            new_data = preprocess_df(new_data,
+                                     self._source_text_field_key,
+                                     language=args['language'],
+                                     adhoc_stopwords=args['adhoc_stopwords'],
+                                     pos_tuples=args['pos_tuples'],
+                                     columns=['Preprocessed'] if self.low_memory else None,
+                                     stopword_filter=get_stopword_filter(language=args['language'],
+                                                                         adhoc_list=args['adhoc_stopwords']),
+                                     low_memory=self.low_memory,
+                                     sink=self.instrumentation)
+        self._count(new_data[self.text_field_key])
+
+        if self._keep_columns is not None:
+            new_data = new_data[[column for column in self.data.columns if column in new_data.columns]]
+        self.data = pd.concat([self.data, new_data])
+        self._finalize(args['max_features'], args['tfidf'])
+
+        return True
+
+    def memory_usage(self):
+        """
+        Bytes currently held by the data and the ngram outputs
+
+        :return: Dict of data, word_frequency_matrix, ngram_table and total bytes
+        """
+
+        usage = {'data': int(self.data.memory_usage(index=True, deep=True).sum()),
+                 'word_frequency_matrix': 0,
+                 'ngram_table': 0}
+
+        matrix = self.word_frequency_matrix
+        if hasattr(matrix, 'indptr'):
+            usage['word_frequency_matrix'] = matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+        if self.ngram_table is not None:
+            table = self.ngram_table
+            usage['ngram_table'] = (table.counts.nbytes + table.doc_freqs.nbytes + table.ngrams.nbytes +
+                                    sum(sys.getsizeof(ngram) for ngram in table.ngrams))
+
+        usage['total'] = sum(usage.values())
+        return usage
+
+    def _count(self, documents):
+        """
+        Count a batch of documents with the IncrementalNGramCounter
+        """
+
+        _count_documents(self.counter, documents, self.instrumentation)
+
+    def _finalize(self, max_features, tfidf, count_matrix=None):
+        """
+        Finalize the IncrementalNGramCounter into the ngram outputs
+        """
+
+        with self.instrumentation.stage('finalize', rows=self.counter.n_documents) as stage:
+            ngrams, word_frequency_matrix, cv = self.counter.finalize(max_features=max_features, tfidf=tfidf,
+                                                                      count_matrix=count_matrix)
+            stage.vocabulary_size = len(ngrams)
+            stage.nnz = word_frequency_matrix.nnz
+        self._set_ngrams(ngrams, word_frequency_matrix, cv)
+
+    def _set_ngrams(self, ngrams, word_frequency_matrix, cv):
+        """
+        Store the outputs of ngram generation and reset everything derived from them
+        """
+
+        self.ngram_table = ngrams
+        self.ngrams_df = None
+        self.document_index = None
+        with self.instrumentation.stage('token index', vocabulary_size=len(ngrams)):
+            if ngrams.tokens is None:
+                self.token_index = processes.NGramTokenIndex(ngrams.ngrams)
+            else:
+                self.token_index = processes.NGramTokenIndex(ngrams.tokens, tokenize=list)
         self.word_frequency_matrix = word_frequency_matrix
         self.cv = cv
 
         self.ids_enriched = False
 
+    def save(self, path, data_columns=None):
+        """
+        Save the ngram outputs to a directory of arrays that load can memory map (see persistence): the
+        word_frequency_matrix as its raw csr arrays, the vocabulary as one utf-8 buffer, the ngram table, token index
+        and ngrams_df column by column, and the pipeline settings in meta.json. The text data is not saved. The
+        directory is written next to path and then replaces it, so a failed save leaves a previous save intact and
+        results loaded from path can be saved back to it.
+
+        :param path: Directory to write to, it must be new, empty or written by save before
+        :param data_columns: List of data columns to save as well (for aggregate_other_data_column after loading), by
+        default none are saved
+        """
+
+        if self.ngram_table is None:
+            raise ValueError('Run ngram_pipeline or from_chunks before save')
+
+        with self.instrumentation.stage('save', rows=self.word_frequency_matrix.shape[0],
+                                        vocabulary_size=len(self.ngram_table),
+                                        nnz=self.word_frequency_matrix.nnz):
+            with persistence.replacing_directory(path) as directory:
+                table = self.ngram_table
+                persistence.save_strings(directory, 'ngrams', table.ngrams.tolist())
+                persistence.save_array(directory, 'ngram_counts', table.counts)
+                persistence.save_array(directory, 'ngram_doc_freqs', table.doc_freqs)
+                if table.tokens is not None:
+                    persistence.save_strings(directory, 'ngram_tokens',
+                                             [token for tokens in table.tokens for token in tokens])
+                    persistence.save_array(directory, 'ngram_token_lengths',
+                                           np.array([len(tokens) for tokens in table.tokens], dtype=np.int64))
+
+                persistence.save_strings(directory, 'token_index_tokens', self.token_index.tokens.tolist())
+                persistence.save_array(directory, 'token_index_ngram_ids', self.token_index.ngram_ids)
+                persistence.save_array(directory, 'token_index_offsets', self.token_index.offsets)
+
+                idf = getattr(self.cv, 'idf_', None)
+                if idf is not None:
+                    persistence.save_array(directory, 'idf', idf)
+
+                persistence.write_meta(directory, {
+                    'text_field_key': self.text_field_key,
+                    'language': self.language,
+                    'pipeline_args': self._pipeline_args,
+                    'ids_enriched': self.ids_enriched,
+                    'has_tokens': table.tokens is not None,
+                    'has_idf': idf is not None,
+                    'matrix': persistence.save_matrix(directory, 'matrix', self.word_frequency_matrix),
+                    'ngrams_df': (persistence.save_frame(directory, 'ngrams_df', self._ngrams_df)
+                                  if self._ngrams_df is not None else None),
+                    'data': (persistence.save_frame(directory, 'data', self.data[list(data_columns)])
+                             if data_columns else None)})
+
         return True
 
-    def search_on_word(self, ngram_word, stemmed_ngrams=True):
+    @classmethod
+    def load(cls, path, mmap=True, sink=None):
+        """
+        Reopen ngram outputs written by save without recomputing them. The vectorizer is rebuilt on first access of
+        cv and the document index on first use, partial_fit is not available as the text data is not saved.
+
+        :param path: Directory written by save
+        :param mmap: Bool, memory map the matrix, the numeric columns and the token index rather than reading them
+        into memory
+        :param sink: Callable receiving a StageRecord for every stage, or a list of them (see NGrams), None is silent
+
+        :return: NGrams
+        """
+
+        instrumentation = get_instrumentation(sink)
+        meta = persistence.read_meta(path)
+        with instrumentation.stage('load') as stage:
+            ngrams = cls(pd.DataFrame(), text_field_key=meta['text_field_key'], sink=instrumentation)
+            ngrams.language = meta['language']
+            ngrams._pipeline_args = meta['pipeline_args']
+
+            word_frequency_matrix = persistence.load_matrix(path, meta['matrix'], mmap=mmap)
+            if meta['data'] is not None:
+                ngrams.data = persistence.load_frame(path, meta['data'], mmap=mmap)
+            else:
+                ngrams.data = pd.DataFrame(index=pd.RangeIndex(word_frequency_matrix.shape[0]))
+
+            tokens = None
+            if meta['has_tokens']:
+                flat_tokens = persistence.load_strings(path, 'ngram_tokens')
+                lengths = persistence.load_array(path, 'ngram_token_lengths', mmap=False)
+                starts = (np.cumsum(lengths) - lengths).tolist()
+                tokens = [flat_tokens[start:start + length] for start, length in zip(starts, lengths.tolist())]
+            ngrams.ngram_table = processes.NGramTable(persistence.load_strings(path, 'ngrams'),
+                                                      persistence.load_array(path, 'ngram_counts', mmap=mmap),
+                                                      persistence.load_array(path, 'ngram_doc_freqs', mmap=mmap),
+                                                      tokens=tokens)
+            ngrams.token_index = processes.NGramTokenIndex.from_arrays(
+                persistence.load_strings(path, 'token_index_tokens'),
+                persistence.load_array(path, 'token_index_ngram_ids', mmap=mmap),
+                persistence.load_array(path, 'token_index_offsets', mmap=mmap))
+            ngrams.word_frequency_matrix = word_frequency_matrix
+
+            idf = persistence.load_array(path, 'idf', mmap=False) if meta['has_idf'] else None
+            ngrams._cv_builder = lambda: _rebuild_vectorizer(ngrams.ngram_table, meta['pipeline_args'], idf)
+            ngrams.ngrams_df = (persistence.load_frame(path, meta['ngrams_df'], mmap=mmap)
+                                if meta['ngrams_df'] is not None else None)
+            ngrams.ids_enriched = meta['ids_enriched']
+
+            stage.rows = word_frequency_matrix.shape[0]
+            stage.vocabulary_size = len(ngrams.ngram_table)
+            stage.nnz = word_frequency_matrix.nnz
+
+        return ngrams
+
+    def search_on_word(self, ngram_word, stemmed_ngrams=True, prefix=False, operator='and'):
         """
         Populates the filtered_ngrams_df which is a subset of the main ngrams_df but for ngrams containing the key
-        search word ngram_word
+        search word ngram_word. Words are matched as whole tokens using the token index, so art does not match party.
 
-        :param ngram_word: String, the word to return ngrams containing
+        :param ngram_word: String, the word to return ngrams containing, several space separated words (or a list of
+        words) are combined with operator
         :param stemmed_ngrams: Boolean, if the data has been stemmed set this as true and the ngram_word will be
         stemmed as well, otherwise it wont match.
+        :param prefix: Boolean, match ngram tokens starting with the search words
+        :param operator: String, 'and' for ngrams containing every search word, 'or' for ngrams containing any
         """
 
-        self.ngram_word = ngram_word
+        if isinstance(ngram_word, str):
+            words = ngram_word.split()
+        else:
+            words = list(ngram_word)
         if stemmed_ngrams:
-            self.ngram_word = processes.stem_text(self.ngram_word)
+            words = stem_tokens(words, language=self.language)
+        self.ngram_word = " ".join(words)
 
-        self.filtered_ngrams_df = self.ngrams_df[self.ngrams_df['Ngram'].str.contains(self.ngram_word)]
+        ngram_ids = self.token_index.search(words, operator=operator, prefix=prefix)
+        self.filtered_ngrams_df = self.ngrams_df.iloc[np.sort(self._get_ngram_rows()[ngram_ids])]
 
         return True
 
+    def _get_ngram_rows(self):
+        """
+        :return: Array mapping ngram id to its row position in ngrams_df
+        """
+
+        if self._ngram_rows is None:
+            ngram_ids = self.ngrams_df['Index'].values.astype(int)
+            self._ngram_rows = np.empty(len(self.ngram_table), dtype=np.int64)
+            self._ngram_rows[ngram_ids] = np.arange(len(ngram_ids))
+        return self._ngram_rows
+
     def fortify_with_id(self, filtered_df=False, take_top_x=300):
+        """
+        Add an Original Data Keys column of integer arrays with the data row positions containing each ngram
+
+        :param filtered_df: Bool, fortify the filtered_ngrams_df (from search_on_word) rather than the ngrams_df
+        :param take_top_x: Int, the number of ngrams to fortify, None for all
+        """
 
+        document_index = self.get_document_index()
         if filtered_df:
-            ngrams = processes.fortify_ngrams_with_ids(self.filtered_ngrams_df, self.word_frequency_matrix, take_top_x=take_top_x)
+            ngrams = processes.fortify_ngrams_with_ids(self.filtered_ngrams_df, self.word_frequency_matrix,
+                                                       take_top_x=take_top_x, document_index=document_index,
+                                                       sink=self.instrumentation)
             self.filtered_ngrams_df = ngrams
             self.ngrams_df['Original Data Keys'] = ngrams['Original Data Keys']
         else:
-            ngrams = processes.fortify_ngrams_with_ids(self.ngrams_df, self.word_frequency_matrix, take_top_x=take_top_x)
+            ngrams = processes.fortify_ngrams_with_ids(self.ngrams_df, self.word_frequency_matrix,
+                                                       take_top_x=take_top_x, document_index=document_index,
+                                                       sink=self.instrumentation)
             self.ngrams_df = ngrams
 
         self.ids_enriched = True
 
         return True
 
-    def aggregate_other_data_column(self, column_key_to_agg='Sentiment', new_column_key='Agg', filtered_df=False):
+    def get_document_index(self):
+        """
+        The inverted ngram to document index, built once per ngram_pipeline run
+
+        :return: NGramDocumentIndex
+        """
 
-        if self.ids_enriched:
-            for ids in self.ngrams_df['Original Data Keys']:
-                mean = self.data.ix[ids, column_key_to_agg].mean()
+        if self.document_index is None:
+            self.document_index = processes.NGramDocumentIndex(self.word_frequency_matrix)
+        return self.document_index
 
-        else:
-            print('Enrich with ids first')
-            return False
+    def documents_containing(self, ngram):
+        """
+        The data row positions of the documents containing an ngram
+
+        :param ngram: String ngram as it appears in ngrams_df, or its Int ngram id
+
+        :return: Sorted integer array of data row positions
+        """
+
+        if isinstance(ngram, str):
+            ngram = self.cv.vocabulary_[ngram]
+        return self.get_document_index().documents(ngram)
+
+    def aggregate_other_data_column(self, column_key_to_agg='Sentiment', new_column_key=None, filtered_df=False,
+                                    stats=processes.AGGREGATE_STATS):
+        """
+        Adds per ngram aggregates of one or more numeric data columns (for example Sentiment, Reach, Engagement)
+        over the documents containing each ngram, computed in bulk from the word_frequency_matrix
+
+        :param column_key_to_agg: String or list of strings, the data columns to aggregate
+        :param new_column_key: String prefix for the new columns, by default they are named '<column> <Stat>'
+        :param filtered_df: Bool, aggregate for the filtered_ngrams_df (from search_on_word) rather than the ngrams_df
+        :param stats: List of statistics, any of count, sum, mean, min, max and std
+
+        :return: Pandas dataframe of the aggregates, one row per ngram in the same order as the ngrams dataframe
+        """
+
+        if isinstance(column_key_to_agg, str):
+            column_key_to_agg = [column_key_to_agg]
+
+        ngrams = self.filtered_ngrams_df if filtered_df else self.ngrams_df
+        aggregates = processes.aggregate_ngram_metadata(self.word_frequency_matrix,
+                                                        self.data[column_key_to_agg],
+                                                        ngram_ids=ngrams['Index'].values,
+                                                        stats=stats)
+        if new_column_key:
+            aggregates.columns = [new_column_key + ' ' + column for column in aggregates.columns]
+        aggregates.index = ngrams.index
+
+        for column in aggregates.columns:
+            ngrams[column] = aggregates[column].values
+
+        return aggregates
+
+
+def _count_documents(counter, documents, instrumentation):
+    """
+    Count a batch of documents with an IncrementalNGramCounter as a count stage
+    """
+
+    with instrumentation.stage('count', rows=len(documents)) as stage:
+        counter.partial_count(documents)
+        stage.vocabulary_size = counter.n_features()
+
+
+def _rebuild_vectorizer(ngram_table, pipeline_args, idf):
+    """
+    A vectorizer equivalent to the one fitted by the pipeline, built from a loaded ngram table
+    """
+
+    from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+    vocabulary = {ngram: ngram_id for ngram_id, ngram in enumerate(ngram_table.ngrams.tolist())}
+    if pipeline_args['pos_tuples']:
+        cv = processes.PosNGramVectorizer(pipeline_args['min_gram'], pipeline_args['max_gram'],
+                                          max_features=pipeline_args['max_features'], tfidf=pipeline_args['tfidf'])
+    else:
+        vectorizer = TfidfVectorizer if pipeline_args['tfidf'] else CountVectorizer
+        cv = vectorizer(ngram_range=(pipeline_args['min_gram'], pipeline_args['max_gram']),
+                        max_features=pipeline_args['max_features'])
+        cv.fixed_vocabulary_ = False
+    cv.vocabulary_ = vocabulary
+    if idf is not None:
+        cv.idf_ = idf
+    return cv
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+
+"""Columnar on disk storage for the outputs of the ngram pipeline. Every column is a .npy file that can be memory
+mapped on load: numeric columns as they are, strings as one utf-8 byte buffer with offsets and ragged columns (lists
+of arrays) as one flat array with offsets"""
+
+import contextlib
+import json
+import os
+import shutil
+
+import numpy as np
+from scipy import sparse
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+
+
+def is_ngrams_directory(path):
+    """
+    :param path: Path to check
+
+    :return: Bool, whether path is a directory written by NGrams.save
+    """
+
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+@contextlib.contextmanager
+def replacing_directory(path):
+    """
+    Context manager for writing a directory next to path that only replaces path once it is complete. A failed
+    write leaves an existing directory untouched, and arrays memory mapped from it stay valid as its files are
+    unlinked rather than overwritten.
+
+    :param path: Directory to write, it must not exist, be empty or be a directory written by NGrams.save
+
+    :return: The temporary directory to write into
+    """
+
+    path = os.path.normpath(os.path.abspath(path))
+    if os.path.exists(path) and os.listdir(path) and not is_ngrams_directory(path):
+        raise ValueError('Please choose a path that is new, empty or written by NGrams.save, not:', path)
+
+    parent, base = os.path.split(path)
+    temporary = os.path.join(parent, '.%s.%d.tmp' % (base, os.getpid()))
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    try:
+        yield temporary
+    except BaseException:
+        shutil.rmtree(temporary, ignore_errors=True)
+        raise
+
+    if os.path.exists(path):
+        previous = temporary + '.old'
+        os.rename(path, previous)
+        os.rename(temporary, path)
+        shutil.rmtree(previous, ignore_errors=True)
+    else:
+        os.rename(temporary, path)
+
+
+def write_meta(path, meta):
+    """
+    Write the meta data last, so a directory only counts as saved once every array is written
+
+    :param path: Directory
+    :param meta: Json serializable dict
+    """
+
+    meta = dict(meta, version=FORMAT_VERSION)
+    with open(os.path.join(path, META_FILE), 'w') as meta_file:
+        json.dump(meta, meta_file, indent=1)
+
+
+def read_meta(path):
+    """
+    :param path: Directory written by NGrams.save
+
+    :return: The meta data dict
+    """
+
+    with open(os.path.join(path, META_FILE)) as meta_file:
+        meta = json.load(meta_file)
+    if meta['version'] != FORMAT_VERSION:
+        raise ValueError('Unsupported ngrams format version:', str(meta['version']))
+    return meta
+
+
+def save_array(path, name, array):
+    np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(array))
+
+
+def load_array(path, name, mmap=True):
+    return np.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None)
+
+
+def save_strings(path, name, strings):
+    """
+    Store a list of strings as one utf-8 byte buffer and the offsets of each string in it
+
+    :param path: Directory
+    :param name: File name prefix
+    :param strings: Iterable of str, None is stored as an empty string
+    """
+
+    encoded = [(string or '').encode('utf-8') for string in strings]
+    lengths = np.fromiter((len(string) for string in encoded), dtype=np.int64, count=len(encoded))
+    save_array(path, name + '_bytes', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    save_array(path, name + '_offsets', np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+
+
+def load_strings(path, name):
+    """
+    :param path: Directory
+    :param name: File name prefix
+
+    :return: List of str
+    """
+
+    buffer = load_array(path, name + '_bytes', mmap=False).tobytes()
+    offsets = load_array(path, name + '_offsets', mmap=False).tolist()
+    text = buffer.decode('utf-8')
+    if len(text) != len(buffer):
+        # Byte offsets are only character offsets for ascii text
+        return [buffer[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+    return [text[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def save_ragged(path, name, arrays):
+    """
+    Store a sequence of 1d arrays (or missing values) as one flat array, the offsets of each array and a mask of the
+    present ones
+
+    :param path: Directory
+    :param name: File name prefix
+    :param arrays: Iterable of 1d arrays, anything else (such as NaN) counts as missing
+    """
+
+    present = np.array([isinstance(array, np.ndarray) for array in arrays], dtype=bool)
+    arrays = [array if is_present else np.zeros(0, dtype=np.int64) for array, is_present in zip(arrays, present)]
+    lengths = np.fromiter((len(array) for array in arrays), dtype=np.int64, count=len(arrays))
+    save_array(path, name + '_values', np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.int64))
+    save_array(path, name + '_offsets', np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+    save_array(path, name + '_present', present)
+
+
+def load_ragged(path, name, mmap=True):
+    """
+    :param path: Directory
+    :param name: File name prefix
+    :param mmap: Bool, the arrays are views of the memory mapped flat array rather than copies
+
+    :return: Object array of the arrays, NaN where missing
+    """
+
+    values = load_array(path, name + '_values', mmap=mmap)
+    offsets = load_array(path, name + '_offsets', mmap=False).tolist()
+    present = load_array(path, name + '_present', mmap=False)
+
+    arrays = np.full(len(present), np.nan, dtype=object)
+    for i in np.flatnonzero(present).tolist():
+        arrays[i] = values[offsets[i]:offsets[i + 1]]
+    return arrays
+
+
+def save_matrix(path, name, matrix):
+    """
+    Store a scipy sparse matrix as its raw csr arrays
+
+    :param path: Directory
+    :param name: File name prefix
+    :param matrix: Scipy sparse matrix
+
+    :return: Json serializable dict describing the matrix for load_matrix
+    """
+
+    matrix = sparse.csr_matrix(matrix)
+    save_array(path, name + '_data', matrix.data)
+    save_array(path, name + '_indices', matrix.indices)
+    save_array(path, name + '_indptr', matrix.indptr)
+    return {'name': name, 'shape': list(matrix.shape)}
+
+
+def load_matrix(path, spec, mmap=True):
+    """
+    :param path: Directory
+    :param spec: Dict returned by save_matrix
+    :param mmap: Bool, memory map the data and indices rather than reading them into memory
+
+    :return: Scipy sparse csr matrix
+    """
+
+    name = spec['name']
+    return sparse.csr_matrix((load_array(path, name + '_data', mmap=mmap),
+                              load_array(path, name + '_indices', mmap=mmap),
+                              load_array(path, name + '_indptr', mmap=mmap)),
+                             shape=tuple(spec['shape']), copy=False)
+
+
+def save_frame(path, name, frame):
+    """
+    Store a pandas dataframe column by column: numeric and bool columns as arrays, string columns as strings and
+    columns of arrays (such as Original Data Keys) as ragged. The index is stored as an array if numeric or as
+    strings. Every column is checked before anything is written.
+
+    :param path: Directory
+    :param name: File name prefix
+    :param frame: Pandas dataframe
+
+    :return: Json serializable dict describing the frame for load_frame
+    """
+
+    kinds = [_column_kind(frame[column].values) for column in frame.columns]
+    for column, kind in zip(frame.columns, kinds):
+        if kind is None:
+            raise ValueError('Please choose columns of a type that can be saved from:',
+                             str(['numeric', 'strings', 'arrays']), str(column))
+    index_kind = _column_kind(np.asarray(frame.index))
+    if index_kind not in ('array', 'strings'):
+        raise ValueError('Please choose an index of a type that can be saved from:', str(['numeric', 'strings']))
+
+    columns = []
+    for i, (column, kind) in enumerate(zip(frame.columns, kinds)):
+        _save_column(path, '%s_%d' % (name, i), frame[column].values, kind)
+        columns.append({'name': column, 'kind': kind, 'object': bool(frame[column].dtype == object)})
+    _save_column(path, name + '_index', np.asarray(frame.index), index_kind)
+
+    return {'name': name, 'columns': columns, 'index': index_kind, 'index_object': bool(frame.index.dtype == object)}
+
+
+def _column_kind(values):
+    """
+    :return: The storage kind of an array of column values, array, strings or ragged, None if it cannot be saved
+    """
+
+    if values.dtype.kind in 'biuf':
+        return 'array'
+    if all(isinstance(value, str) or value is None for value in values):
+        return 'strings'
+    if all(isinstance(value, np.ndarray) or (isinstance(value, float) and np.isnan(value)) for value in values):
+        return 'ragged'
+    return None
+
+
+def _save_column(path, name, values, kind):
+    if kind == 'array':
+        save_array(path, name, values)
+    elif kind == 'strings':
+        save_strings(path, name, values)
+    else:
+        save_ragged(path, name, values)
+
+
+def _load_column(path, name, kind, mmap):
+    if kind == 'array':
+        return load_array(path, name, mmap=mmap)
+    if kind == 'strings':
+        return np.array(load_strings(path, name), dtype=object)
+    return load_ragged(path, name, mmap=mmap)
+
+
+def load_frame(path, spec, mmap=True):
+    """
+    :param path: Directory
+    :param spec: Dict returned by save_frame
+    :param mmap: Bool, memory map the numeric and ragged columns
+
+    :return: Pandas dataframe
+    """
+
+    import pandas as pd
+
+    columns = {}
+    for i, column in enumerate(spec['columns']):
+        columns[column['name']] = _load_column(path, '%s_%d' % (spec['name'], i), column['kind'], mmap)
+
+    # Strings saved from object columns stay object columns rather than being inferred as a string dtype
+    for column in spec['columns']:
+        if column['kind'] == 'strings' and column.get('object'):
+            columns[column['name']] = pd.Series(columns[column['name']], dtype=object, copy=False)
+    index = _load_column(path, spec['name'] + '_index', spec.get('index', 'array'), False)
+    index = pd.Index(index, dtype=object if spec.get('index_object') else None)
+
+    frame = pd.DataFrame(columns, columns=[column['name'] for column in spec['columns']], copy=False)
+    frame.index = index
+    return frame
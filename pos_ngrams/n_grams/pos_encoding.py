@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+"""Integer encoding of pos tuple ngrams, (word, tag) pairs are interned to ids and ngrams are built as packed 64 bit
+windows over the id arrays, strings are only produced when decoding the final features"""
+
+import numpy as np
+from scipy import sparse
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+
+
+class PosNGramEncoder():
+    """
+    Encodes batches of pos tuple documents into sparse ngram count matrices. The interned pairs, ngrams and feature
+    ids persist between batches so successive batches share one growing feature space.
+
+    An n-gram is interned as the 64 bit key (id of its first n-1 words << 32) | id of its last pair, so each level
+    is computed from the previous one with vectorized numpy operations over the whole batch.
+    """
+
+    def __init__(self, min_gram=2, max_gram=4):
+        """
+
+        :param min_gram: Int, The minimum n
+        :param max_gram: Int, The maximim n (when 1 only unigrams are generated regardless of min_gram)
+        """
+
+        self.min_gram = min_gram
+        self.max_gram = max_gram
+        self.pair_ids = {}
+        self.levels = {n: {} for n in range(2, max_gram + 1)}
+        self.n_features = 0
+        self._feature_of = {n: np.zeros(0, dtype=np.int64) for n in range(1, max_gram + 1)}
+        self._feature_level = np.zeros(0, dtype=np.int64)
+        self._feature_local = np.zeros(0, dtype=np.int64)
+
+    def emitted_levels(self):
+        """
+        :return: List of the n for which ngrams are features
+        """
+
+        if self.max_gram == 1:
+            return [1]
+        return list(range(self.min_gram, self.max_gram + 1))
+
+    def encode(self, documents):
+        """
+        Count the ngrams of a batch of documents
+
+        :param documents: Iterable of lists of (word, tag) tuples, or of [word, tag] lists (as read from json)
+
+        :return: Scipy sparse csr matrix of counts, one row per document and one column per feature seen so far
+        """
+
+        pair_ids = self.pair_ids
+        ids = []
+        lengths = []
+        for document in documents:
+            for pair in document:
+                try:
+                    pair_id = pair_ids.get(pair)
+                except TypeError:
+                    pair = tuple(pair)
+                    pair_id = pair_ids.get(pair)
+                if pair_id is None:
+                    pair_id = pair_ids[pair] = len(pair_ids)
+                ids.append(pair_id)
+            lengths.append(len(document))
+
+        pairs = np.array(ids, dtype=np.int64)
+        lengths = np.array(lengths, dtype=np.int64)
+        doc_of_token = np.repeat(np.arange(len(lengths)), lengths)
+        starts = np.cumsum(lengths) - lengths
+        remaining = lengths[doc_of_token] - (np.arange(len(pairs)) - starts[doc_of_token])
+
+        emitted = self.emitted_levels()
+        rows = []
+        cols = []
+        positions = np.arange(len(pairs))
+        level_ids = pairs
+        for n in range(1, max(emitted + [1]) + 1):
+            if n > 1:
+                mask = remaining[positions] >= n
+                positions = positions[mask]
+                keys = (level_ids[mask] << _ID_BITS) | pairs[positions + n - 1]
+                level_ids = self._intern(n, keys)
+            if n in emitted:
+                rows.append(doc_of_token[positions])
+                cols.append(self._feature_ids(n, level_ids))
+
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+        matrix = sparse.coo_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)),
+                                   shape=(len(lengths), self.n_features)).tocsr()
+        matrix.sort_indices()
+        return matrix
+
+    def decode(self, feature_ids):
+        """
+        :param feature_ids: Iterable of feature ids
+
+        :return: List with the list of (word, tag) tuples of each feature
+        """
+
+        pairs = list(self.pair_ids)
+        level_keys = {n: np.fromiter(level, dtype=np.int64, count=len(level)) for n, level in self.levels.items()}
+
+        decoded = []
+        for feature_id in feature_ids:
+            n = int(self._feature_level[feature_id])
+            local_id = int(self._feature_local[feature_id])
+            sequence = []
+            while n > 1:
+                key = int(level_keys[n][local_id])
+                sequence.append(key & _ID_MASK)
+                local_id = key >> _ID_BITS
+                n -= 1
+            sequence.append(local_id)
+            decoded.append([pairs[pair_id] for pair_id in reversed(sequence)])
+        return decoded
+
+    def _intern(self, n, keys):
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        level = self.levels[n]
+        unique_ids = np.fromiter((level.setdefault(key, len(level)) for key in unique_keys.tolist()),
+                                 dtype=np.int64, count=len(unique_keys))
+        return unique_ids[inverse.ravel()]
+
+    def _feature_ids(self, n, level_ids):
+        feature_of = self._feature_of[n]
+        size = len(self.levels[n]) if n > 1 else len(self.pair_ids)
+        if len(feature_of) < size:
+            feature_of = np.concatenate([feature_of, np.full(size - len(feature_of), -1, dtype=np.int64)])
+            self._feature_of[n] = feature_of
+
+        unique_ids = np.unique(level_ids)
+        new_ids = unique_ids[feature_of[unique_ids] < 0]
+        feature_of[new_ids] = np.arange(self.n_features, self.n_features + len(new_ids))
+        self._feature_level = np.concatenate([self._feature_level, np.full(len(new_ids), n, dtype=np.int64)])
+        self._feature_local = np.concatenate([self._feature_local, new_ids])
+        self.n_features += len(new_ids)
+
+        return feature_of[level_ids]
@@ -2,9 +2,14 @@
 
 """Functions designed to help n_grams>main run but shouldn't ever need to be called directly by the user."""
 
+import itertools
+
+import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.feature_extraction.text import TfidfVectorizer
+from scipy import sparse
+
+from pos_ngrams.instrumentation import get_instrumentation
+from pos_ngrams.n_grams.pos_encoding import PosNGramEncoder
 
 __author__ = "Peter J Usherwood"
 __python_version__ = "3.5"
@@ -16,7 +21,8 @@ def generate_ngrams(data,
                     text_field_key='Snippet',
                     max_features=1000,
                     tfidf=True,
-                    pos_tuples=False):
+                    pos_tuples=False,
+                    sink=None):
     """
     The main code for generating the ngrams used by the primary class
 
@@ -27,86 +33,741 @@ def generate_ngrams(data,
     :param max_features: Int the maximum number of features to generate
     :param tfidf: Bool, whether to use the rate countvectorizer instead of the deafult counts one
     :param pos_tuples: Bool, if text_key_field is a list of pos_tuples set this to true
-    :return:
+    :param sink: Callable receiving the StageRecord of the ngrams stage, or a list of them (see instrumentation),
+    None is silent
+
+    :return: NGramTable of ngram frequencies, the document-ngram word_frequency_matrix, and the fitted vectorizer
     """
 
-    if pos_tuples:
-        _pos_ngrams = create_pos_ngrams(min_gram, max_gram)
+    from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 
-        def my_analyzer(tokens):
-            """
-            Custom analyser for the countvectorizer when using pos tuples
+    with get_instrumentation(sink).stage('ngrams', rows=len(data)) as stage:
+        if pos_tuples:
+            text = data[text_field_key].values.tolist()
+            cv = PosNGramVectorizer(min_gram, max_gram, max_features=max_features, tfidf=tfidf)
+            word_frequency_matrix = cv.fit_transform(raw_documents=text)
+            ngrams = cv.ngram_table_
+        else:
+            text = data[text_field_key]
 
-            :param tokens: List of pos tuples (one record at a time)
+            if tfidf:
+                cv = TfidfVectorizer(ngram_range=(min_gram, max_gram), max_features=max_features)
+            else:
+                cv = CountVectorizer(ngram_range=(min_gram, max_gram), max_features=max_features)
+            word_frequency_matrix = cv.fit_transform(raw_documents=text.values.astype('U'))
+            ngrams = NGramTable.from_matrix(word_frequency_matrix, cv.vocabulary_)
 
-            :return: List of ngram tokens
-            """
-            tokens = [str(tup) for tup in tokens]
-            return _pos_ngrams(tokens)
+        stage.vocabulary_size = len(ngrams)
+        stage.nnz = word_frequency_matrix.nnz
 
-        text = data[text_field_key].values.tolist()
-        if tfidf:
-            cv = TfidfVectorizer(max_features=50, preprocessor=None, analyzer=my_analyzer)
-        else:
-            cv = CountVectorizer(max_features=50, preprocessor=None, analyzer=my_analyzer)
-        word_frequency_matrix = cv.fit_transform(raw_documents=text)
-    else:
-        text = data[text_field_key]
+    return ngrams, word_frequency_matrix, cv
 
-        if tfidf:
-            cv = TfidfVectorizer(ngram_range=(min_gram, max_gram), max_features=max_features)
-        else:
-            cv = CountVectorizer(ngram_range=(min_gram, max_gram), max_features=max_features)
-        word_frequency_matrix = cv.fit_transform(raw_documents=text.values.astype('U'))
 
-    print(word_frequency_matrix.shape)
+class NGramTable():
+    """
+    Columnar ngram frequency table, ngram ids are the column indices of the word_frequency_matrix
+    """
 
-    freqs = [(word, word_frequency_matrix.getcol(idx).sum(), idx) for word, idx in cv.vocabulary_.items()]
-    ngrams = pd.DataFrame(freqs, columns=['Ngram','Frequency','Index'])
-    ngrams.sort_values(by=['Frequency'], ascending=False, inplace=True)
-    ngrams.reset_index(drop=True, inplace=True)
-    return ngrams, word_frequency_matrix, cv
+    def __init__(self, ngrams, counts, doc_freqs, tokens=None):
+        """
+
+        :param ngrams: Array of ngram strings indexed by ngram id
+        :param counts: Array of the summed matrix values (counts or tfidf weights) per ngram id
+        :param doc_freqs: Array of the number of documents containing each ngram id
+        :param tokens: Optional list of the word tokens of each ngram id, used for searching when the ngram strings
+        are not plain space separated words (pos tuple ngrams)
+        """
+
+        self.ngrams = np.asarray(ngrams, dtype=object)
+        self.counts = np.asarray(counts)
+        self.doc_freqs = np.asarray(doc_freqs)
+        self.tokens = tokens
+
+    def __len__(self):
+        return len(self.ngrams)
+
+    @classmethod
+    def from_matrix(cls, word_frequency_matrix, vocabulary, tokens=None):
+        """
+        Build the table with a single column-wise reduction over the matrix
+
+        :param word_frequency_matrix: Scipy sparse document-ngram matrix
+        :param vocabulary: Dict of ngram string to column index (the vectorizer vocabulary_)
+        :param tokens: Optional list of the word tokens of each ngram id
+
+        :return: NGramTable
+        """
+
+        ngrams = np.empty(word_frequency_matrix.shape[1], dtype=object)
+        ngrams[list(vocabulary.values())] = list(vocabulary.keys())
+        counts = np.asarray(word_frequency_matrix.sum(axis=0)).ravel()
+        doc_freqs = word_frequency_matrix.getnnz(axis=0)
+        return cls(ngrams, counts, doc_freqs, tokens=tokens)
+
+    def top_k(self, k=None):
+        """
+        Ngram ids ordered by descending frequency, ties are broken by ngram id
+
+        :param k: Int, the number of ids to return, None for all. Only the top k are sorted (partial selection)
+
+        :return: Array of ngram ids
+        """
+
+        return top_k_ids(self.counts, k)
+
+    def to_frame(self, k=None):
+        """
+        Build the pandas ngrams dataframe
+
+        :param k: Int, only include the k most frequent ngrams, None for all
+
+        :return: Pandas dataframe with Ngram, Frequency, Index and Document Frequency columns, most frequent first
+        """
+
+        ids = self.top_k(k)
+        return pd.DataFrame({'Ngram': self.ngrams[ids],
+                             'Frequency': self.counts[ids],
+                             'Index': ids,
+                             'Document Frequency': self.doc_freqs[ids]},
+                            columns=['Ngram', 'Frequency', 'Index', 'Document Frequency'])
+
+
+def top_k_ids(counts, k=None):
+    """
+    Ids (positions) of the largest counts in descending order, ties broken by id, using partial selection
+
+    :param counts: Array of counts
+    :param k: Int, the number of ids to return, None for all
+
+    :return: Array of ids
+    """
 
+    n = len(counts)
+    if k is None or k >= n:
+        return np.argsort(-counts, kind='stable')
+    if k <= 0:
+        return np.array([], dtype=np.intp)
 
-def fortify_ngrams_with_ids(ngrams, word_frequency_matrix, take_top_x=300):
+    kth = np.partition(counts, n - k)[n - k]
+    above = np.flatnonzero(counts > kth)
+    ties = np.flatnonzero(counts == kth)[:k - len(above)]
+    ids = np.concatenate([above, ties])
+    return ids[np.lexsort((ids, -counts[ids]))]
 
-    if len(ngrams) < take_top_x:
-        print('Insufficient ngrams to fortify: ' + str(take_top_x) + ' Fortifying all available: ' + str(len(ngrams)))
+
+def fortify_ngrams_with_ids(ngrams, word_frequency_matrix, take_top_x=300, document_index=None, sink=None):
+    """
+    Add an Original Data Keys column holding, for each of the top ngrams, the integer array of the data rows
+    (positions) that contain it
+
+    :param ngrams: Pandas ngrams dataframe with an Index column of ngram ids
+    :param word_frequency_matrix: Scipy sparse document-ngram matrix
+    :param take_top_x: Int, the number of ngrams (from the top of the dataframe) to fortify, None (or more than there
+    are) for all
+    :param document_index: A prebuilt NGramDocumentIndex for word_frequency_matrix, built here if not supplied
+    :param sink: Callable receiving the StageRecord of the fortify stage, or a list of them (see instrumentation),
+    None is silent
+
+    :return: ngrams with the Original Data Keys column, rows past take_top_x are NaN
+    """
+
+    if take_top_x is None or len(ngrams) < take_top_x:
         take_top_x = int(len(ngrams))
 
-    for j in range(take_top_x):
-        ngrams.set_value(ngrams.index[j], 'Original Data Keys', str([i for i, e in enumerate(word_frequency_matrix.getcol(int(ngrams['Index'].iloc[j]))) if e != 0]))
+    with get_instrumentation(sink).stage('fortify', rows=take_top_x):
+        if document_index is None:
+            document_index = NGramDocumentIndex(word_frequency_matrix)
+
+        keys = np.full(len(ngrams), np.nan, dtype=object)
+        for j, ngram_id in enumerate(ngrams['Index'].values[:take_top_x]):
+            keys[j] = document_index.documents(ngram_id)
+        ngrams['Original Data Keys'] = keys
 
     return ngrams
 
 
-def create_pos_ngrams(min_gram, max_gram):
+class NGramDocumentIndex():
     """
-    Create the custom ngram creator used with the custom analyser for pos tuples
+    Inverted index of ngram id to the documents (data row positions) containing it, stored as the offsets and
+    document id arrays of the CSC form of the word_frequency_matrix
+    """
+
+    def __init__(self, word_frequency_matrix):
+        """
 
-    :param min_gram: Int, min gram
-    :param max_gram: Int, max gram
+        :param word_frequency_matrix: Scipy sparse document-ngram matrix
+        """
 
-    :return: Custom ngram creator used with the custom analyser for pos tuples
+        csc = word_frequency_matrix.tocsc(copy=True)
+        csc.eliminate_zeros()
+        csc.sort_indices()
+        self.offsets = csc.indptr
+        self.doc_ids = csc.indices
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def documents(self, ngram_id):
+        """
+        :param ngram_id: Int, the ngram id (column of the word_frequency_matrix)
+
+        :return: Sorted integer array of the document positions containing the ngram
+        """
+
+        return self.doc_ids[self.offsets[ngram_id]:self.offsets[ngram_id + 1]]
+
+    def document_counts(self):
+        """
+        :return: Integer array of the number of documents containing each ngram id
+        """
+
+        return np.diff(self.offsets)
+
+
+class NGramTokenIndex():
     """
+    Index of each unigram token to the ids of the ngrams containing it, tokens are kept sorted for prefix queries
+    """
+
+    def __init__(self, ngrams, tokenize=str.split):
+        """
+
+        :param ngrams: Array of ngram strings indexed by ngram id
+        :param tokenize: Function splitting an ngram string into its tokens
+        """
 
-    def _pos_ngrams(tokens):
+        tokens = []
+        token_ngram_ids = []
+        for ngram_id, ngram in enumerate(ngrams):
+            ngram_tokens = set(tokenize(ngram))
+            tokens += ngram_tokens
+            token_ngram_ids += [ngram_id] * len(ngram_tokens)
+
+        self.tokens, inverse = np.unique(np.array(tokens, dtype=str), return_inverse=True)
+        token_ngram_ids = np.array(token_ngram_ids, dtype=np.int64)
+        order = np.lexsort((token_ngram_ids, inverse))
+        self.ngram_ids = token_ngram_ids[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(inverse, minlength=len(self.tokens)))])
+        self._positions = {token: position for position, token in enumerate(self.tokens.tolist())}
+
+    @classmethod
+    def from_arrays(cls, tokens, ngram_ids, offsets):
+        """
+        Rebuild an index from the arrays of a built one (as saved by NGrams.save) without tokenizing the ngrams
+
+        :param tokens: Sorted array of the distinct tokens
+        :param ngram_ids: Array of the ngram ids of each token, grouped by token
+        :param offsets: Array of the start of each token's ngram ids, with the end appended
+
+        :return: NGramTokenIndex
+        """
+
+        index = cls.__new__(cls)
+        index.tokens = np.asarray(tokens, dtype=str)
+        index.ngram_ids = ngram_ids
+        index.offsets = offsets
+        index._positions = {token: position for position, token in enumerate(index.tokens.tolist())}
+        return index
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def lookup(self, token):
+        """
+        :param token: String, an exact token
+
+        :return: Sorted array of the ids of ngrams containing the token
         """
-        Custom ngram creator used with the custom analyser for pos tuples
 
-        :param tokens: List of pos tuples
+        position = self._positions.get(token)
+        if position is None:
+            return np.array([], dtype=np.int64)
+        return self.ngram_ids[self.offsets[position]:self.offsets[position + 1]]
 
-        :return: List of ngram tokens
+    def lookup_prefix(self, prefix):
         """
-        min_n, max_n = min_gram, max_gram
-        if max_n != 1:
-            original_tokens = tokens
-            tokens = []
-            n_original_tokens = len(original_tokens)
-            for n in range(min_n,min(max_n + 1, n_original_tokens + 1)):
-                for i in range(n_original_tokens - n + 1):
-                    tokens.append(" ".join(original_tokens[i: i + n]))
+        :param prefix: String, a token prefix
+
+        :return: Sorted array of the ids of ngrams containing any token starting with the prefix
+        """
+
+        start = np.searchsorted(self.tokens, prefix, side='left')
+        end = np.searchsorted(self.tokens, prefix + '\U0010ffff', side='left')
+        return np.unique(self.ngram_ids[self.offsets[start]:self.offsets[end]])
+
+    def search(self, tokens, operator='and', prefix=False):
+        """
+        :param tokens: List of query tokens
+        :param operator: String, 'and' for ngrams containing every token, 'or' for ngrams containing any token
+        :param prefix: Bool, match tokens starting with the query tokens rather than exact tokens
+
+        :return: Sorted array of matching ngram ids
+        """
+
+        if operator not in ['and', 'or']:
+            raise ValueError('Please choose a valid operator from:', str(['and', 'or']))
+
+        lookup = self.lookup_prefix if prefix else self.lookup
+        matches = [lookup(token) for token in tokens]
+        if not matches:
+            return np.array([], dtype=np.int64)
+
+        ngram_ids = matches[0]
+        for token_ngram_ids in matches[1:]:
+            if operator == 'and':
+                ngram_ids = np.intersect1d(ngram_ids, token_ngram_ids, assume_unique=True)
+            else:
+                ngram_ids = np.union1d(ngram_ids, token_ngram_ids)
+        return ngram_ids
+
+
+AGGREGATE_STATS = ['count', 'sum', 'mean', 'min', 'max', 'std']
+
+
+def aggregate_ngram_metadata(word_frequency_matrix, metadata, ngram_ids=None, stats=AGGREGATE_STATS, ddof=1):
+    """
+    Aggregate numeric metadata columns over the documents containing each ngram. Count, sum and mean are sparse
+    products of the document-ngram indicator matrix with the metadata, min, max and std are segment reductions over
+    the CSC posting lists, there is no python loop over ngrams. Missing values are skipped as in pandas.
+
+    :param word_frequency_matrix: Scipy sparse document-ngram matrix
+    :param metadata: Pandas dataframe (or 2d array) of numeric columns, one row per document in matrix order
+    :param ngram_ids: Array of ngram ids to aggregate, None for all
+    :param stats: List of statistics from AGGREGATE_STATS
+    :param ddof: Int, delta degrees of freedom for std (1 matches pandas)
+
+    :return: Pandas dataframe indexed by ngram id with a '<column> <Stat>' column for every metadata column and stat
+    """
+
+    for stat in stats:
+        if stat not in AGGREGATE_STATS:
+            raise ValueError('Please choose valid stats from:', str(AGGREGATE_STATS))
+
+    if isinstance(metadata, pd.DataFrame):
+        column_names = [str(column) for column in metadata.columns]
+    elif isinstance(metadata, pd.Series):
+        column_names = [str(metadata.name)]
+    else:
+        column_names = None
+    values = np.asarray(metadata, dtype=float)
+    if values.ndim == 1:
+        values = values.reshape(-1, 1)
+    if column_names is None:
+        column_names = [str(i) for i in range(values.shape[1])]
+
+    indicator = word_frequency_matrix.tocsc(copy=True)
+    indicator.eliminate_zeros()
+    if ngram_ids is None:
+        ngram_ids = np.arange(indicator.shape[1])
+    else:
+        ngram_ids = np.asarray(ngram_ids, dtype=int)
+        indicator = indicator[:, ngram_ids]
+    indicator.sort_indices()
+    indicator.data = np.ones(len(indicator.data))
+
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.)
+    indicator_t = indicator.T.tocsr()
+    count = indicator_t.dot(valid.astype(float))
+    total = indicator_t.dot(filled)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+
+    offsets = indicator.indptr
+    doc_ids = indicator.indices
+    nonempty = np.diff(offsets) > 0
+    starts = offsets[:-1][nonempty]
+    ngram_of_entry = np.repeat(np.arange(indicator.shape[1]), np.diff(offsets))
+
+    aggregates = {}
+    for c, column_name in enumerate(column_names):
+        entry_values = values[doc_ids, c]
+        results = {'count': count[:, c], 'sum': total[:, c], 'mean': mean[:, c]}
+
+        if 'min' in stats or 'max' in stats:
+            results['min'] = np.full(len(ngram_ids), np.nan)
+            results['max'] = np.full(len(ngram_ids), np.nan)
+            if len(entry_values):
+                results['min'][nonempty] = np.fmin.reduceat(entry_values, starts)
+                results['max'][nonempty] = np.fmax.reduceat(entry_values, starts)
+
+        if 'std' in stats:
+            deviations = np.where(np.isnan(entry_values), 0., entry_values - mean[ngram_of_entry, c])
+            squares = np.bincount(ngram_of_entry, weights=deviations ** 2, minlength=len(ngram_ids))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                results['std'] = np.where(count[:, c] > ddof, np.sqrt(squares / (count[:, c] - ddof)), np.nan)
+
+        for stat in stats:
+            aggregates[column_name + ' ' + stat.title()] = results[stat]
+
+    return pd.DataFrame(aggregates, index=pd.Index(ngram_ids, name='Index'))
+
+
+class PosNGramVectorizer():
+    """
+    Vectorizer for documents that are lists of pos tuples, it mirrors the parts of the CountVectorizer and
+    TfidfVectorizer interface used by NGrams. Feature names have the form "('word', 'TAG') ('word', 'TAG')".
+    """
+
+    def __init__(self, min_gram=2, max_gram=4, max_features=1000, tfidf=True):
+        """
+
+        :param min_gram: Int, The minimum n
+        :param max_gram: Int, The maximim n
+        :param max_features: Int the maximum number of features to generate, None for all
+        :param tfidf: Bool, whether to tfidf weight the counts
+        """
+
+        self.min_gram = min_gram
+        self.max_gram = max_gram
+        self.max_features = max_features
+        self.tfidf = tfidf
+
+    def fit_transform(self, raw_documents):
+        """
+        :param raw_documents: Iterable of lists of (word, tag) tuples
+
+        :return: Scipy sparse document-ngram matrix
+        """
+
+        counter = IncrementalNGramCounter(self.min_gram, self.max_gram, pos_tuples=True)
+        counter.partial_count(raw_documents)
+        self.ngram_table_, word_frequency_matrix, fitted = counter.finalize(max_features=self.max_features,
+                                                                            tfidf=self.tfidf)
+        self.vocabulary_ = fitted.vocabulary_
+        if self.tfidf:
+            self.idf_ = fitted.idf_
+        return word_frequency_matrix
+
+    def get_feature_names_out(self):
+        """
+        :return: Array of feature names in column order
+        """
+
+        names = np.empty(len(self.vocabulary_), dtype=object)
+        names[list(self.vocabulary_.values())] = list(self.vocabulary_.keys())
+        return names
+
+
+class IncrementalNGramCounter():
+    """
+    Counts ngrams over successive batches of documents with a growing vocabulary, so the text never has to be held
+    in memory all at once. finalize applies max_features and tfidf with the same semantics as fitting a
+    CountVectorizer/TfidfVectorizer over all the batches at once.
+
+    By default the sparse counts of every document over the full vocabulary are kept until finalize, which can be
+    larger than the result. With keep_matrix=False only the vocabulary and its term and document frequencies are
+    kept, select then picks the max_features and a second pass of transform over the same documents builds the
+    matrix over these features only.
+    """
+
+    def __init__(self, min_gram, max_gram, pos_tuples=False, keep_matrix=True):
+        """
+
+        :param min_gram: Int, The minimum n
+        :param max_gram: Int, The maximim n
+        :param pos_tuples: Bool, if the documents are lists of pos_tuples set this to true
+        :param keep_matrix: Bool, keep the counts of every document for finalize, False for a first pass that only
+        counts the frequencies (see select and transform)
+        """
+
+        from sklearn.feature_extraction.text import CountVectorizer
+
+        self.min_gram = min_gram
+        self.max_gram = max_gram
+        self.pos_tuples = pos_tuples
+        self.keep_matrix = keep_matrix
+        if pos_tuples:
+            self._encoder = PosNGramEncoder(min_gram, max_gram)
+        else:
+            self._analyze = CountVectorizer(ngram_range=(min_gram, max_gram)).build_analyzer()
+
+        self.vocabulary = {}
+        self.n_documents = 0
+        self.term_counts = np.zeros(0, dtype=np.int64)
+        self.doc_freqs = np.zeros(0, dtype=np.int64)
+        self._matrices = []
+        self._selection = None
+        self._new_matrices = []
+        self._selected_counts = None
+        self._sorted_terms = (np.zeros(0, dtype=object), np.zeros(0, dtype=np.int64))
+
+    def partial_count(self, documents):
+        """
+        Count the ngrams of a batch of documents
+
+        :param documents: Pandas series or list of strings, or of lists of pos tuples if pos_tuples
+        """
+
+        if self.pos_tuples:
+            self._add_matrix(self._encoder.encode(documents))
+        else:
+            self._add_matrix(self._count_text(documents, self.vocabulary, grow=True))
+
+    def _count_text(self, documents, vocabulary, grow):
+        """
+        :param documents: Pandas series or list of strings
+        :param vocabulary: Dict of ngram to column
+        :param grow: Bool, add unseen ngrams to vocabulary, otherwise they are not counted
+
+        :return: Scipy sparse csr matrix of counts, one row per document and one column per vocabulary entry
+        """
+
+        documents = np.asarray(documents, dtype=object).astype('U')
+        analyze = self._analyze
+        j_indices = []
+        values = []
+        indptr = [0]
+        for document in documents:
+            feature_counter = {}
+            for feature in analyze(document):
+                feature_idx = vocabulary.get(feature)
+                if feature_idx is None:
+                    if not grow:
+                        continue
+                    feature_idx = vocabulary[feature] = len(vocabulary)
+                feature_counter[feature_idx] = feature_counter.get(feature_idx, 0) + 1
+            j_indices.extend(feature_counter.keys())
+            values.extend(feature_counter.values())
+            indptr.append(len(j_indices))
+
+        matrix = sparse.csr_matrix((np.asarray(values, dtype=np.int64),
+                                    np.asarray(j_indices, dtype=np.int64),
+                                    np.asarray(indptr, dtype=np.int64)),
+                                   shape=(len(indptr) - 1, len(vocabulary)))
+        matrix.sort_indices()
+        return matrix
+
+    def _add_matrix(self, matrix):
+        n_features = self.n_features()
+        self.term_counts = self._grow(self.term_counts, n_features)
+        self.doc_freqs = self._grow(self.doc_freqs, n_features)
+        self.term_counts += np.asarray(matrix.sum(axis=0)).ravel().astype(np.int64)
+        self.doc_freqs += np.bincount(matrix.indices, minlength=n_features)
+        self.n_documents += matrix.shape[0]
+        if self.keep_matrix:
+            self._matrices.append(matrix)
+            self._new_matrices.append(matrix)
+
+    def n_features(self):
+        """
+        :return: Int, the number of distinct ngrams counted so far
+        """
+
+        if self.pos_tuples:
+            return self._encoder.n_features
+        return len(self.vocabulary)
+
+    def count_matrix(self):
+        """
+        :return: Scipy sparse csr matrix of the counts of every document over the full vocabulary
+        """
+
+        if not self.keep_matrix:
+            raise ValueError('The counts of each document are only kept with keep_matrix=True, use transform')
+
+        n_features = self.n_features()
+        matrices = [self._resize(matrix, n_features) for matrix in self._matrices]
+        if not matrices:
+            return sparse.csr_matrix((0, n_features), dtype=np.int64)
+        matrix = sparse.vstack(matrices, format='csr') if len(matrices) > 1 else matrices[0]
+        self._matrices = [matrix]
+        return matrix
+
+    def select(self, max_features=1000):
+        """
+        Choose the max_features most frequent ngrams counted so far as the columns of the word_frequency_matrix
+
+        :param max_features: Int the maximum number of features to generate, None for all
+
+        :return: Array of the selected feature ids in column order
+        """
+
+        if not self.n_features():
+            raise ValueError('empty vocabulary; perhaps the documents only contain stop words')
+
+        if self.pos_tuples:
+            self._selection = self._select_pos_features(max_features)
+        else:
+            feature_ids, vocabulary = self._select_features(max_features)
+            self._selection = (feature_ids, vocabulary, None)
+        return self._selection[0]
+
+    def transform(self, documents):
+        """
+        Count a batch of documents over the features chosen by select only, the vocabulary and frequencies are not
+        updated. This is the second pass over documents already counted with partial_count.
+
+        :param documents: Pandas series or list of strings, or of lists of pos tuples if pos_tuples
+
+        :return: Scipy sparse csr matrix of counts, one row per document and one column per selected feature
+        """
+
+        if self._selection is None:
+            raise ValueError('Run select before transform')
+
+        feature_ids, vocabulary, tokens = self._selection
+        if self.pos_tuples:
+            return self._encoder.encode(documents)[:, feature_ids]
+        return self._count_text(documents, vocabulary, grow=False)
+
+    def finalize(self, max_features=1000, tfidf=True, count_matrix=None):
+        """
+        Restrict the vocabulary to the max_features most frequent ngrams and build the word_frequency_matrix
+
+        :param max_features: Int the maximum number of features to generate, None for all
+        :param tfidf: Bool, whether to tfidf weight the counts
+        :param count_matrix: Scipy sparse matrix of the counts of every document over the features chosen by select
+        (the stacked output of transform), by default the features are selected and the counts kept by
+        partial_count are used
+
+        :return: NGramTable of ngram frequencies, the document-ngram word_frequency_matrix, and a vectorizer
+        equivalent to one fitted over all the documents counted so far
+        """
+
+        from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
+
+        if count_matrix is None:
+            self.select(max_features)
+        elif self._selection is None:
+            raise ValueError('Run select before finalize with a count_matrix')
+        feature_ids, vocabulary, tokens = self._selection
+
+        if count_matrix is None:
+            word_frequency_matrix = self._selected_count_matrix(feature_ids)
+        else:
+            if count_matrix.shape != (self.n_documents, len(feature_ids)):
+                raise ValueError('The count_matrix does not match the documents counted, expected shape:',
+                                 str((self.n_documents, len(feature_ids))))
+            word_frequency_matrix = sparse.csr_matrix(count_matrix)
+
+        idf = None
+        if tfidf:
+            n_documents = self.n_documents + 1
+            idf = np.full(len(feature_ids), n_documents, dtype=np.float64)
+            idf /= self.doc_freqs[feature_ids].astype(np.float64) + 1.
+            np.log(idf, out=idf)
+            idf += 1.
+
+            transformer = TfidfTransformer()
+            transformer.idf_ = idf
+            word_frequency_matrix = transformer.transform(word_frequency_matrix)
+
+        if self.pos_tuples:
+            cv = PosNGramVectorizer(self.min_gram, self.max_gram, max_features=max_features, tfidf=tfidf)
+            cv.vocabulary_ = vocabulary
+            if tfidf:
+                cv.idf_ = idf
+        elif tfidf:
+            cv = TfidfVectorizer(ngram_range=(self.min_gram, self.max_gram), max_features=max_features)
+            cv.vocabulary_ = vocabulary
+            cv.idf_ = idf
+        else:
+            cv = CountVectorizer(ngram_range=(self.min_gram, self.max_gram), max_features=max_features)
+            cv.vocabulary_ = vocabulary
+        cv.fixed_vocabulary_ = False
+
+        ngrams = NGramTable.from_matrix(word_frequency_matrix, cv.vocabulary_, tokens=tokens)
+        return ngrams, word_frequency_matrix, cv
+
+    def _selected_count_matrix(self, feature_ids):
+        """
+        The counts of every document over the selected features. While the selection is the same as at the last
+        finalize only the batches counted since are sliced and appended to the previous result, otherwise the full
+        history is sliced again.
+
+        :return: Scipy sparse csr matrix
+        """
+
+        previous = self._selected_counts
+        if previous is not None and np.array_equal(previous[0], feature_ids):
+            n_features = self.n_features()
+            matrix = sparse.vstack([previous[1]] + [self._resize(matrix, n_features)[:, feature_ids]
+                                                    for matrix in self._new_matrices], format='csr')
+        else:
+            matrix = self.count_matrix()[:, feature_ids]
+
+        self._selected_counts = (feature_ids, matrix)
+        self._new_matrices = []
+        return matrix
+
+    def _select_features(self, max_features):
+        """
+        Sort the vocabulary by name and keep the max_features most frequent, exactly as CountVectorizer does
+
+        :return: Array of the kept feature ids in column order, and the new vocabulary dict
+        """
+
+        terms, term_ids = self._sorted_vocabulary()
+
+        kept = np.arange(len(terms))
+        if max_features is not None and len(terms) > max_features:
+            kept = np.sort((-self.term_counts[term_ids]).argsort()[:max_features])
+        vocabulary = {terms[i]: new_id for new_id, i in enumerate(kept.tolist())}
+        return term_ids[kept], vocabulary
+
+    def _sorted_vocabulary(self):
+        """
+        The vocabulary sorted by name, kept between calls so only the ngrams added since the last call are sorted
+        and merged in
+
+        :return: Object array of the ngrams sorted by name, and the array of their feature ids
+        """
+
+        terms, term_ids = self._sorted_terms
+        n_sorted = len(term_ids)
+        if n_sorted < len(self.vocabulary):
+            new_terms = sorted(itertools.islice(self.vocabulary, n_sorted, None))
+            new_ids = np.fromiter((self.vocabulary[term] for term in new_terms), dtype=np.int64,
+                                  count=len(new_terms))
+            new_terms = np.array(new_terms, dtype=object)
+            positions = np.searchsorted(terms, new_terms)
+            terms = np.insert(terms, positions, new_terms)
+            term_ids = np.insert(term_ids, positions, new_ids)
+            self._sorted_terms = (terms, term_ids)
+        return terms, term_ids
+
+    def _select_pos_features(self, max_features):
+        """
+        Keep the max_features most frequent pos ngrams, ties at the cutoff going to the ngrams first by name as with a
+        stable sort over the CountVectorizer feature order. Only the kept ngrams and those tied at the cutoff are
+        decoded to strings, columns are then ordered by name
+
+        :return: Array of the kept feature ids in column order, the new vocabulary dict and the word tokens of each
+        column
+        """
+
+        counts = self.term_counts
+        if max_features is None or max_features >= len(counts):
+            candidates = np.arange(len(counts))
+        elif max_features <= 0:
+            candidates = np.array([], dtype=np.int64)
+        else:
+            kth = np.partition(counts, len(counts) - max_features)[len(counts) - max_features]
+            above = np.flatnonzero(counts > kth)
+            ties = np.flatnonzero(counts == kth)
+            tie_names = self._pos_feature_names(self._encoder.decode(ties))
+            ties = ties[sorted(range(len(ties)), key=tie_names.__getitem__)[:max_features - len(above)]]
+            candidates = np.concatenate([above, ties])
+
+        decoded = self._encoder.decode(candidates)
+        names = self._pos_feature_names(decoded)
+        order = sorted(range(len(names)), key=names.__getitem__)
+
+        vocabulary = {names[i]: new_id for new_id, i in enumerate(order)}
+        tokens = [[word for word, tag in decoded[i]] for i in order]
+        return candidates[order], vocabulary, tokens
+
+    @staticmethod
+    def _pos_feature_names(decoded):
+        return [" ".join([str(pair) for pair in pairs]) for pairs in decoded]
 
-        return tokens
+    @staticmethod
+    def _resize(matrix, n_features):
+        return sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], n_features))
 
-    return _pos_ngrams
+    @staticmethod
+    def _grow(array, size):
+        if len(array) >= size:
+            return array
+        return np.concatenate([array, np.zeros(size - len(array), dtype=array.dtype)])
@@ -2,13 +2,15 @@
 
 """Functions for Part Of Speech (POS) tagging"""
 
-import nltk
+import hashlib
 import os
 import numpy as np
-from itertools import compress
-from nltk.corpus import brown
-import string
 import pickle
+import shutil
+
+from pos_ngrams.processing.compact_tagger import export_tagger, is_compact_tagger
+from pos_ngrams.processing.pos_tagging import evict_tagger
+from pos_ngrams.tagsets import get_tagset_mapper
 
 
 __author__ = "Peter J Usherwood"
@@ -24,9 +26,10 @@ def parse_browns_corpus_to_simplified(browns_tagged_sents):
     :return: Array of sentences with simplified tags
     """
 
+    simplify = get_tagset_mapper('brown')
     sents_simplified = []
     for sent in browns_tagged_sents:
-        sents_simplified.append([(tuples[0], simplify_brown_tags(tuples[1])) for tuples in sent])
+        sents_simplified.append([(tuples[0], simplify(tuples[1])) for tuples in sent])
 
     return sents_simplified
 
@@ -40,27 +43,35 @@ def parse_corpus_to_simplified_es(tagged_sents):
     :return: Array of sentences with simplified tags
     """
 
+    simplify = get_tagset_mapper('es')
     sents_simplified = []
     for sent in tagged_sents:
-        sents_simplified.append([(tuples[0], simplify_tags_es(tuples[1])) for tuples in sent])
+        sents_simplified.append([(tuples[0], simplify(tuples[1])) for tuples in sent])
 
     return sents_simplified
 
 
 def train_pos_tagger(name='simplified_en',
-                     corpus=brown.tagged_sents(),
+                     corpus=None,
                      tagset='brown',
                      simplified=True,
                      regex=True,
                      regex_language='en',
-                     train_test_split=.8
+                     train_test_split=.8,
+                     compact=True,
+                     seed=None,
+                     n_jobs=1,
+                     cache=True,
+                     path=None,
+                     corpus_key=None
                      ):
     """
     Train the tag pos tagger and persist to disk
 
     :param name: The name of the file to persist to
     :param corpus: The tagged corpus to train and test on, it should be a list of sentences, each sentence should
-    be a list of tuples with the word first and the pos tag second.
+    be a list of tuples with the word first and the pos tag second, or an nltk tagged corpus reader. By default the
+    NLTK Browns corpus is loaded for the brown tagset.
     :param tagset: String, the type of tags to be used, options:
                     - 'brown' (en)
                     - 'parole' (es)
@@ -68,15 +79,22 @@ def train_pos_tagger(name='simplified_en',
     :param regex: Bool, True to use regex to infer the tags that cant
     :param regex_language: String, langauge of the training corpus, used for regex tags.
     :param train_test_split: Decimal between 0 and 1, the ration of the train to test split
+    :param compact: Bool, also export the tagger to the compact memory mapped format (see compact_tagger) in
+    models/name/, which load_tagger prefers over the pickle. Otherwise a compact export of an earlier training is
+    removed so it does not shadow the new pickle
+    :param seed: Int, seed for the train test split, None for an unseeded split
+    :param n_jobs: Int, number of processes counting the contexts, None or -1 uses every cpu
+    :param cache: Bool, reuse the simplified and encoded corpus cached by an earlier run, or the path of the cache
+    directory (see load_encoded_corpus)
+    :param path: Directory to save the tagger to, by default models/
+    :param corpus_key: String naming the contents of a list corpus, so it is cached (see load_encoded_corpus)
     """
 
+    import nltk
+
     default_tag = None
     patterns = None
 
-    if not corpus:
-        print('Error no corpus supplied')
-        return False
-
     if tagset not in ['brown', 'parole']:
         raise Exception('Please choose a valid tagset from:', str(['brown', 'parole']))
 
@@ -84,11 +102,6 @@ def train_pos_tagger(name='simplified_en',
 
         default_tag = 'NN'
 
-        if tagset == 'brown':
-            corpus = parse_browns_corpus_to_simplified(corpus)
-        elif tagset == 'parole':
-            corpus = parse_corpus_to_simplified_es(corpus)
-
         if regex_language == 'en':
             patterns = [(r'.*ing$', 'VB'),               # gerunds
                         (r'.*ed$', 'VB'),                # simple past
@@ -112,164 +125,391 @@ def train_pos_tagger(name='simplified_en',
                         (r'^-?[0-9]+(.[0-9]+)?$', 'CD'),  # cardinal numbers
                         (r'.*', 'NN')]  # nouns (default)
 
-    msk = np.random.rand(len(corpus)) < train_test_split
-    train = list(compress(corpus, msk))
-    test = list(compress(corpus, [not i for i in msk]))
+    encoded = load_encoded_corpus(corpus, tagset=tagset, simplified=simplified, cache=cache, corpus_key=corpus_key)
+    if encoded is None or not encoded.n_sentences:
+        print('Error no corpus supplied')
+        return False
+
+    if seed is None:
+        msk = np.random.rand(encoded.n_sentences) < train_test_split
+    else:
+        msk = np.random.RandomState(seed).rand(encoded.n_sentences) < train_test_split
 
     if regex:
         t0 = nltk.RegexpTagger(patterns)
     else:
         t0 = nltk.DefaultTagger(default_tag)
 
-    t1 = nltk.UnigramTagger(train, backoff=t0)
-    t2 = nltk.BigramTagger(train, backoff=t1)
+    unigram_model, bigram_model = train_context_models(encoded, msk, t0, n_jobs=n_jobs)
+    # nltk rejects an empty model, a context level that learned nothing is left out of the chain
+    t1 = nltk.UnigramTagger(model=unigram_model, backoff=t0) if unigram_model else t0
+    t2 = nltk.BigramTagger(model=bigram_model, backoff=t1) if bigram_model else t1
 
-    print('Accuracy ', str(t2.evaluate(test)))
-    print('Saving to models/' + name + '.pkl')
+    print('Accuracy ', str(t2.accuracy(encoded.tagged_sents(~msk))))
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../models')
+    print('Saving to ' + os.path.join(path, name + '.pkl'))
 
-    file = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../models/'
-                        + name + '.pkl')
+    file = os.path.join(path, name + '.pkl')
     save = open(file, 'wb')
     pickle.dump(t2, save, -1)
     save.close()
 
+    compact_path = os.path.join(path, name)
+    if compact:
+        print('Saving to ' + compact_path + '/')
+        export_tagger(t2, compact_path)
+    elif is_compact_tagger(compact_path):
+        print('Removing the compact tagger of an earlier training ' + compact_path + '/')
+        shutil.rmtree(compact_path)
+    evict_tagger(name)
+
     return True
 
 
+class EncodedCorpus():
+    """
+    A tagged corpus stored as integer arrays: the word id and tag code of every token and the length of every sentence
+    """
+
+    def __init__(self, words, tags, word_ids, tag_codes, lengths):
+        """
+
+        :param words: List of the distinct words, indexed by word id
+        :param tags: List of the distinct tags, indexed by tag code
+        :param word_ids: Integer array with the word id of every token
+        :param tag_codes: Integer array with the tag code of every token
+        :param lengths: Integer array with the number of tokens in every sentence
+        """
+
+        self.words = list(words)
+        self.tags = list(tags)
+        self.word_ids = np.asarray(word_ids, dtype=np.int32)
+        self.tag_codes = np.asarray(tag_codes, dtype=np.int16)
+        self.lengths = np.asarray(lengths, dtype=np.int32)
+
+    @property
+    def n_sentences(self):
+        return len(self.lengths)
+
+    @classmethod
+    def from_tagged_sents(cls, tagged_sents, simplify=None):
+        """
+        Encode a tagged corpus, tags are simplified once per distinct tag rather than once per token
+
+        :param tagged_sents: Iterable of sentences, each a list of (word, tag) tuples
+        :param simplify: Function mapping a tag to its simplified tag, None to keep the tags
+
+        :return: EncodedCorpus
+        """
+
+        word_index = {}
+        tag_index = {}
+        word_ids = []
+        tag_ids = []
+        lengths = []
+        for sent in tagged_sents:
+            for word, tag in sent:
+                word_ids.append(word_index.setdefault(word, len(word_index)))
+                tag_ids.append(tag_index.setdefault(tag, len(tag_index)))
+            lengths.append(len(sent))
+
+        raw_tags = list(tag_index)
+        if simplify is not None:
+            raw_tags = [simplify(tag) for tag in raw_tags]
+        tags = list(dict.fromkeys(raw_tags))
+        codes = {tag: code for code, tag in enumerate(tags)}
+        raw_codes = np.array([codes[tag] for tag in raw_tags], dtype=np.int16)
+
+        return cls(list(word_index), tags, word_ids, raw_codes[np.asarray(tag_ids, dtype=np.int64)], lengths)
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: Path of an .npz file written by save
+
+        :return: EncodedCorpus
+        """
+
+        with np.load(path) as arrays:
+            return cls(arrays['words'].tolist(), arrays['tags'].tolist(), arrays['word_ids'], arrays['tag_codes'],
+                       arrays['lengths'])
+
+    def save(self, path):
+        """
+        :param path: Path of the .npz file to write
+        """
+
+        np.savez(path, words=np.array(self.words, dtype='U'), tags=np.array(self.tags, dtype='U'),
+                 word_ids=self.word_ids, tag_codes=self.tag_codes, lengths=self.lengths)
+
+    def tagged_sents(self, mask=None):
+        """
+        Decode sentences back to lists of (word, tag) tuples
+
+        :param mask: Boolean array selecting sentences, None for all
+
+        :return: List of sentences, each a list of (word, tag) tuples
+        """
+
+        lengths = self.lengths
+        token_mask = None
+        if mask is not None:
+            token_mask = np.repeat(mask, lengths)
+            lengths = lengths[mask]
+
+        words = np.array(self.words, dtype=object)[self.word_ids if token_mask is None
+                                                   else self.word_ids[token_mask]].tolist()
+        tags = np.array(self.tags, dtype=object)[self.tag_codes if token_mask is None
+                                                 else self.tag_codes[token_mask]].tolist()
+        tokens = list(zip(words, tags))
+
+        starts = np.cumsum(lengths) - lengths
+        return [tokens[start:start + length] for start, length in zip(starts.tolist(), lengths.tolist())]
+
+
+def corpus_cache_dir():
+    """
+    The default directory of the cached encoded corpora, in the user cache directory rather than the installed package
+
+    :return: Path to pos_ngrams/corpora/ in $XDG_CACHE_HOME, by default ~/.cache
+    """
+
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'pos_ngrams', 'corpora')
+
+
+def corpus_cache_path(corpus_key, tagset, simplified, cache_dir=None):
+    """
+    Path of a cached encoded corpus, simplified corpora are named by the fingerprint of the tagset rules as well so
+    a change of the rules is never served a corpus simplified under the old ones
+
+    :param corpus_key: String naming the corpus contents
+    :param tagset: String, the tagset of the corpus
+    :param simplified: Bool, whether the tags are simplified
+    :param cache_dir: Directory of the cache, by default corpus_cache_dir()
+
+    :return: Path to the .npz file
+    """
+
+    rules = _tagset_mapper(tagset).fingerprint if simplified else 'full'
+    return os.path.join(cache_dir or corpus_cache_dir(), tagset + '_' + rules + '_' + corpus_key + '.npz')
+
+
+def corpus_files_key(reader):
+    """
+    A key for the contents of an nltk corpus reader from the names, sizes and modification times of its files, so the
+    corpus does not have to be read to find its cached copy
+
+    :param reader: nltk CorpusReader, for example nltk.corpus.brown
+
+    :return: String key
+    """
+
+    root = reader.root
+    digest = hashlib.sha1(str(root).encode('utf-8'))
+    if hasattr(root, 'zipfile'):
+        # The corpus is read from inside a zip file, which changes whenever any of its files does
+        paths = [('', root.zipfile.filename)]
+    else:
+        paths = [(fileid, os.path.join(root.path, fileid)) for fileid in reader.fileids()]
+    for fileid, path in paths:
+        stat = os.stat(path)
+        digest.update(('%s\x00%d\x00%d\x01' % (fileid, stat.st_size, stat.st_mtime_ns)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def load_encoded_corpus(corpus=None, tagset='brown', simplified=True, cache=True, corpus_key=None):
+    """
+    Simplify and encode a tagged corpus, reusing the copy cached on disk by a previous run. Corpora read by an nltk
+    corpus reader (the default Browns corpus included) are cached under a key of their files (see corpus_files_key),
+    lists of sentences are only cached under a corpus_key given by the caller.
+
+    :param corpus: The tagged corpus, an nltk tagged corpus reader or a list of sentences of (word, tag) tuples, None
+    for the NLTK Browns corpus
+    :param tagset: String, 'brown' or 'parole'
+    :param simplified: Bool, True to parse the tags to a simplified subset
+    :param cache: Bool, read and write the cache in corpus_cache_dir(), or the path of another cache directory
+    :param corpus_key: String naming the contents of the corpus for the cache, by default the key of the files of a
+    corpus reader
+
+    :return: EncodedCorpus, None if there is no corpus
+    """
+
+    if corpus is None:
+        if tagset != 'brown':
+            return None
+        from nltk.corpus import brown
+        corpus = brown
+
+    if corpus_key is None and cache and hasattr(corpus, 'fileids'):
+        corpus_key = corpus_files_key(corpus)
+    path = None
+    if cache and corpus_key is not None:
+        path = corpus_cache_path(corpus_key, tagset, simplified, cache_dir=cache if isinstance(cache, str) else None)
+        if os.path.isfile(path):
+            return EncodedCorpus.load(path)
+
+    if hasattr(corpus, 'tagged_sents'):
+        corpus = corpus.tagged_sents()
+    encoded = EncodedCorpus.from_tagged_sents(corpus)
+    if simplified:
+        encoded = _tagset_mapper(tagset).map_encoded(encoded)
+
+    if path is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        encoded.save(path)
+    return encoded
+
+
+def _tagset_mapper(tagset):
+    return get_tagset_mapper('brown' if tagset == 'brown' else 'es')
+
+
+def train_context_models(encoded, train_mask, backoff, n_jobs=1, cutoff=0):
+    """
+    Count the unigram and bigram contexts of the training sentences and build the context to tag models, these are
+    the same tables that nltk.UnigramTagger(train, backoff=backoff) and nltk.BigramTagger(train, backoff=unigram)
+    would learn. The contexts are counted with integer keys over corpus shards, in parallel when n_jobs != 1.
+
+    :param encoded: EncodedCorpus
+    :param train_mask: Boolean array selecting the training sentences
+    :param backoff: The nltk tagger the unigram model backs off to (RegexpTagger or DefaultTagger)
+    :param n_jobs: Int, number of processes counting the contexts, None or -1 uses every cpu
+    :param cutoff: Int, contexts whose most likely tag occurs cutoff times or fewer are excluded
+
+    :return: The unigram model {word: tag} and the bigram model {((previous tag,), word): tag}, the previous tag
+    tuple is empty at the start of a sentence
+    """
+
+    token_mask = np.repeat(train_mask, encoded.lengths)
+    word_ids = encoded.word_ids[token_mask].astype(np.int64)
+    codes = encoded.tag_codes[token_mask].astype(np.int64)
+    lengths = encoded.lengths[train_mask].astype(np.int64)
+
+    # The code of the previous gold tag plus one, 0 at the start of each sentence
+    prev = np.zeros(len(codes), dtype=np.int64)
+    prev[1:] = codes[:-1] + 1
+    starts = np.cumsum(lengths) - lengths
+    prev[starts[lengths > 0]] = 0
+
+    # The backoff tag only depends on the word, so it is computed once per distinct word
+    tags = list(encoded.tags)
+    tag_codes = {tag: code for code, tag in enumerate(tags)}
+    backoff_codes = np.full(len(encoded.words), -1, dtype=np.int64)
+    for word_id in np.unique(word_ids).tolist():
+        tag = backoff.tag_one([encoded.words[word_id]], 0, [])
+        if tag is not None:
+            if tag not in tag_codes:
+                tag_codes[tag] = len(tags)
+                tags.append(tag)
+            backoff_codes[word_id] = tag_codes[tag]
+    n_tags = len(tags)
+
+    unigram_words, unigram_codes = _train_contexts(word_ids, codes, backoff_codes[word_ids], n_tags, n_jobs, cutoff)
+    unigram_backoff = backoff_codes.copy()
+    unigram_backoff[unigram_words] = unigram_codes
+
+    contexts = (word_ids << 16) | prev
+    bigram_contexts, bigram_codes = _train_contexts(contexts, codes, unigram_backoff[word_ids], n_tags, n_jobs,
+                                                    cutoff)
+
+    words = encoded.words
+    unigram_model = {words[word_id]: tags[code]
+                     for word_id, code in zip(unigram_words.tolist(), unigram_codes.tolist())}
+    bigram_model = {}
+    for context, code in zip(bigram_contexts.tolist(), bigram_codes.tolist()):
+        prev_code = context & 0xFFFF
+        history = (tags[prev_code - 1],) if prev_code else ()
+        bigram_model[(history, words[context >> 16])] = tags[code]
+    return unigram_model, bigram_model
+
+
+def _train_contexts(contexts, codes, backoff_codes, n_tags, n_jobs, cutoff):
+    """
+    The most frequent tag of every useful context (one the backoff tags wrongly at least once), ties are broken by
+    the tag seen first as nltk does
+
+    :return: Array of the kept contexts and array of their tag codes
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    keys = contexts * n_tags + codes
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+
+    bounds = np.linspace(0, len(keys), n_jobs + 1).astype(np.int64)
+    shards = [keys[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    if n_jobs == 1:
+        counted = [_count_keys(shard, start) for shard, start in zip(shards, bounds[:-1])]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            counted = list(executor.map(_count_keys, shards, bounds[:-1].tolist()))
+
+    unique_keys, inverse = np.unique(np.concatenate([shard_keys for shard_keys, counts, firsts in counted]),
+                                     return_inverse=True)
+    inverse = inverse.ravel()
+    counts = np.zeros(len(unique_keys), dtype=np.int64)
+    np.add.at(counts, inverse, np.concatenate([shard_counts for keys, shard_counts, firsts in counted]))
+    firsts = np.full(len(unique_keys), len(keys), dtype=np.int64)
+    np.minimum.at(firsts, inverse, np.concatenate([shard_firsts for keys, counts, shard_firsts in counted]))
+
+    key_contexts = unique_keys // n_tags
+    order = np.lexsort((firsts, -counts, key_contexts))
+    key_contexts = key_contexts[order]
+    best = np.ones(len(order), dtype=bool)
+    best[1:] = key_contexts[1:] != key_contexts[:-1]
+    best = order[best]
+
+    useful = np.unique(contexts[codes != backoff_codes])
+    keep = np.isin(unique_keys[best] // n_tags, useful) & (counts[best] > cutoff)
+    best = best[keep]
+    return unique_keys[best] // n_tags, unique_keys[best] % n_tags
+
+
+def _count_keys(keys, offset):
+    """
+    Worker for _train_contexts, must stay at module level so it can be pickled
+
+    :return: The distinct keys of a shard, their counts and the corpus position of their first occurrence
+    """
+
+    unique_keys, firsts, counts = np.unique(keys, return_index=True, return_counts=True)
+    return unique_keys, counts, firsts + offset
+
+
 def simplify_brown_tags(tag):
     """
-    Created simplified tags from the Browns corpus
+    Created simplified tags from the Browns corpus (see tagsets.BROWN_RULES)
 
     :param tag: Str, the current tag to be transformed
 
     :return: transformed tag
     """
 
-    NP = ['NP']  # proper noun
-    NN = ['NR', 'NN']  # noun
-    VB = ['VB', 'DO', 'EX', 'HV', 'BE', 'DI', 'HV']  # verb
-    NU = ['CD', 'OD']  # numbers
-    AD = ['JJ']  # adjective
-    QL = ['QL', 'DT', 'WQ']  # qualifier
-    AV = ['RB', 'RN', 'RP']  # adverb
-    NG = ['*:']  # negator
-    PN = ['PN', 'PP', 'PR', 'WP'] # pronoun
-
-    tag = tag[:2]
-
-    if tag in NP:
-        tag = 'NP'
-    elif tag in list(string.punctuation):
-        tag = tag
-    elif tag in NN:
-        tag = 'NN'
-    elif tag in VB:
-        tag = 'VB'
-    elif tag in NU:
-        tag = 'NU'
-    elif tag in AD:
-        tag = 'AD'
-    elif tag in QL:
-        tag = 'QL'
-    elif tag in AV:
-        tag = 'AV'
-    elif tag in NG:
-        tag = '*:'
-    elif tag in PN:
-        tag = 'PN'
-    else:
-        tag = 'OT'
-
-    return tag
+    return get_tagset_mapper('brown')(tag)
 
 
 def simplify_parole_tags(tag):
     """
-    Created simplified tag from a parole tagged corpus
+    Created simplified tag from a parole tagged corpus (see tagsets.PAROLE_RULES)
 
     :param tag: Str, the current tag to be transformed
 
     :return: transformed tag
     """
 
-    NP = ['NP']  # proper noun
-    NN = ['NC']  # noun
-    VB = ['VS', 'VM', 'VA']  # verb
-    NU = ['Z', 'Zm', 'Zp']  # numbers
-    AD = ['AO', 'AQ']  # adjective
-    QL = []  # qualifier
-    AV = ['RG', 'RN']  # adverb
-    NG = []  # negator
-
-    tag = tag[:2]
-
-    if tag in NP:
-        tag = 'NP'
-    elif tag in list(string.punctuation):
-        tag = tag
-    elif tag in NN:
-        tag = 'NN'
-    elif tag in VB:
-        tag = 'VB'
-    elif tag in NU:
-        tag = 'NU'
-    elif tag in AD:
-        tag = 'AD'
-    elif tag in QL:
-        tag = 'QL'
-    elif tag in AV:
-        tag = 'AV'
-    elif tag in NG:
-        tag = '*:'
-    else:
-        tag = 'OT'
-
-    return tag
+    return get_tagset_mapper('parole')(tag)
 
 
 def simplify_tags_es(tag):
     """
-    Creates simplified tag for the spanish tagger
+    Creates simplified tag for the spanish tagger (see tagsets.ES_RULES)
 
     :param tag: Str, the current tag to be transformed
 
     :return: transformed tag
     """
 
-    NP = ['NP']  # proper noun
-    NN = ['NC', 'W', 'NP']  # noun
-    VB = ['VA', 'VM', 'VS']  # verb
-    NU = ['Z', 'Zd', 'Zm', 'Zp']  # numbers
-    AD = ['JJ']  # adjective
-    QL = ['DA', 'DD', 'DI', 'DT', 'PD', 'PI']  # qualifier
-    AV = ['RG', 'RN']  # adverb
-    PN = ['DP', 'PX', 'P0', 'PP', 'PR', 'PT']  # pronoun
-    PU = ['Fa', 'Fc', 'Fd', 'Fe', 'Fg', 'Fh', 'Fi', 'Fp', 'Fr', 'Fr', 'Fp', 'Fr', 'Fs', 'Fx', 'Fz']
-    # NG = ['*:']  # negator
-
-    tag = tag[:2]
-
-    if tag in NP:
-        tag = 'NP'
-    elif tag in PU:
-        tag = '.'
-    elif tag in NN:
-        tag = 'NN'
-    elif tag in VB:
-        tag = 'VB'
-    elif tag in NU:
-        tag = 'NU'
-    elif tag in AD:
-        tag = 'AD'
-    elif tag in QL:
-        tag = 'QL'
-    elif tag in AV:
-        tag = 'AV'
-    # elif tag in NG: # negator
-    #     tag = '*:'
-    elif tag in PN:
-        tag = 'PN'
-    else:
-        tag = 'OT'
-
-    return tag
+    return get_tagset_mapper('es')(tag)
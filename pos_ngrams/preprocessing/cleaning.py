@@ -2,9 +2,10 @@
 
 """Functions for cleaning generic text data, the master function 'clean_text' calls all sub functions if required."""
 
+import re
 import string
 
-from pos_ngrams.preprocessing.tokenizer import tokenizer_word, tokenizer_pos, de_tokenizer_pos
+from pos_ngrams.preprocessing.tokenizer import tokenizer_word, PosTokenStream
 
 __author__ = "Peter J Usherwood"
 __python_version__ = "3.6"
@@ -21,23 +22,31 @@ def clean_text(text_string=None,
     Function that cleans text using any combination of the below functions
 
     :param text_string: Python string object to be tokenized and cleaned
-    :param tokens: Python list of strings already tokenized
+    :param tokens: Python list of strings already tokenized, or a PosTokenStream which is cleaned in place
     :param pos_tuples: Bool, if tokens are a list of pos_tuples set this to true
     :param remove_punctuation: Boolean - remove punctuation if True
     :param punctuation: A string of punctuation marks to be removed
     :param remove_additional_whitespaces: Removes additional whitespaces from text (leaves standard word spaces)
     :param lower: Boolean - lower text if True
-    :return: String comprable to the input but with all words cleaned.
+    :return: String comprable to the input but with all words cleaned. For pos tuples the list of cleaned pos tuples,
+    without the tokens left empty by cleaning, or the same PosTokenStream if one was given.
     """
 
+    if isinstance(tokens, PosTokenStream) or (pos_tuples and not text_string and tokens is not None):
+        stream = tokens if isinstance(tokens, PosTokenStream) else PosTokenStream.from_tuples(tokens)
+        if remove_punctuation:
+            stream.words = remove_punctuation_tokens(stream.words, punctuation=punctuation)
+        if remove_additional_whitespaces:
+            stream.words = remove_additional_whitespace(stream.words)
+        if lower:
+            stream.words = lower_tokens(stream.words)
+        stream.drop_empty()
+        return stream if stream is tokens else stream.to_tuples()
+
     if text_string:
         text_string = str(text_string)
         tokens = tokenizer_word(text_string)
 
-    if pos_tuples:
-        tokens, tokens_tags = tokenizer_pos(tokens)
-        tokens_original = tokens
-
     if tokens is None:
         text = ''
     else:
@@ -53,14 +62,97 @@ def clean_text(text_string=None,
 
     if text_string:
         cleaned = " ".join(tokens)
-    elif pos_tuples:
-        cleaned = de_tokenizer_pos(tokens, tokens_tags, tokens_original)
     else:
         cleaned = tokens
 
     return cleaned
 
 
+def clean_series(series,
+                 remove_punctuation=True,
+                 punctuation=string.punctuation,
+                 remove_additional_whitespaces=True,
+                 lower=True):
+    """
+    Clean a whole pandas series of text at once, each row is equivalent to clean_text(text_string=row) with the same
+    options. The rows are joined into one string that is cleaned with a few whole string operations (precompiled
+    translation tables, str.replace and regular expressions) and then split back into rows.
+
+    :param series: Pandas series of text
+    :param remove_punctuation: Boolean - remove punctuation if True
+    :param punctuation: A string of punctuation marks to be removed
+    :param remove_additional_whitespaces: Removes additional whitespaces from text (leaves standard word spaces)
+    :param lower: Boolean - lower text if True
+
+    :return: Pandas series of cleaned strings with the same index and name, rows that are empty (or otherwise falsy)
+    are None as with clean_text
+    """
+
+    import numpy as np
+    import pandas as pd
+
+    values = series.values
+    present = np.array([bool(value) for value in values], dtype=bool)
+    text = [str(value) for value in values[present]]
+
+    options = (remove_punctuation, punctuation, remove_additional_whitespaces, lower)
+    joined = _ROW_SEPARATOR.join(text)
+    if joined.count(_ROW_SEPARATOR) == max(len(text) - 1, 0) and _ROW_SEPARATOR not in punctuation:
+        cleaned_text = _clean_joined(joined, _ROW_SEPARATOR, *options).split(_ROW_SEPARATOR) if text else []
+    else:
+        cleaned_text = [_clean_joined(row, None, *options) for row in text]
+
+    cleaned = np.full(len(values), None, dtype=object)
+    cleaned[present] = cleaned_text
+    return pd.Series(cleaned, index=series.index, name=series.name, dtype=object)
+
+
+_ROW_SEPARATOR = '\x00'
+_ASCII_WHITESPACE = "".join(chr(code) for code in range(128) if chr(code).isspace() and chr(code) != ' ')
+_WHITESPACE_RE = re.compile(r'\s{2,}|[^\S ]')
+
+
+def _clean_joined(text, separator, remove_punctuation, punctuation, remove_additional_whitespaces, lower):
+    """
+    Clean text as clean_text does, text may hold several rows joined by separator (None for a single row) which is
+    left in place
+    """
+
+    # Tokenize as tokenizer_word does: split on whitespace and slashes, then re-join on single spaces
+    text = text.replace('/', ' ')
+    if text.isascii():
+        for whitespace in _ASCII_WHITESPACE:
+            if whitespace in text:
+                text = text.replace(whitespace, ' ')
+        while '  ' in text:
+            text = text.replace('  ', ' ')
+    else:
+        text = _WHITESPACE_RE.sub(' ', text)
+    if separator is not None:
+        text = text.replace(' ' + separator, separator).replace(separator + ' ', separator)
+    text = text.strip(' ')
+
+    # Punctuation is replaced by a space as in remove_punctuation_tokens, and those spaces are deleted too when
+    # removing additional whitespace. Whitespace is left alone as it only separates tokens at this point.
+    if remove_punctuation:
+        punctuation = "".join(dict.fromkeys(ch for ch in punctuation if not ch.isspace()))
+        replace_with = '' if remove_additional_whitespaces else ' '
+        if text.isascii():
+            punctuation = "".join(ch for ch in punctuation if ch.isascii()).encode('ascii')
+            if replace_with:
+                table = bytes.maketrans(punctuation, b' ' * len(punctuation))
+                text = text.encode('ascii').translate(table).decode('ascii')
+            else:
+                text = text.encode('ascii').translate(None, punctuation).decode('ascii')
+        else:
+            text = text.translate({ord(ch): replace_with for ch in punctuation})
+
+    if lower:
+        text = text.lower()
+
+    return text
+
+
 def remove_additional_whitespace(tokens):
     """
     Removes additional whitespaces
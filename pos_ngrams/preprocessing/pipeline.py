@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+"""Compiled single pass preprocessing, each document is tokenized once and every enabled stage runs over the token
+list, only the output columns that are asked for are built"""
+
+import string
+
+from pos_ngrams.processing.stopwords import get_stopword_filter
+from pos_ngrams.preprocessing.social_feature_extraction import SocialFeatureExtractor
+from pos_ngrams.preprocessing.stemming import get_stemmer, stem_tokens
+from pos_ngrams.preprocessing.tokenizer import PosTokenStream
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+# Bump when a change alters the output of the pipeline, so persisted caches of its output are invalidated
+PIPELINE_VERSION = 1
+
+TEXT_COLUMNS = ['Cleaned', 'Hashtags', 'At Mentions', 'URLs', 'Stemmed', 'Preprocessed']
+POS_COLUMNS = ['Cleaned', 'Stemmed', 'Preprocessed', 'Stopped']
+
+
+class PreprocessingPipeline():
+    """
+    Preprocessing compiled once for a given configuration: the stemmer, stopword set and punctuation table are built
+    up front and reused for every document
+    """
+
+    def __init__(self,
+                 language='english',
+                 adhoc_stopwords=[],
+                 remove_hashtag_words=False,
+                 remove_mentioned_authors=True,
+                 remove_urls=True,
+                 stopped_not_stemmed=False,
+                 pos_tuples=False,
+                 columns=None,
+                 punctuation=string.punctuation,
+                 stopword_filter=None):
+        """
+
+        :param language: Primary language (see stopwords/stemming)
+        :param adhoc_stopwords: List of adhoc stopwords (see stopwords)
+        :param remove_hashtag_words: Bool, remove the words that appear as hashtags
+        :param remove_mentioned_authors: Bool, remove the at mentioned authors
+        :param remove_urls: Bool, remove urls (words starting with http://, https:// or www.). This was ignored before
+        the SocialFeatureExtractor, so urls are now removed by default, set it to False to keep them
+        :param stopped_not_stemmed: Stopword remove the cleaned rather than the stemmed text, for pos_tuples this
+        adds a Stopped column instead
+        :param pos_tuples: Bool, if documents are lists of pos_tuples set this to true
+        :param columns: List of output columns to build, by default all of TEXT_COLUMNS except URLs (or POS_COLUMNS
+        when pos_tuples, where Stopped is only built if stopped_not_stemmed)
+        :param punctuation: A string of punctuation marks to be removed
+        :param stopword_filter: A precompiled StopwordFilter to use instead of looking one up for language and
+        adhoc_stopwords
+        """
+
+        from nltk.stem import SnowballStemmer
+
+        self.language = language
+        self.remove_hashtag_words = remove_hashtag_words
+        self.remove_mentioned_authors = remove_mentioned_authors
+        self.remove_urls = remove_urls
+        self.stopped_not_stemmed = stopped_not_stemmed
+        self.pos_tuples = pos_tuples
+        self.punctuation = punctuation
+
+        available_columns = POS_COLUMNS if pos_tuples else TEXT_COLUMNS
+        if columns is None:
+            columns = [column for column in available_columns
+                       if column != 'URLs' and (column != 'Stopped' or stopped_not_stemmed)]
+        for column in columns:
+            if column not in available_columns:
+                raise ValueError('Please choose valid output columns from:', str(available_columns))
+        self.columns = [column for column in available_columns if column in columns]
+
+        self._social = SocialFeatureExtractor(remove_hashtags=remove_hashtag_words,
+                                              remove_mentions=remove_mentioned_authors,
+                                              remove_urls=remove_urls)
+
+        # Punctuation is replaced by spaces and the spaces are then removed, so both are simply deleted
+        self._clean_table = str.maketrans('', '', punctuation + ' ')
+
+        try:
+            self._stemmer = get_stemmer(language)
+        except ValueError:
+            print('Invalid language supplied to the stemmer, please choose from: ' +
+                  " ".join(SnowballStemmer.languages) + '\nOr add a new stemmer to the repository ;)')
+            print('Not stemmed, stemmer not found')
+            self._stemmer = None
+
+        if stopword_filter is None:
+            try:
+                stopword_filter = get_stopword_filter(language=language, adhoc_list=adhoc_stopwords)
+            except OSError:
+                print('Not stopped, stopwords not found')
+        self._stopword_filter = stopword_filter
+
+    def transform(self, documents):
+        """
+        Preprocess an iterable of documents
+
+        :param documents: Iterable of strings, or of lists of pos tuples if pos_tuples
+
+        :return: Dict of output column name to a list with one value per document
+        """
+
+        process = self._process_pos if self.pos_tuples else self._process_text
+        output = {column: [] for column in self.columns}
+        appends = [(column, output[column].append) for column in self.columns]
+        for document in documents:
+            processed = process(document)
+            for column, append in appends:
+                append(processed[column])
+        return output
+
+    def process(self, document):
+        """
+        Preprocess a single document
+
+        :param document: String, or list of pos tuples if pos_tuples
+
+        :return: Dict of output column name to value
+        """
+
+        if self.pos_tuples:
+            return self._process_pos(document)
+        return self._process_text(document)
+
+    def fingerprint(self):
+        """
+        :return: String hash of the configuration, pipelines with the same fingerprint give the same output for a
+        document
+        """
+
+        import hashlib
+        import json
+
+        stopwords = None
+        if self._stopword_filter is not None:
+            stopwords = sorted(self._stopword_filter.stopwords_set)
+        configuration = [PIPELINE_VERSION, self.language, self.remove_hashtag_words, self.remove_mentioned_authors,
+                         self.remove_urls, self.stopped_not_stemmed, self.pos_tuples, self.columns, self.punctuation,
+                         self._stemmer is not None, stopwords]
+        return hashlib.sha1(json.dumps(configuration).encode('utf-8')).hexdigest()
+
+    def _needs(self, *columns):
+        return any(column in self.columns for column in columns)
+
+    def _process_text(self, document):
+        processed = {}
+        parts, processed['Hashtags'], processed['At Mentions'], processed['URLs'] = \
+            self._social.scan(str(document).split())
+
+        if not self._needs('Cleaned', 'Stemmed', 'Preprocessed'):
+            return processed
+
+        clean_table = self._clean_table
+        cleaned = [token.translate(clean_table).lower() for part in parts for token in part.split('/') if token]
+        processed['Cleaned'] = " ".join(cleaned)
+        cleaned = [token for token in cleaned if token]
+
+        if self._needs('Stemmed') or (self._needs('Preprocessed') and not self.stopped_not_stemmed):
+            if self._stemmer is None:
+                stemmed = cleaned
+                processed['Stemmed'] = processed['Cleaned']
+            else:
+                stemmed = stem_tokens(cleaned, language=self.language)
+                processed['Stemmed'] = " ".join(stemmed)
+                stemmed = [token for token in stemmed if token]
+
+        if self._needs('Preprocessed'):
+            tokens = cleaned if self.stopped_not_stemmed else stemmed
+            if self._stopword_filter is not None:
+                tokens = self._stopword_filter.filter_tokens(tokens)
+            processed['Preprocessed'] = " ".join(tokens)
+
+        return processed
+
+    def _process_pos(self, document):
+        processed = {}
+
+        clean_table = self._clean_table
+        stream = PosTokenStream.from_tuples(document)
+        stream.map_words(lambda word: word.translate(clean_table).lower()).drop_empty()
+        processed['Cleaned'] = stream.to_tuples()
+
+        if self._needs('Stopped'):
+            processed['Stopped'] = self._stop_pos(stream.copy() if self._needs('Stemmed', 'Preprocessed')
+                                                  else stream)
+
+        if self._needs('Stemmed', 'Preprocessed'):
+            if self._stemmer is not None:
+                stream.words = stem_tokens(stream.words, language=self.language)
+            processed['Stemmed'] = stream.to_tuples()
+            if self._needs('Preprocessed'):
+                processed['Preprocessed'] = self._stop_pos(stream)
+
+        return processed
+
+    def _stop_pos(self, stream):
+        if self._stopword_filter is not None:
+            self._stopword_filter.filter_pos(stream)
+        return stream.to_tuples()
@@ -3,11 +3,12 @@
 """Standard text cleaning for pandas, used by many other functions, for more granularity use the composite
 functions separately"""
 
-from pos_ngrams.processing.stopwords import stopword_removal
-from pos_ngrams.preprocessing.cleaning import clean_text
-from pos_ngrams.preprocessing.stemming import stem_text
-from pos_ngrams.preprocessing.social_feature_extraction import extract_hashtags, \
-    extract_mentioned_users, extract_urls
+import math
+import os
+from itertools import repeat
+
+from pos_ngrams.instrumentation import count_tokens, get_instrumentation
+from pos_ngrams.preprocessing.pipeline import PreprocessingPipeline, POS_COLUMNS
 
 __author__ = "Peter J Usherwood"
 __python_version__ = "3.5"
@@ -21,7 +22,14 @@ def preprocess_df(data,
                   remove_mentioned_authors=True,
                   remove_urls=True,
                   stopped_not_stemmed=False,
-                  pos_tuples=False):
+                  pos_tuples=False,
+                  columns=None,
+                  stopword_filter=None,
+                  n_jobs=1,
+                  chunksize=None,
+                  low_memory=False,
+                  sink=None,
+                  cache=None):
     """
     Basic wrapper for cleaning text data in a pandas dataframe column
 
@@ -31,82 +39,180 @@ def preprocess_df(data,
     :param adhoc_stopwords: List of adhoc stopwords (see stopwords)
     :param remove_hashtag_words: Bool, remove the words that appear as hashtags
     :param remove_mentioned_authors: Bool, remove the at mentioned authors
-    :param remove_urls: Bool, remove urls
+    :param remove_urls: Bool, remove urls (words starting with http://, https:// or www.). This was ignored before
+    the SocialFeatureExtractor, so urls are now removed by default, set it to False to keep them
     :param stopped_not_stemmed: Return a field of cleaned and stopword removed text, useful for the categorizer
     :param pos_tuples: Bool, if tokens are a list of pos_tuples set this to true
+    :param columns: List of the output columns to build (see pipeline.TEXT_COLUMNS and pipeline.POS_COLUMNS), by
+    default all of them except URLs
+    :param stopword_filter: A precompiled StopwordFilter (see stopwords.get_stopword_filter), by default one is looked
+    up for language and adhoc_stopwords
+    :param n_jobs: Int, number of worker processes, 1 runs serially, None or -1 uses every cpu
+    :param chunksize: Int, rows per chunk sent to a worker, by default the rows are split into 4 chunks per worker
+    :param low_memory: Bool, store the Hashtags, At Mentions and URLs columns as categoricals of space joined strings
+    rather than lists, and intern the pos tuple columns so every repeated (word, tag) pair is one shared object
+    :param sink: Callable receiving the StageRecord of the preprocess stage, or a list of them (see instrumentation),
+    None is silent
+    :param cache: A PreprocessCache (see preprocess_cache), or the path of one to open, documents it already holds for
+    this configuration are not preprocessed again
 
     :return: data with additional text/pos_tuple columns showing the cleaning process
     """
 
-    if not pos_tuples:
-        data['Cleaned'] = data.ix[:, text_field_key]
-        print('Loaded')
-
-        if remove_hashtag_words:
-            data['Cleaned'] = data.ix[:, 'Cleaned'].apply(lambda e: extract_hashtags(text_string=e,
-                                                                                     remove_hashtags=True)[0])
-        if remove_mentioned_authors:
-            data['Cleaned'] = data.ix[:, 'Cleaned'].apply(lambda e: extract_mentioned_users(text_string=e,
-                                                                                            remove_users=True)[0])
-        if remove_mentioned_authors:
-            print('url remover not built')
-            remove_urls=False
-
-        data['Hashtags'] = data.ix[:, text_field_key].apply(lambda e: extract_hashtags(text_string=e,
-                                                                                 remove_hashtags=False)[1])
-        data['At Mentions'] = data.ix[:, text_field_key].apply(lambda e: extract_mentioned_users(text_string=e,
-                                                                                        remove_users=False)[1])
-
-        print('Removed social features. Hashtags:', str(remove_hashtag_words),
-              'At Mentions:', str(remove_mentioned_authors),
-              'URLs:', str(remove_urls))
-
-        data['Cleaned'] = data.ix[:, 'Cleaned'].apply(lambda e: clean_text(text_string=e))
-        print('Cleaned Text')
-
-        try:
-            data['Stemmed'] = data.ix[:, 'Cleaned'].apply(lambda e: stem_text(text_string=e, language=language))
-            print('Stemmed Text')
-        except NameError as nme:
-            data['Stemmed'] = data.ix[:, 'Cleaned']
-            print('Not stemmed, stemmer not found')
-
-        try:
-            data['Preprocessed'] = data.ix[:, 'Stemmed'].apply(lambda e: stopword_removal(text_string=e,
-                                                                                          language=language,
-                                                                                          adhoc_list=adhoc_stopwords))
-            print('Removed Stopwords')
-        except OSError as nf:
-            data['Preprocessed'] = data.ix[:, 'Stemmed']
-            print('Not stopped, stopwords not found')
-
-        if stopped_not_stemmed:
-            try:
-                data['Preprocessed'] = data.ix[:, 'Cleaned'].apply(lambda e: stopword_removal(text_string=e,
-                                                                                              language=language,
-                                                                                              adhoc_list=adhoc_stopwords))
-                print('Removed Stopwords')
-            except OSError as nf:
-                data['Preprocessed'] = data.ix[:, 'Cleaned']
-                print('Not stopped, stopwords not found')
+    import pandas as pd
+
+    pipeline_kwargs = {'language': language,
+                       'adhoc_stopwords': adhoc_stopwords,
+                       'remove_hashtag_words': remove_hashtag_words,
+                       'remove_mentioned_authors': remove_mentioned_authors,
+                       'remove_urls': remove_urls,
+                       'stopped_not_stemmed': stopped_not_stemmed,
+                       'pos_tuples': pos_tuples,
+                       'columns': columns,
+                       'stopword_filter': stopword_filter}
+
+    instrumentation = get_instrumentation(sink)
+    with instrumentation.stage('preprocess', rows=len(data)) as stage:
+        if cache is not None:
+            data = _preprocess_df_cached(data, text_field_key, cache, n_jobs, chunksize, pipeline_kwargs)
+        elif n_jobs != 1 and len(data) > 0:
+            data = _preprocess_df_parallel(data, text_field_key, n_jobs, chunksize, **pipeline_kwargs)
+        else:
+            pipeline = PreprocessingPipeline(**pipeline_kwargs)
+            processed = pipeline.transform(data.loc[:, text_field_key].values.tolist())
+            for column in pipeline.columns:
+                data[column] = pd.Series(processed[column], index=data.index)
+
+        if low_memory:
+            data = compact_columns(data, pos_tuples=pos_tuples)
+
+        if instrumentation.enabled and 'Preprocessed' in data.columns:
+            stage.tokens = count_tokens(data['Preprocessed'].values)
+
+    return data
+
+
+def compact_columns(data, pos_tuples=False):
+    """
+    Shrink the preprocessed columns of a dataframe in place: Hashtags, At Mentions and URLs lists become categoricals of
+    space joined strings, and with pos_tuples the (word, tag) tuples of the pos columns are interned
+
+    :param data: Pandas dataframe output by preprocess_df
+    :param pos_tuples: Bool, if the text columns are lists of pos_tuples set this to true
+
+    :return: data with the compacted columns
+    """
+
+    import pandas as pd
+
+    for column in ['Hashtags', 'At Mentions', 'URLs']:
+        if column in data.columns and data[column].dtype == object:
+            data[column] = pd.Categorical([" ".join(tags) for tags in data[column].values])
+
+    if pos_tuples:
+        pairs = {}
+        for column in POS_COLUMNS:
+            if column in data.columns:
+                data[column] = pd.Series([intern_pos_tuples(tokens, pairs) for tokens in data[column].values],
+                                         index=data.index, dtype=object)
+
+    return data
+
+
+def intern_pos_tuples(tokens, pairs):
+    """
+    Replace each (word, tag) tuple by the first equal tuple seen, so repeated pairs share one object
+
+    :param tokens: List of pos tuples
+    :param pairs: Dict of the pos tuples seen so far, shared between calls
+
+    :return: List of interned pos tuples
+    """
+
+    return [pairs.setdefault(pair, pair) for pair in tokens]
+
+
+def _preprocess_df_cached(data, text_field_key, cache, n_jobs, chunksize, pipeline_kwargs):
+    """
+    Preprocess through a PreprocessCache, only the documents it misses are preprocessed (in parallel if n_jobs != 1)
+
+    :param data: Pandas dataframe
+    :param text_field_key: The field name of the text to be cleaned
+    :param cache: PreprocessCache, or the path of one to open (and close again)
+    :param n_jobs: Int, number of worker processes for the missed documents (see preprocess_df)
+    :param chunksize: Int, rows per chunk sent to a worker (see preprocess_df)
+    :param pipeline_kwargs: Dict of the PreprocessingPipeline arguments
+
+    :return: data with the same additional columns as preprocess_df
+    """
+
+    import pandas as pd
+    from pos_ngrams.preprocessing.preprocess_cache import PreprocessCache
+
+    pipeline = PreprocessingPipeline(**pipeline_kwargs)
+
+    def transform(documents):
+        if n_jobs == 1:
+            return pipeline.transform(documents)
+        missed = pd.DataFrame({text_field_key: pd.Series(documents, dtype=object)})
+        missed = _preprocess_df_parallel(missed, text_field_key, n_jobs, chunksize, **pipeline_kwargs)
+        return {column: missed[column].values.tolist() for column in pipeline.columns}
+
+    documents = data.loc[:, text_field_key].values.tolist()
+    if isinstance(cache, str):
+        with PreprocessCache(cache) as opened_cache:
+            processed = opened_cache.transform(pipeline, documents, transform=transform)
     else:
-        print('Loaded')
+        processed = cache.transform(pipeline, documents, transform=transform)
+
+    for column in pipeline.columns:
+        data[column] = pd.Series(processed[column], index=data.index)
+
+    return data
+
+
+def _preprocess_df_parallel(data, text_field_key, n_jobs, chunksize, **kwargs):
+    """
+    Split data into row chunks, preprocess the chunks in a process pool and write the new columns back in the
+    original row order
 
-        data['Cleaned'] = data.ix[:, text_field_key].apply(lambda e: clean_text(tokens=e, pos_tuples=True))
-        print('Cleaned Text')
+    :param data: Pandas dataframe
+    :param text_field_key: The field name of the text to be cleaned
+    :param n_jobs: Int, number of worker processes, None or -1 uses every cpu
+    :param chunksize: Int, rows per chunk, None to split into 4 chunks per worker
+    :param kwargs: The remaining preprocess_df arguments
+
+    :return: data with the same additional columns as the serial preprocess_df
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+    import pandas as pd
+
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = int(math.ceil(len(data) / (n_jobs * 4)))
+    chunksize = max(int(chunksize), 1)
+
+    text = data[[text_field_key]]
+    chunks = (text.iloc[start:start + chunksize] for start in range(0, len(text), chunksize))
 
-        data['Stemmed'] = data.ix[:, 'Cleaned'].apply(lambda e: stem_text(tokens=e, language=language, pos_tuples=True))
-        print('Stemmed Text')
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        processed = list(executor.map(_preprocess_chunk, chunks, repeat(text_field_key), repeat(kwargs)))
+    processed = pd.concat(processed)
 
-        data['Preprocessed'] = data.ix[:, 'Stemmed'].apply(lambda e: stopword_removal(tokens=e,
-                                                                                      pos_tuples=True,
-                                                                                      language=language,
-                                                                                      adhoc_list=adhoc_stopwords))
-        print('Removed Stopwords')
+    for column in processed.columns:
+        data[column] = processed[column].values
 
-        if stopped_not_stemmed:
-            data['Stopped'] = data.ix[:, 'Cleaned'].apply(lambda e: stopword_removal(tokens=e,
-                                                                                     pos_tuples=True,
-                                                                                     language=language,
-                                                                                     adhoc_list=adhoc_stopwords))
     return data
+
+
+def _preprocess_chunk(chunk, text_field_key, kwargs):
+    """
+    Worker for _preprocess_df_parallel, must stay at module level so it can be pickled
+
+    :return: The new columns created by preprocess_df for this chunk
+    """
+
+    chunk = preprocess_df(chunk.copy(), text_field_key=text_field_key, n_jobs=1, **kwargs)
+    return chunk.drop(columns=[text_field_key])
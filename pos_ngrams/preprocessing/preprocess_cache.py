@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+"""Persistent content addressed cache of preprocessed documents. Each document is stored under a hash of its text
+and the fingerprint of the pipeline configuration, so a document seen before with the same configuration is not
+cleaned, stemmed and stopped again"""
+
+import hashlib
+import pickle
+import threading
+import time
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+# Keys are looked up and written in batches of this many, below the sqlite limit on query parameters
+_BATCH_SIZE = 500
+
+
+class PreprocessCache():
+    """
+    Sqlite backed least recently used cache of the preprocessed output columns of documents, bounded by the bytes of
+    the stored values. The values are pickled, only open cache files you trust.
+    """
+
+    def __init__(self, path, max_bytes=2 ** 30):
+        """
+
+        :param path: Path of the sqlite database file, it is created if needed
+        :param max_bytes: Int, the stored values above which the least recently used documents are evicted, None
+        for an unbounded cache
+        """
+
+        import sqlite3
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS documents '
+                                     '(key BLOB PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+                                     'last_used REAL NOT NULL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS documents_last_used ON documents (last_used)')
+        self._evict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def transform(self, pipeline, documents, transform=None):
+        """
+        Preprocess documents with a pipeline, only the documents not already cached for its configuration are
+        processed, each distinct one once, and their output is then cached
+
+        :param pipeline: PreprocessingPipeline
+        :param documents: List of strings, or of lists of pos tuples if pipeline.pos_tuples
+        :param transform: Callable processing a list of the missed documents into a dict of output column name to
+        a list of values, by default pipeline.transform
+
+        :return: Dict of output column name to a list with one value per document, as pipeline.transform
+        """
+
+        if transform is None:
+            transform = pipeline.transform
+        columns = pipeline.columns
+        prefix = pipeline.fingerprint().encode('utf-8') + b'\x00'
+        text = repr if pipeline.pos_tuples else str
+
+        keys = [hashlib.blake2b(prefix + text(document).encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+                for document in documents]
+        unique = {}
+        for position, key in enumerate(keys):
+            unique.setdefault(key, position)
+
+        with self._lock:
+            values = self._get(list(unique))
+            missed = [key for key in unique if key not in values]
+            n_hits = sum(1 for key in keys if key in values)
+            self.hits += n_hits
+            self.misses += len(keys) - n_hits
+
+            if missed:
+                processed = transform([documents[unique[key]] for key in missed])
+                new_values = {key: tuple(processed[column][i] for column in columns) for i, key in enumerate(missed)}
+                self._put(new_values)
+                values.update(new_values)
+
+        output = {column: [] for column in columns}
+        appends = [output[column].append for column in columns]
+        for key in keys:
+            for append, value in zip(appends, values[key]):
+                append(value)
+        return output
+
+    def info(self):
+        """
+        Cache statistics, the hits and misses are counted per document since the cache was opened
+
+        :return: Dict with hits, misses, hit_rate, size (documents), bytes and max_bytes
+        """
+
+        with self._lock:
+            size, n_bytes = self._connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents')\
+                .fetchone()
+            lookups = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'size': size,
+                    'bytes': n_bytes,
+                    'max_bytes': self.max_bytes}
+
+    def clear(self, reset_stats=True):
+        """
+        Delete every cached document
+
+        :param reset_stats: Bool, also reset the hit and miss counters
+        """
+
+        with self._lock:
+            with self._connection:
+                self._connection.execute('DELETE FROM documents')
+            if reset_stats:
+                self.hits = 0
+                self.misses = 0
+
+    def close(self):
+        """
+        Close the database connection
+        """
+
+        with self._lock:
+            self._connection.close()
+
+    def _get(self, keys):
+        """
+        :return: Dict of the cached keys to their tuple of column values, their last use is updated
+        """
+
+        values = {}
+        now = time.time()
+        with self._connection:
+            for start in range(0, len(keys), _BATCH_SIZE):
+                batch = keys[start:start + _BATCH_SIZE]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._connection.execute('SELECT key, value FROM documents WHERE key IN (' + placeholders +
+                                                ')', batch).fetchall()
+                values.update((key, pickle.loads(value)) for key, value in rows)
+                if rows:
+                    self._connection.execute('UPDATE documents SET last_used = ? WHERE key IN (' +
+                                             ','.join('?' * len(rows)) + ')', [now] + [key for key, value in rows])
+        return values
+
+    def _put(self, values):
+        now = time.time()
+        rows = []
+        for key, value in values.items():
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            rows.append((key, value, len(value), now))
+        with self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)', rows)
+        self._evict()
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+
+        excess = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM documents').fetchone()[0] - \
+            self.max_bytes
+        with self._connection:
+            while excess > 0:
+                rows = self._connection.execute('SELECT key, size FROM documents ORDER BY last_used LIMIT ?',
+                                                (_BATCH_SIZE,)).fetchall()
+                if not rows:
+                    break
+                evicted = []
+                for key, size in rows:
+                    evicted.append(key)
+                    excess -= size
+                    if excess <= 0:
+                        break
+                self._connection.execute('DELETE FROM documents WHERE key IN (' + ','.join('?' * len(evicted)) +
+                                         ')', evicted)
@@ -2,10 +2,15 @@
 
 """"Functions for extracting usful features from social text data."""
 
+import re
+
 __author__ = 'Peter J Usherwood'
 __python_version__ = '3.5'
 
 
+_URL_RE = re.compile(r'https?://|www\.', re.IGNORECASE)
+
+
 def extract_hashtags(text_string, remove_hashtags=False):
     """
     Extracts hashtags from a text_string
@@ -14,10 +19,10 @@ def extract_hashtags(text_string, remove_hashtags=False):
     :param remove_hashtags: Boolean, if True it will remove the hashtags from the text_string
 
     :return: text_sting: Sting as input but with hashtags removed if specified
-    :return: hashtags: List of unique hashtags in the text_string
+    :return: hashtags: List of unique hashtags in the text_string, in order of first appearance
     """
 
-    hashtags = set(part[1:] for part in text_string.split() if part.startswith('#'))
+    hashtags = dict.fromkeys(part[1:] for part in text_string.split() if part.startswith('#'))
     hashtags = list(hashtags)
 
     if remove_hashtags:
@@ -34,10 +39,10 @@ def extract_mentioned_users(text_string, remove_users=True):
     :param remove_users: Boolean, if True it will remove the mentioned_users from the text_string
 
     :return: text_sting: Sting as input but with mentioned_users removed if specified
-    :return: mentioned_users: List of unique mentioned_users in the text_string
+    :return: mentioned_users: List of unique mentioned_users in the text_string, in order of first appearance
     """
 
-    mentioned_users = set(part[1:] for part in text_string.split() if part.startswith('@'))
+    mentioned_users = dict.fromkeys(part[1:] for part in text_string.split() if part.startswith('@'))
     mentioned_users = list(mentioned_users)
 
     if remove_users:
@@ -47,7 +52,101 @@ def extract_mentioned_users(text_string, remove_users=True):
 
 
 def extract_urls(text_string, remove_urls=True):
-    print(text_string)
-    print(remove_urls)
-    return False
-    # TODO please build
+    """
+    Extracts urls (words starting with http://, https:// or www.) from a text_string
+
+    :param text_string: String of text you wish to extract urls from
+    :param remove_urls: Boolean, if True it will remove the urls from the text_string
+
+    :return: text_sting: Sting as input but with urls removed if specified
+    :return: urls: List of unique urls in the text_string, in order of first appearance
+    """
+
+    urls = list(dict.fromkeys(part for part in text_string.split() if _URL_RE.match(part)))
+
+    if remove_urls:
+        text_string = " ".join([part for part in text_string.split() if not _URL_RE.match(part)])
+
+    return text_string, urls
+
+
+class SocialFeatureExtractor():
+    """
+    Extracts hashtags, at mentions and urls from a document in a single scan of its words, optionally removing each
+    kind of feature from the text at the same time
+    """
+
+    def __init__(self, remove_hashtags=False, remove_mentions=True, remove_urls=True):
+        """
+
+        :param remove_hashtags: Boolean, remove the hashtags from the text
+        :param remove_mentions: Boolean, remove the at mentioned users from the text
+        :param remove_urls: Boolean, remove the urls from the text
+        """
+
+        self.remove_hashtags = remove_hashtags
+        self.remove_mentions = remove_mentions
+        self.remove_urls = remove_urls
+
+    def scan(self, parts):
+        """
+        :param parts: List of the whitespace separated words of a document
+
+        :return: The list of words left after removal, and the lists of unique hashtags, mentioned users and urls in
+        order of first appearance
+        """
+
+        hashtags = {}
+        mentions = {}
+        urls = {}
+        kept = []
+        match_url = _URL_RE.match
+        for part in parts:
+            if part.startswith('#'):
+                hashtags[part[1:]] = None
+                if self.remove_hashtags:
+                    continue
+            elif part.startswith('@'):
+                mentions[part[1:]] = None
+                if self.remove_mentions:
+                    continue
+            elif match_url(part):
+                urls[part] = None
+                if self.remove_urls:
+                    continue
+            kept.append(part)
+        return kept, list(hashtags), list(mentions), list(urls)
+
+    def extract(self, text_string):
+        """
+        :param text_string: String of text you wish to extract the social features from
+
+        :return: Dict with the Text (re-joined on single spaces after removal), Hashtags, At Mentions and URLs
+        """
+
+        kept, hashtags, mentions, urls = self.scan(str(text_string).split())
+        return {'Text': " ".join(kept), 'Hashtags': hashtags, 'At Mentions': mentions, 'URLs': urls}
+
+    def extract_series(self, series):
+        """
+        Extract the social features of every row of a pandas series in one pass
+
+        :param series: Pandas series of text
+
+        :return: Pandas dataframe with the Text, Hashtags, At Mentions and URLs columns and the index of series
+        """
+
+        import pandas as pd
+
+        columns = {'Text': [], 'Hashtags': [], 'At Mentions': [], 'URLs': []}
+        text, hashtags, mentions, urls = (columns['Text'].append, columns['Hashtags'].append,
+                                          columns['At Mentions'].append, columns['URLs'].append)
+        scan = self.scan
+        for text_string in series.values:
+            kept, row_hashtags, row_mentions, row_urls = scan(str(text_string).split())
+            text(" ".join(kept))
+            hashtags(row_hashtags)
+            mentions(row_mentions)
+            urls(row_urls)
+
+        return pd.DataFrame(columns, index=series.index)
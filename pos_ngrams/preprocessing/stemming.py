@@ -2,42 +2,128 @@
 
 """"Functions for stemming text"""
 
-from nltk.stem import SnowballStemmer
+import threading
 
-from pos_ngrams.preprocessing.tokenizer import tokenizer_word, tokenizer_pos, de_tokenizer_pos
+from pos_ngrams.caching import LRUCache
+from pos_ngrams.preprocessing.tokenizer import tokenizer_word, PosTokenStream
 
 __author__ = "Peter J Usherwood"
 __python_version__ = "3.6"
 
 
+_STEMMERS = {}
+_STEMMERS_LOCK = threading.Lock()
+_STEM_CACHE = LRUCache(maxsize=200000)
+_MISSING = object()
+
+
+def get_stemmer(language='english'):
+    """
+    Return the snowball stemmer for a language, each stemmer is only built once per process
+
+    :param language: String representing the language to be used
+
+    :return: SnowballStemmer, raises ValueError for unsupported languages
+    """
+
+    from nltk.stem import SnowballStemmer
+
+    try:
+        return _STEMMERS[language]
+    except KeyError:
+        pass
+
+    with _STEMMERS_LOCK:
+        if language not in _STEMMERS:
+            _STEMMERS[language] = SnowballStemmer(language)
+        return _STEMMERS[language]
+
+
+def stem_tokens(tokens, language='english'):
+    """
+    Stem a list of word tokens, stems are memoized in a shared least recently used token cache
+
+    :param tokens: List of str, word tokens
+    :param language: String representing the language to be used
+
+    :return: List of stemmed tokens
+    """
+
+    stem = get_stemmer(language).stem
+    cache = _STEM_CACHE
+
+    stemmed = []
+    for token in tokens:
+        key = (language, token)
+        stemmed_token = cache.get(key, _MISSING)
+        if stemmed_token is _MISSING:
+            stemmed_token = stem(token)
+            cache.put(key, stemmed_token)
+        stemmed.append(stemmed_token)
+    return stemmed
+
+
+def stem_cache_info():
+    """
+    Statistics for the token to stem cache
+
+    :return: Dict with hits, misses, hit_rate, size and maxsize
+    """
+
+    return _STEM_CACHE.info()
+
+
+def set_stem_cache_size(maxsize):
+    """
+    Change the number of (language, token) stems held in the cache, the least recently used are evicted first
+
+    :param maxsize: Int, maximum number of cached stems, 0 disables caching, None for unbounded
+    """
+
+    _STEM_CACHE.resize(maxsize)
+
+
+def clear_stem_cache():
+    """
+    Drop all cached stems and reset the hit/miss counters
+    """
+
+    _STEM_CACHE.clear()
+
+
 def stem_text(text_string=None, tokens=None, pos_tuples=False, language='english'):
     """
     Function that stems a text string using the NLTK snowball stemmer
 
     :param text_string: Python string object to be tokenized and stemmed
-    :param tokens: Python list of strings already tokenized
+    :param tokens: Python list of strings already tokenized, or a PosTokenStream which is stemmed in place
     :param pos_tuples: Bool, if tokens are a list of pos_tuples set this to true
     :parma language: String representing the language to be used
 
     :return: String comparable to the input but with all words stemmed.
     """
 
+    from nltk.stem import SnowballStemmer
+
     try:
-        stemmer = SnowballStemmer(language)
-    except ValueError as e:
+        get_stemmer(language)
+    except ValueError:
         print('Invalid language supplied to the stemmer, please choose from: ' + " ".join(SnowballStemmer.languages) +
               '\nOr add a new stemmer to the repository ;)')
+        raise NameError('No stemmer found for language: ' + str(language))
 
     if text_string:
         tokens = tokenizer_word(text_string)
-        tokens = [stemmer.stem(token) for token in tokens]
+        tokens = stem_tokens(tokens, language=language)
         stemmed = " ".join(tokens)
+    elif isinstance(tokens, PosTokenStream):
+        tokens.words = stem_tokens(tokens.words, language=language)
+        stemmed = tokens
     elif pos_tuples:
-        tokens, tokens_tags = tokenizer_pos(tokens)
-        tokens_original = tokens
-        tokens = [stemmer.stem(token) for token in tokens]
-        stemmed = de_tokenizer_pos(tokens, tokens_tags, tokens_original)
+        stream = PosTokenStream.from_tuples(tokens)
+        stream.words = stem_tokens(stream.words, language=language)
+        stemmed = stream.to_tuples()
     else:
-        stemmed = [stemmer.stem(token) for token in tokens]
+        stemmed = stem_tokens(tokens, language=language)
 
     return stemmed
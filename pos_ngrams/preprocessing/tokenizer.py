@@ -4,7 +4,6 @@
 non-English languages"""
 
 import shlex
-from nltk.tokenize import sent_tokenize
 
 __author__ = "Peter J Usherwood"
 __python_version__ = "3.6"
@@ -37,6 +36,8 @@ def tokenizer_sentence(text_string):
     :return: Array of strings, each is a sentence
     """
 
+    from nltk.tokenize import sent_tokenize
+
     sent_tokenize_list = sent_tokenize(text_string)
 
     return sent_tokenize_list
@@ -72,7 +73,99 @@ def de_tokenizer_pos(tokens, tokens_tags, tokens_original):
     :return: pos_tuplets, List of pos tuplets
     """
 
+    tokens = set(tokens)
     tokens = [x if x in tokens else None for x in tokens_original]
     pos_tuplets = [(x, y) for x, y in zip(tokens, tokens_tags) if x is not None]
 
     return pos_tuplets
+
+
+class PosTokenStream():
+    """
+    A pos tuple document held as parallel lists of words and tags with a keep mask, so cleaning, stemming and
+    stopword removal rewrite the words and the mask in place and tuples are only built by to_tuples. Every operation
+    is positional: word i always keeps tag i.
+    """
+
+    def __init__(self, words, tags, keep=None):
+        """
+
+        :param words: List of str, word tokens
+        :param tags: List of str, pos tags
+        :param keep: List of bool, False for tokens that have been removed, None keeps every token
+        """
+
+        self.words = words
+        self.tags = tags
+        self.keep = keep
+
+    @classmethod
+    def from_tuples(cls, pos_tuplets):
+        """
+        :param pos_tuplets: List of pos tuplets
+
+        :return: PosTokenStream
+        """
+
+        words, tags = tokenizer_pos(pos_tuplets)
+        return cls(words, tags)
+
+    def __len__(self):
+        if self.keep is None:
+            return len(self.words)
+        return sum(self.keep)
+
+    def copy(self):
+        """
+        :return: A PosTokenStream sharing no lists with this one
+        """
+
+        return PosTokenStream(list(self.words), list(self.tags), None if self.keep is None else list(self.keep))
+
+    def map_words(self, function):
+        """
+        Replace every word by function(word)
+
+        :param function: Function from str to str
+
+        :return: self
+        """
+
+        self.words = [function(word) for word in self.words]
+        return self
+
+    def drop_empty(self):
+        """
+        Remove the tokens whose word is empty or only whitespace
+
+        :return: self
+        """
+
+        return self._drop([not word.strip() for word in self.words])
+
+    def drop_words(self, words):
+        """
+        Remove the tokens whose word is in words
+
+        :param words: Set (or other container) of words to remove
+
+        :return: self
+        """
+
+        return self._drop([word in words for word in self.words])
+
+    def to_tuples(self):
+        """
+        :return: List of the kept (word, tag) tuples
+        """
+
+        if self.keep is None:
+            return list(zip(self.words, self.tags))
+        return [(word, tag) for word, tag, keep in zip(self.words, self.tags, self.keep) if keep]
+
+    def _drop(self, drop):
+        if self.keep is None:
+            self.keep = [not dropped for dropped in drop]
+        else:
+            self.keep = [keep and not dropped for keep, dropped in zip(self.keep, drop)]
+        return self
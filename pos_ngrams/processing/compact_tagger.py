@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+
+"""Compact on disk format for the trained bigram/unigram/regex tagger chains. The context tables are stored as sorted
+numpy arrays that are memory mapped on load, so loading is cheap and every process shares the same pages. The
+vocabulary is one utf-8 byte buffer of the words in byte order with the offset of each word in it"""
+
+import json
+import os
+import re
+
+import numpy as np
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+FORMAT_VERSION = 2
+META_FILE = 'meta.json'
+
+# Bigram keys pack the word id above the code of the previous tag, code 0 is the start of a sentence
+_PREV_BITS = 16
+_PREV_MASK = (1 << _PREV_BITS) - 1
+_START = 0
+# The previous tag code used when the previous token could not be tagged, it never appears in a key
+_NO_CONTEXT = _PREV_MASK
+# The bigram contexts of a word without any, shared and never modified
+_NO_BIGRAMS = {}
+# Vocabulary words are first located by their leading bytes packed into one integer, which keeps the byte order
+_PREFIX_BYTES = 8
+
+
+def is_compact_tagger(path):
+    """
+    :param path: Path to check
+
+    :return: Bool, whether path is a compact tagger directory
+    """
+
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+def export_tagger(tagger, path):
+    """
+    Write an nltk BigramTagger -> UnigramTagger -> RegexpTagger (or DefaultTagger) chain to a compact tagger directory,
+    either context tagger may be missing from the chain
+
+    :param tagger: The nltk tagger at the head of the chain
+    :param path: Directory to write to, it is created if needed
+
+    :return: path
+    """
+
+    bigrams = {}
+    unigrams = {}
+    patterns = []
+    default_tag = None
+
+    for sub_tagger in tagger._taggers:
+        name = type(sub_tagger).__name__
+        if name == 'BigramTagger':
+            bigrams = sub_tagger._context_to_tag
+        elif name == 'UnigramTagger':
+            unigrams = sub_tagger._context_to_tag
+        elif name == 'RegexpTagger':
+            regexps = getattr(sub_tagger, '_regexps', None) or getattr(sub_tagger, '_regexs')
+            patterns = [(_pattern_string(regexp), tag) for regexp, tag in regexps]
+        elif name == 'DefaultTagger':
+            default_tag = sub_tagger._tag
+        else:
+            raise ValueError('Please choose a tagger chain built from:',
+                             str(['BigramTagger', 'UnigramTagger', 'RegexpTagger', 'DefaultTagger']))
+        if name in ['RegexpTagger', 'DefaultTagger']:
+            break
+
+    tags = sorted(set(unigrams.values()) | set(bigrams.values()) | set(tag for pattern, tag in patterns) |
+                  ({default_tag} if default_tag is not None else set()))
+    if len(tags) >= _NO_CONTEXT:
+        raise ValueError('Too many tags for the compact format:', str(len(tags)))
+    tag_codes = {tag: code for code, tag in enumerate(tags)}
+
+    words = sorted(set(unigrams) | set(word for history, word in bigrams), key=_encode)
+    encoded = [_encode(word) for word in words]
+    vocab_offsets = np.concatenate([[0], np.cumsum([len(word) for word in encoded], dtype=np.int64)])
+    if vocab_offsets[-1] > np.iinfo(np.int32).max:
+        raise ValueError('Too large a vocabulary for the compact format, bytes:', str(vocab_offsets[-1]))
+    word_ids = {word: word_id for word_id, word in enumerate(words)}
+
+    unigram_tags = np.full(len(words), -1, dtype=np.int16)
+    for word, tag in unigrams.items():
+        unigram_tags[word_ids[word]] = tag_codes[tag]
+
+    bigram_keys = np.array([(word_ids[word] << _PREV_BITS) | (tag_codes[history[0]] + 1 if history else _START)
+                            for history, word in bigrams], dtype=np.int64)
+    bigram_tags = np.array([tag_codes[tag] for tag in bigrams.values()], dtype=np.int16)
+    order = np.argsort(bigram_keys, kind='stable')
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'vocab_bytes.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(os.path.join(path, 'vocab_offsets.npy'), vocab_offsets.astype(np.int32))
+    np.save(os.path.join(path, 'unigram_tags.npy'), unigram_tags)
+    np.save(os.path.join(path, 'bigram_keys.npy'), bigram_keys[order])
+    np.save(os.path.join(path, 'bigram_tags.npy'), bigram_tags[order])
+    with open(os.path.join(path, META_FILE), 'w') as meta:
+        json.dump({'version': FORMAT_VERSION,
+                   'tags': tags,
+                   'regexps': patterns,
+                   'default_tag': default_tag}, meta, indent=1)
+
+    return path
+
+
+class CompactTagger():
+    """
+    Tags tokens from a compact tagger directory exactly as the exported nltk chain would: the bigram context (previous
+    tag, word) is tried first, then the word alone, then the regular expressions or default tag. Batches of sentences
+    are tagged with array lookups and single sentences from a cache of the tokens seen before, rather than a method
+    call per token per backoff level.
+    """
+
+    def __init__(self, path, mmap=True, token_cache_size=100000):
+        """
+
+        :param path: Compact tagger directory written by export_tagger
+        :param mmap: Bool, memory map the arrays rather than reading them into memory
+        :param token_cache_size: Int, how many distinct tokens the tag method remembers the tags of, the cache is
+        emptied when it is full
+        """
+
+        with open(os.path.join(path, META_FILE)) as meta:
+            meta = json.load(meta)
+        if meta['version'] != FORMAT_VERSION:
+            raise ValueError('Unsupported compact tagger version, export the tagger again:', str(meta['version']))
+
+        mmap_mode = 'r' if mmap else None
+        self.path = path
+        self.tags = meta['tags']
+        self.regexps = [(re.compile(pattern), tag) for pattern, tag in meta['regexps']]
+        self.default_tag = meta['default_tag']
+        self.vocab_bytes = np.asarray(np.load(os.path.join(path, 'vocab_bytes.npy'), mmap_mode=mmap_mode))
+        self.vocab_offsets = np.asarray(np.load(os.path.join(path, 'vocab_offsets.npy'), mmap_mode=mmap_mode))
+        self.unigram_tags = np.asarray(np.load(os.path.join(path, 'unigram_tags.npy'), mmap_mode=mmap_mode))
+        self.bigram_keys = np.asarray(np.load(os.path.join(path, 'bigram_keys.npy'), mmap_mode=mmap_mode))
+        self.bigram_tags = np.asarray(np.load(os.path.join(path, 'bigram_tags.npy'), mmap_mode=mmap_mode))
+        self._tag_codes = {tag: code for code, tag in enumerate(self.tags)}
+        self._vocab_starts = self.vocab_offsets[:-1].astype(np.int64)
+        self._vocab_lengths = np.diff(self.vocab_offsets).astype(np.int64)
+        self._vocab_prefixes = _prefixes(self.vocab_bytes, self._vocab_starts, self._vocab_lengths)
+        self.token_cache_size = token_cache_size
+        self._token_cache = {}
+
+    def tag(self, tokens):
+        """
+        Tag one sentence token by token. The context free tag of each token and its tags after each previous tag (its
+        bigram contexts) are read from the tables once and kept in a dict of the tokens seen before, so tagging a
+        known token is two dict lookups. This is quicker than tag_sents for the few short sentences of one snippet.
+
+        :param tokens: List of str tokens of one sentence
+
+        :return: List of (token, tag) tuples
+        """
+
+        token_cache = self._token_cache
+        if len(token_cache) + len(tokens) > self.token_cache_size:
+            token_cache.clear()
+        entries = []
+        for token in tokens:
+            entry = token_cache.get(token)
+            if entry is None:
+                entry = token_cache[token] = self._token_entry(token)
+            entries.append(entry)
+
+        tags = self.tags
+        tagged = []
+        prev = _START
+        for token, (code, contexts) in zip(tokens, entries):
+            code = contexts.get(prev, code)
+            if code >= 0:
+                tagged.append((token, tags[code]))
+                prev = code + 1
+            else:
+                tagged.append((token, None))
+                prev = _NO_CONTEXT
+        return tagged
+
+    def tag_sents(self, sentences):
+        """
+        Tag a batch of sentences at once. Every distinct token is looked up (and if needed regex tagged) once, then the
+        bigram contexts are resolved position by position across all the sentences with array lookups.
+
+        :param sentences: List of sentences, each a list of str tokens
+
+        :return: List of tagged sentences
+        """
+
+        lengths = np.array([len(tokens) for tokens in sentences], dtype=np.int64)
+        tokens = [token for sentence in sentences for token in sentence]
+        if not tokens:
+            return [[] for sentence in sentences]
+
+        unique = {}
+        inverse = np.array([unique.setdefault(token, len(unique)) for token in tokens], dtype=np.int64)
+        unique_tokens = list(unique)
+        unique_ids = self.lookup(unique_tokens)
+        unique_codes = self.unigram_tags[np.maximum(unique_ids, 0)].astype(np.int64)
+        unique_codes[unique_ids < 0] = -1
+        for position in np.flatnonzero(unique_codes < 0).tolist():
+            tag = self.backoff_tag(unique_tokens[position])
+            unique_codes[position] = self._tag_codes[tag] if tag is not None else -1
+
+        word_ids = unique_ids[inverse]
+        codes = unique_codes[inverse]
+        starts = np.cumsum(lengths) - lengths
+
+        bigram_keys = self.bigram_keys
+        bigram_tags = self.bigram_tags
+        if len(bigram_keys):
+            order = np.argsort(-lengths, kind='stable')
+            descending_lengths = lengths[order]
+            prev = np.full(len(order), _START, dtype=np.int64)
+            for position in range(int(descending_lengths[0])):
+                n_active = int(np.searchsorted(-descending_lengths, -position, side='left'))
+                index = starts[order[:n_active]] + position
+                ids = word_ids[index]
+                keys = np.where(ids >= 0, (ids << _PREV_BITS) | prev[:n_active], -1)
+                found = np.minimum(np.searchsorted(bigram_keys, keys), len(bigram_keys) - 1)
+                hit = bigram_keys[found] == keys
+                position_codes = np.where(hit, bigram_tags[found], codes[index])
+                codes[index] = position_codes
+                prev[:n_active] = np.where(position_codes >= 0, position_codes + 1, _NO_CONTEXT)
+
+        tags = np.array(self.tags + [None], dtype=object)[codes].tolist()
+        tagged = list(zip(tokens, tags))
+        return [tagged[start:start + length] for start, length in zip(starts.tolist(), lengths.tolist())]
+
+    def lookup(self, tokens):
+        """
+        :param tokens: List of str tokens
+
+        :return: Integer array of vocabulary ids, -1 for tokens not in the vocabulary
+        """
+
+        return self._lookup_encoded([_encode(token) for token in tokens])
+
+    def words(self):
+        """
+        :return: List of the vocabulary words, indexed by vocabulary id
+        """
+
+        buffer = self.vocab_bytes.tobytes()
+        offsets = self.vocab_offsets.tolist()
+        return [buffer[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def _lookup_encoded(self, encoded):
+        """
+        Find utf-8 encoded tokens in the vocabulary. The packed leading bytes of each token bound the vocabulary words
+        it can be, where several words share them a binary search comparing whole words runs over all the tokens at
+        once, and the remaining candidate of each token is checked for equality
+
+        :param encoded: List of utf-8 encoded tokens
+
+        :return: Integer array of vocabulary ids, -1 for tokens not in the vocabulary
+        """
+
+        word_ids = np.full(len(encoded), -1, dtype=np.int64)
+        if not len(self._vocab_lengths) or not len(encoded):
+            return word_ids
+
+        lengths = np.array([len(token) for token in encoded], dtype=np.int64)
+        starts = np.cumsum(lengths) - lengths
+        buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        prefixes = _prefixes(buffer, starts, lengths)
+        low = np.searchsorted(self._vocab_prefixes, prefixes, side='left')
+        end = np.searchsorted(self._vocab_prefixes, prefixes, side='right')
+
+        high = end.copy()
+        active = np.flatnonzero(high - low > 1)
+        while len(active):
+            middle = (low[active] + high[active]) // 2
+            less = self._word_less(middle, buffer, starts[active], lengths[active])
+            low[active] = np.where(less, middle + 1, low[active])
+            high[active] = np.where(less, high[active], middle)
+            active = active[low[active] < high[active]]
+
+        candidates = np.flatnonzero(low < end)
+        candidates = candidates[self._vocab_lengths[low[candidates]] == lengths[candidates]]
+        if len(candidates):
+            width = max(int(lengths[candidates].max()), 1)
+            same = (_gather(self.vocab_bytes, self._vocab_starts[low[candidates]], lengths[candidates], width) ==
+                    _gather(buffer, starts[candidates], lengths[candidates], width)).all(axis=1)
+            word_ids[candidates[same]] = low[candidates[same]]
+        return word_ids
+
+    def _word_less(self, word_ids, buffer, starts, lengths):
+        """
+        :return: Bool array of whether each vocabulary word sorts before the token buffer[start:start + length] of the
+        same row, comparing the first differing byte or, when one is a prefix of the other, the lengths
+        """
+
+        width = max(int(lengths.max()), 1)
+        word_lengths = self._vocab_lengths[word_ids]
+        words = _gather(self.vocab_bytes, self._vocab_starts[word_ids], word_lengths, width)
+        tokens = _gather(buffer, starts, lengths, width)
+
+        differs = words != tokens
+        rows = np.arange(len(word_ids))
+        first = differs.argmax(axis=1)
+        return np.where(differs.any(axis=1), words[rows, first] < tokens[rows, first], word_lengths < lengths)
+
+    def _token_entry(self, token):
+        """
+        :return: The context free tag code of a token (-1 where nothing tags it), and a dict of its bigram contexts
+        from the previous tag code + 1 (0 at the start of a sentence) to its tag code
+        """
+
+        word_id = self._lookup_token(_encode(token))
+        code = int(self.unigram_tags[word_id]) if word_id >= 0 else -1
+        if code < 0:
+            tag = self.backoff_tag(token)
+            code = self._tag_codes[tag] if tag is not None else -1
+        if word_id < 0:
+            return code, _NO_BIGRAMS
+
+        bigram_keys = self.bigram_keys
+        start = int(bigram_keys.searchsorted(word_id << _PREV_BITS))
+        end = int(bigram_keys.searchsorted((word_id + 1) << _PREV_BITS))
+        if end == start:
+            return code, _NO_BIGRAMS
+        return code, dict(zip((bigram_keys[start:end] & _PREV_MASK).tolist(), self.bigram_tags[start:end].tolist()))
+
+    def _lookup_token(self, encoded):
+        """
+        The scalar version of _lookup_encoded for one token
+
+        :param encoded: utf-8 encoded token
+
+        :return: Int vocabulary id, -1 if the token is not in the vocabulary
+        """
+
+        # A python int would make searchsorted cast the whole array
+        prefix = np.uint64(int.from_bytes(encoded[:_PREFIX_BYTES].ljust(_PREFIX_BYTES, b'\0'), 'big'))
+        low = int(self._vocab_prefixes.searchsorted(prefix))
+        end = int(self._vocab_prefixes.searchsorted(prefix, side='right'))
+
+        high = end
+        while low < high:
+            middle = (low + high) // 2
+            if self._word(middle) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low < end and self._word(low) == encoded:
+            return low
+        return -1
+
+    def _word(self, word_id):
+        return self.vocab_bytes[self.vocab_offsets[word_id]:self.vocab_offsets[word_id + 1]].tobytes()
+
+    def backoff_tag(self, token):
+        """
+        The tag for a token without a usable context: the first matching regular expression or the default tag
+
+        :param token: Str token
+
+        :return: Str tag, None if nothing matches
+        """
+
+        for regexp, tag in self.regexps:
+            if regexp.match(token):
+                return tag
+        return self.default_tag
+
+
+def _encode(word):
+    return word.encode('utf-8')
+
+
+def _gather(buffer, starts, lengths, width):
+    """
+    :return: Byte matrix with the bytes buffer[start:start + length] in each row, cut or zero padded to width
+    """
+
+    columns = np.arange(width)
+    inside = columns < lengths[:, None]
+    matrix = np.zeros((len(starts), width), dtype=np.uint8)
+    matrix[inside] = buffer[(starts[:, None] + columns)[inside]]
+    return matrix
+
+
+def _prefixes(buffer, starts, lengths):
+    """
+    :return: The leading bytes of each string in buffer as a big endian integer, which orders as the bytes do
+    """
+
+    return _gather(buffer, starts, lengths, _PREFIX_BYTES).view('>u8').ravel().astype(np.uint64)
+
+
+def _pattern_string(regexp):
+    if isinstance(regexp, str):
+        return regexp
+    if hasattr(regexp, 'pattern'):
+        return regexp.pattern
+    return regexp._rx.pattern
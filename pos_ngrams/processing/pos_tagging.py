@@ -6,32 +6,215 @@ import os
 import pickle
 import re
 
+from pos_ngrams.caching import LRUCache
 from pos_ngrams.preprocessing.tokenizer import tokenizer_sentence
 
 __author__ = "Peter J Usherwood"
 __python_version__ = "3.6"
 
 
-def tag_snippet(snippet, tagger_name):
+_TAGGER_CACHE = LRUCache(maxsize=4)
+
+
+def model_path(tagger_name):
     """
-    Tag Snippets using a pos tagger
+    Path of a persisted pos tagger
 
-    :param snippet: Text snippet
-    :param tagger_name: Name of pos tagger as it appears in utils_data/models/pos_taggers/
+    :param tagger_name: Name of pos tagger as it appears in models/
 
-    :return: List of tuples for the tagged snippet
+    :return: Absolute path to the pickled tagger
     """
 
-    file = os.path.join(os.path.dirname(os.path.realpath(__file__)),'../../models/' +
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../models/' +
                         tagger_name + '.pkl')
 
-    input = open(file, 'rb')
+
+def compact_model_path(tagger_name):
+    """
+    Path of a persisted compact pos tagger
+
+    :param tagger_name: Name of pos tagger as it appears in models/
+
+    :return: Absolute path to the compact tagger directory
+    """
+
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../models/' + tagger_name)
+
+
+def load_tagger(tagger_name):
+    """
+    Load a pos tagger, each tagger is loaded once and then held in a process wide least recently used registry. The
+    compact memory mapped format (see compact_tagger) is used when it exists, otherwise the pickled tagger is loaded
+
+    :param tagger_name: Name of pos tagger as it appears in models/
+
+    :return: The tagger
+    """
+
+    from pos_ngrams.processing.compact_tagger import CompactTagger, is_compact_tagger
+
+    def _load():
+        if is_compact_tagger(compact_model_path(tagger_name)):
+            return CompactTagger(compact_model_path(tagger_name))
+        return load_pickled_tagger(tagger_name)
+
+    return _TAGGER_CACHE.get_or_create(tagger_name, _load)
+
+
+def load_pickled_tagger(tagger_name):
+    """
+    Unpickle the nltk tagger chain of a model, bypassing the registry and the compact format
+
+    :param tagger_name: Name of pos tagger as it appears in models/
+
+    :return: The nltk tagger
+    """
+
+    input = open(model_path(tagger_name), 'rb')
     tagger = pickle.load(input)
     input.close()
 
+    # Taggers pickled with older nltk versions store the regular expressions as _regexs, and the timeout of the
+    # patterns compiled by newer versions does not survive pickling, so the patterns are compiled again
+    for sub_tagger in getattr(tagger, '_taggers', []):
+        regexps = getattr(sub_tagger, '_regexps', None) or getattr(sub_tagger, '_regexs', None)
+        if regexps:
+            patterns = [(getattr(regexp, 'pattern', regexp), tag) for regexp, tag in regexps]
+            sub_tagger._regexps = type(sub_tagger)(patterns)._regexps
+
+    return tagger
+
+
+def export_tagger_model(tagger_name):
+    """
+    Convert a pickled tagger in models/ to the compact format, load_tagger then uses the compact tagger
+
+    :param tagger_name: Name of pos tagger as it appears in models/
+
+    :return: Path to the compact tagger directory
+    """
+
+    from pos_ngrams.processing.compact_tagger import export_tagger
+
+    tagger = load_pickled_tagger(tagger_name)
+
+    path = export_tagger(tagger, compact_model_path(tagger_name))
+    evict_tagger(tagger_name)
+    return path
+
+
+def tagger_cache_info():
+    """
+    Statistics for the loaded tagger registry
+
+    :return: Dict with hits, misses, hit_rate, size and maxsize
+    """
+
+    return _TAGGER_CACHE.info()
+
+
+def set_tagger_cache_size(maxsize):
+    """
+    Change how many taggers are held in memory at once, the least recently used are evicted first
+
+    :param maxsize: Int, maximum number of loaded taggers, None for unbounded
+    """
+
+    _TAGGER_CACHE.resize(maxsize)
+
+
+def evict_tagger(tagger_name):
+    """
+    Drop one tagger from the registry, so the next load_tagger reads the model from disk again (after it has been
+    retrained or exported)
+
+    :param tagger_name: Name of pos tagger as it appears in models/
+    """
+
+    _TAGGER_CACHE.discard(tagger_name)
+
+
+def clear_tagger_cache():
+    """
+    Drop all loaded taggers and reset the hit/miss counters
+    """
+
+    _TAGGER_CACHE.clear()
+
+
+def tokenize_snippet(snippet):
+    """
+    Split a snippet into sentences of tagger tokens
+
+    :param snippet: Text snippet
+
+    :return: List of sentences, each a list of tokens
+    """
+
+    return [re.findall(r"[\w']+|[.,!?;]", sent) for sent in tokenizer_sentence(snippet)]
+
+
+def tag_snippet(snippet, tagger_name):
+    """
+    Tag Snippets using a pos tagger
+
+    :param snippet: Text snippet
+    :param tagger_name: Name of pos tagger as it appears in models/
+
+    :return: List of tuples for the tagged snippet
+    """
+
+    tagger = load_tagger(tagger_name)
+
     sent_tagged = []
-    for sent in tokenizer_sentence(snippet):
-        tokens = re.findall(r"[\w']+|[.,!?;]", sent)
+    for tokens in tokenize_snippet(snippet):
         sent_tagged += tagger.tag(tokens)
     return sent_tagged
 
+
+def tag_snippets(snippets, tagger_name):
+    """
+    Tag many snippets in one call, the tagger is loaded once and all sentences are tagged together
+
+    :param snippets: Iterable of text snippets
+    :param tagger_name: Name of pos tagger as it appears in models/
+
+    :return: List with one list of pos tuples per snippet
+    """
+
+    tagger = load_tagger(tagger_name)
+
+    sents = []
+    sents_per_snippet = []
+    for snippet in snippets:
+        snippet_sents = tokenize_snippet(snippet)
+        sents += snippet_sents
+        sents_per_snippet.append(len(snippet_sents))
+
+    sents_tagged = tagger.tag_sents(sents)
+
+    tagged = []
+    position = 0
+    for n_sents in sents_per_snippet:
+        snippet_tagged = []
+        for sent_tagged in sents_tagged[position:position + n_sents]:
+            snippet_tagged += sent_tagged
+        tagged.append(snippet_tagged)
+        position += n_sents
+    return tagged
+
+
+def tag_df(data, text_field_key='Snippet', tagger_name='simplified_en', new_field_key='POS Tuples'):
+    """
+    Tag a text column of a pandas dataframe, the tagger is loaded once for the whole column
+
+    :param data: Pandas dataframe
+    :param text_field_key: The field name of the text to be tagged
+    :param tagger_name: Name of pos tagger as it appears in models/
+    :param new_field_key: The field name to store the lists of pos tuples in
+
+    :return: data with the additional pos tuple column
+    """
+
+    data[new_field_key] = tag_snippets(data[text_field_key].values.tolist(), tagger_name)
+    return data
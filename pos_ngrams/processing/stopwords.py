@@ -3,14 +3,149 @@
 """Function for removing stop words from text using a combination of NLTK and custom lists"""
 
 import os
+import threading
 
-from nltk.corpus import stopwords
-from pos_ngrams.preprocessing.tokenizer import tokenizer_word
+from pos_ngrams.preprocessing.tokenizer import tokenizer_word, PosTokenStream
 
 __author__ = "Peter J Usherwood"
 __python_version__ = "3.6"
 
 
+_STOPWORD_FILTERS = {}
+_STOPWORD_FILTERS_LOCK = threading.Lock()
+
+
+class StopwordFilter():
+    """
+    Stopword remover compiled once for a language and adhoc list, removal then costs one set lookup per token
+    """
+
+    def __init__(self, language='english', adhoc_list=[], ignore_nltk=False):
+        """
+
+        :param language: String of the language name you wish to remove basic stop words for (see
+        create_stopwords_set)
+        :param adhoc_list: List of strings of specific adhoc words you would like removed
+        :param ignore_nltk: Boolean to ignore NLTK presets for basic language (see create_stopwords_set)
+        """
+
+        self.language = language
+        self.adhoc_list = list(adhoc_list)
+        self.ignore_nltk = ignore_nltk
+        self.stopwords_set = frozenset(create_stopwords_set(basic_language=language,
+                                                            adhoc_list=adhoc_list,
+                                                            ignore_nltk=ignore_nltk))
+
+    @classmethod
+    def from_words(cls, words):
+        """
+        A filter over a fixed list of stopwords, the nltk stopwords are not looked up
+
+        :param words: List of strings of the stopwords
+
+        :return: StopwordFilter
+        """
+
+        stopword_filter = cls.__new__(cls)
+        stopword_filter.language = None
+        stopword_filter.adhoc_list = list(words)
+        stopword_filter.ignore_nltk = True
+        stopword_filter.stopwords_set = frozenset(words)
+        return stopword_filter
+
+    def __contains__(self, token):
+        return token in self.stopwords_set
+
+    def __call__(self, text_string=None, tokens=None, pos_tuples=False):
+        """
+        Remove stopwords with the same arguments and return types as stopword_removal
+
+        :param text_string: String you wish to remove stopwords from
+        :param tokens: Python list of strings (or pos tuples) already tokenized
+        :param pos_tuples: Bool, if tokens are a list of pos_tuples set this to true
+
+        :return: String if text_string was given, otherwise a list comparable to tokens
+        """
+
+        if tokens is None:
+            return self.filter_text(text_string)
+        elif pos_tuples or isinstance(tokens, PosTokenStream):
+            return self.filter_pos(tokens)
+        return self.filter_tokens(tokens)
+
+    def filter_text(self, text_string):
+        """
+        :param text_string: String you wish to remove stopwords from
+
+        :return: The string minus the stopwords, re-joined on single spaces
+        """
+
+        stopwords_set = self.stopwords_set
+        return " ".join([token for token in tokenizer_word(text_string) if token not in stopwords_set])
+
+    def filter_tokens(self, tokens):
+        """
+        :param tokens: List of str tokens
+
+        :return: List of the tokens that are not stopwords
+        """
+
+        stopwords_set = self.stopwords_set
+        return [token for token in tokens if token not in stopwords_set]
+
+    def filter_pos(self, pos_tuples):
+        """
+        :param pos_tuples: List of (token, tag) tuples, or a PosTokenStream whose stopwords are removed in place
+
+        :return: List of the pos tuples whose token is not a stopword, or the same PosTokenStream
+        """
+
+        stopwords_set = self.stopwords_set
+        if isinstance(pos_tuples, PosTokenStream):
+            return pos_tuples.drop_words(stopwords_set)
+        return [(token, tag) for token, tag in pos_tuples if token not in stopwords_set]
+
+    def filter_series(self, series, pos_tuples=False):
+        """
+        Remove stopwords from every row of a pandas series
+
+        :param series: Pandas series of strings, or of lists of pos tuples if pos_tuples
+        :param pos_tuples: Bool, if the rows are lists of pos_tuples set this to true
+
+        :return: Pandas series with the same index as the input
+        """
+
+        import pandas as pd
+
+        remove = self.filter_pos if pos_tuples else self.filter_text
+        return pd.Series([remove(row) for row in series], index=series.index, name=series.name)
+
+
+def get_stopword_filter(language='english', adhoc_list=[], ignore_nltk=False):
+    """
+    Return the StopwordFilter for a configuration, each configuration is only compiled once per process
+
+    :param language: String of the language name you wish to remove basic stop words for
+    :param adhoc_list: List of strings of specific adhoc words you would like removed
+    :param ignore_nltk: Boolean to ignore NLTK presets for basic language
+
+    :return: StopwordFilter
+    """
+
+    key = (language, tuple(sorted(set(adhoc_list))), ignore_nltk)
+    try:
+        return _STOPWORD_FILTERS[key]
+    except KeyError:
+        pass
+
+    with _STOPWORD_FILTERS_LOCK:
+        if key not in _STOPWORD_FILTERS:
+            _STOPWORD_FILTERS[key] = StopwordFilter(language=language,
+                                                    adhoc_list=adhoc_list,
+                                                    ignore_nltk=ignore_nltk)
+        return _STOPWORD_FILTERS[key]
+
+
 def stopword_removal(text_string=None,
                      tokens=None,
                      pos_tuples=False,
@@ -22,7 +157,8 @@ def stopword_removal(text_string=None,
 
     :param text_string: String you wish to remove stopwords from, this should be pre cleaned to lower and remove
     punctuation first, please see cleaning.py
-    :param tokens: Python list of strings already tokenized to have stopwords removed
+    :param tokens: Python list of strings already tokenized to have stopwords removed, or a PosTokenStream which is
+    filtered in place
     :param pos_tuples: Bool, if tokens are a list of pos_tuples set this to true
     :param language: String of the language name you wish to remove basic stop words for, by default
     the program will look in NLTK for the language list, and if it cannot find it, it will look in
@@ -34,18 +170,11 @@ def stopword_removal(text_string=None,
     :return: Returns the string you entered minus the stopwords in the superset of the above lists
     """
 
-    stopwords_set = create_stopwords_set(basic_language=language,
-                                         adhoc_list=adhoc_list,
-                                         ignore_nltk=ignore_nltk)
+    stopword_filter = get_stopword_filter(language=language,
+                                          adhoc_list=adhoc_list,
+                                          ignore_nltk=ignore_nltk)
 
-    if tokens is None:
-        tokens = tokenizer_word(text_string)
-        tokens = [token for token in tokens if token not in stopwords_set]
-        stopped = " ".join(tokens)
-    elif pos_tuples:
-        stopped = [(token, tag) for token, tag in tokens if token not in stopwords_set]
-    else:
-        stopped = [token for token in tokens if token not in stopwords_set]
+    stopped = stopword_filter(text_string=text_string, tokens=tokens, pos_tuples=pos_tuples)
 
     return stopped
 
@@ -63,6 +192,8 @@ def create_stopwords_set(basic_language, adhoc_list=[], ignore_nltk=False):
     :return: Set of stopwords
     """
 
+    from nltk.corpus import stopwords
+
     stopwords_set = set([])
 
     # Append basic language sets using NLTK and/or language_basic files
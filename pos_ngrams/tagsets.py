@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+"""Table driven simplification of pos tagsets, each tagset is declared as an ordered list of rules that is compiled
+once into a lookup from raw tag prefix to simplified tag"""
+
+import hashlib
+import string
+import threading
+
+import numpy as np
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+# A rule with this simplified tag maps each of its prefixes to itself
+PASSTHROUGH = None
+
+BROWN_RULES = [('NP', ['NP']),  # proper noun
+               (PASSTHROUGH, list(string.punctuation)),
+               ('NN', ['NR', 'NN']),  # noun
+               ('VB', ['VB', 'DO', 'EX', 'HV', 'BE', 'DI']),  # verb
+               ('NU', ['CD', 'OD']),  # numbers
+               ('AD', ['JJ']),  # adjective
+               ('QL', ['QL', 'DT', 'WQ']),  # qualifier
+               ('AV', ['RB', 'RN', 'RP']),  # adverb
+               ('*:', ['*:']),  # negator
+               ('PN', ['PN', 'PP', 'PR', 'WP'])]  # pronoun
+
+PAROLE_RULES = [('NP', ['NP']),  # proper noun
+                (PASSTHROUGH, list(string.punctuation)),
+                ('NN', ['NC']),  # noun
+                ('VB', ['VS', 'VM', 'VA']),  # verb
+                ('NU', ['Z', 'Zm', 'Zp']),  # numbers
+                ('AD', ['AO', 'AQ']),  # adjective
+                ('AV', ['RG', 'RN'])]  # adverb
+
+ES_RULES = [('NP', ['NP']),  # proper noun
+            ('.', ['Fa', 'Fc', 'Fd', 'Fe', 'Fg', 'Fh', 'Fi', 'Fp', 'Fr', 'Fs', 'Fx', 'Fz']),  # punctuation
+            ('NN', ['NC', 'W']),  # noun
+            ('VB', ['VA', 'VM', 'VS']),  # verb
+            ('NU', ['Z', 'Zd', 'Zm', 'Zp']),  # numbers
+            ('AD', ['JJ']),  # adjective
+            ('QL', ['DA', 'DD', 'DI', 'DT', 'PD', 'PI']),  # qualifier
+            ('AV', ['RG', 'RN']),  # adverb
+            ('PN', ['DP', 'PX', 'P0', 'PP', 'PR', 'PT'])]  # pronoun
+
+
+class TagsetMapper():
+    """
+    Maps raw pos tags to simplified tags. A raw tag is truncated to its prefix and looked up in a table compiled from
+    the rules, where the first rule listing a prefix wins, prefixes no rule lists map to the default tag.
+    """
+
+    def __init__(self, rules, default='OT', prefix_length=2):
+        """
+
+        :param rules: Ordered list of (simplified tag, list of raw tag prefixes), a simplified tag of PASSTHROUGH
+        keeps the prefix itself
+        :param default: The simplified tag of prefixes that no rule lists
+        :param prefix_length: Int, the number of leading characters of a raw tag that are looked up
+        """
+
+        self.rules = [(simplified, list(prefixes)) for simplified, prefixes in rules]
+        self.default = default
+        self.prefix_length = prefix_length
+        # Identifies the rules, so corpora simplified under other rules are not reused (see pos_train)
+        self.fingerprint = hashlib.sha1(repr((self.rules, default, prefix_length)).encode('utf-8')).hexdigest()[:12]
+
+        self.table = {}
+        for simplified, prefixes in self.rules:
+            for prefix in prefixes:
+                self.table.setdefault(prefix, prefix if simplified is PASSTHROUGH else simplified)
+
+    def __call__(self, tag):
+        """
+        :param tag: Str, the raw tag
+
+        :return: Str, the simplified tag
+        """
+
+        return self.table.get(tag[:self.prefix_length], self.default)
+
+    def map_tags(self, tags):
+        """
+        :param tags: Iterable of raw tags
+
+        :return: List of simplified tags
+        """
+
+        table = self.table
+        default = self.default
+        prefix_length = self.prefix_length
+        return [table.get(tag[:prefix_length], default) for tag in tags]
+
+    def map_codes(self, tags):
+        """
+        Compile the mapping of a list of distinct raw tags, the tag codes of a whole corpus are then simplified with a
+        single array lookup: simplified_codes = code_map[raw_codes]
+
+        :param tags: List of the distinct raw tags, indexed by raw tag code
+
+        :return: List of the distinct simplified tags in order of first appearance, and an integer array mapping each
+        raw tag code to its simplified tag code
+        """
+
+        simplified = self.map_tags(tags)
+        simplified_tags = list(dict.fromkeys(simplified))
+        codes = {tag: code for code, tag in enumerate(simplified_tags)}
+        return simplified_tags, np.array([codes[tag] for tag in simplified], dtype=np.int16)
+
+    def map_encoded(self, encoded):
+        """
+        Simplify every tag of an encoded corpus (see pos_train.EncodedCorpus) in one vectorized step
+
+        :param encoded: EncodedCorpus with raw tags
+
+        :return: EncodedCorpus with simplified tags
+        """
+
+        tags, code_map = self.map_codes(encoded.tags)
+        return type(encoded)(encoded.words, tags, encoded.word_ids, code_map[encoded.tag_codes.astype(np.int64)],
+                             encoded.lengths)
+
+
+_TAGSETS = {}
+_TAGSETS_LOCK = threading.Lock()
+
+
+def register_tagset(name, rules, default='OT', prefix_length=2):
+    """
+    Register the simplification rules of a tagset, replacing any tagset of the same name
+
+    :param name: String, the tagset name
+    :param rules: Ordered list of (simplified tag, list of raw tag prefixes) (see TagsetMapper)
+    :param default: The simplified tag of prefixes that no rule lists
+    :param prefix_length: Int, the number of leading characters of a raw tag that are looked up
+
+    :return: The compiled TagsetMapper
+    """
+
+    mapper = TagsetMapper(rules, default=default, prefix_length=prefix_length)
+    with _TAGSETS_LOCK:
+        _TAGSETS[name] = mapper
+    return mapper
+
+
+def get_tagset_mapper(name):
+    """
+    :param name: String, a registered tagset name
+
+    :return: The compiled TagsetMapper
+    """
+
+    try:
+        return _TAGSETS[name]
+    except KeyError:
+        raise ValueError('Please choose a valid tagset from:', str(sorted(_TAGSETS)))
+
+
+register_tagset('brown', BROWN_RULES)
+register_tagset('parole', PAROLE_RULES)
+register_tagset('es', ES_RULES)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+"""Shared fixtures for the tests: small reproducible corpora of social media text and pos tuples, and a stopword
+filter over a fixed list so the tests do not need the nltk stopwords to be installed"""
+
+import random
+
+import pandas as pd
+import pytest
+
+from pos_ngrams.processing.stopwords import StopwordFilter
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+WORDS = ("The cat sat on the mat running jumped happily Cats are GREAT, aren't they? I'm loving it/this! dog's bone "
+         "42 3.5 party art café naïve\tfun\nnight").split(' ')
+TAGS = ['NN', 'VB', 'OT', 'AD']
+STOPWORDS = ['the', 'on', 'are', 'they', 'it', 'this']
+
+
+def make_text_data(n_rows, seed=0):
+    """
+    :param n_rows: Int, number of rows
+    :param seed: Int, random seed
+
+    :return: Pandas dataframe with Snippet, Sentiment and Reach columns, the snippets mix in hashtags, at mentions and
+    urls
+    """
+
+    random_state = random.Random(seed)
+    snippets = []
+    for i in range(n_rows):
+        tokens = [random_state.choice(WORDS) for j in range(random_state.randint(1, 15))]
+        if random_state.random() < .3:
+            tokens.insert(random_state.randint(0, len(tokens)), '#' + random_state.choice(['fun', 'Party']))
+        if random_state.random() < .3:
+            tokens.insert(random_state.randint(0, len(tokens)), '@' + random_state.choice(['bob', 'al']))
+        if random_state.random() < .2:
+            tokens.insert(random_state.randint(0, len(tokens)), random_state.choice(['http://x.co/a', 'www.foo.com']))
+        snippets.append(' '.join(tokens))
+
+    return pd.DataFrame({'Snippet': pd.Series(snippets, dtype=object),
+                         'Sentiment': [random_state.uniform(-1, 1) for i in range(n_rows)],
+                         'Reach': [random_state.randint(0, 100) for i in range(n_rows)]})
+
+
+def make_pos_data(n_rows, seed=0):
+    """
+    :param n_rows: Int, number of rows
+    :param seed: Int, random seed
+
+    :return: Pandas dataframe as make_text_data with the Snippet column as lists of (word, tag) tuples
+    """
+
+    random_state = random.Random(seed)
+    data = make_text_data(n_rows, seed)
+    data['Snippet'] = pd.Series([[(word, random_state.choice(TAGS)) for word in snippet.split()]
+                                 for snippet in data['Snippet']], dtype=object)
+    return data
+
+
+@pytest.fixture
+def text_data():
+    return make_text_data(600, seed=1)
+
+
+@pytest.fixture
+def pos_data():
+    return make_pos_data(400, seed=2)
+
+
+@pytest.fixture
+def stopword_filter():
+    return StopwordFilter.from_words(STOPWORDS)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""clean_series must clean every row exactly as clean_text does"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pos_ngrams.preprocessing.cleaning import clean_series, clean_text
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+ROWS = ['The cat sat on the mat.',
+        "Cats are GREAT, aren't they?",
+        "I'm loving it/this!",
+        '  leading and   trailing  spaces  ',
+        'tabs\tand\nnewlines\r\nand\x0bvertical\x0cfeeds',
+        'unicode café naïve ÉTÉ non breaking em space',
+        '#hashtag @mention http://x.co/a www.foo.com',
+        '!!! ... ???',
+        'a/b//c / d',
+        '42 3.5 -7',
+        'a\x00b',
+        '',
+        None,
+        np.nan,
+        3.5]
+
+
+@pytest.mark.parametrize('remove_punctuation', [True, False])
+@pytest.mark.parametrize('remove_additional_whitespaces', [True, False])
+@pytest.mark.parametrize('lower', [True, False])
+def test_matches_clean_text(remove_punctuation, remove_additional_whitespaces, lower):
+    options = {'remove_punctuation': remove_punctuation,
+               'remove_additional_whitespaces': remove_additional_whitespaces,
+               'lower': lower}
+    series = pd.Series(ROWS, index=range(10, 10 + len(ROWS)), name='Snippet', dtype=object)
+
+    cleaned = clean_series(series, **options)
+
+    assert cleaned.tolist() == [clean_text(text_string=row, **options) for row in ROWS]
+    assert cleaned.index.equals(series.index)
+    assert cleaned.name == 'Snippet'
+
+
+@pytest.mark.parametrize('punctuation', ['!?', '.,/', '\x00!'])
+def test_custom_punctuation(punctuation):
+    series = pd.Series(ROWS, dtype=object)
+
+    cleaned = clean_series(series, punctuation=punctuation)
+
+    assert cleaned.tolist() == [clean_text(text_string=row, punctuation=punctuation) for row in ROWS]
+
+
+def test_random_rows(text_data):
+    cleaned = clean_series(text_data['Snippet'])
+
+    assert cleaned.tolist() == [clean_text(text_string=row) for row in text_data['Snippet']]
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+"""The compact tagger must tag exactly as the nltk tagger chain it was exported from"""
+
+import os
+import random
+
+import nltk
+import pytest
+
+from pos_ngrams.pos_train import train_pos_tagger
+from pos_ngrams.processing import pos_tagging
+from pos_ngrams.processing.compact_tagger import CompactTagger, export_tagger, is_compact_tagger
+from pos_ngrams.processing.pos_tagging import compact_model_path, load_pickled_tagger, model_path
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+WORDS = ['the', 'cat', 'sat', 'on', 'mat', 'running', 'jumped', 'happily', 'dog', 'bone', '42', '3.5', 'party',
+         'art', 'loves', 'it', 'they', 'played', 'games', 'music']
+TAGS = ['NN', 'VB', 'AD', 'QL', 'PN']
+PATTERNS = [(r'.*ing$', 'VB'),
+            (r'.*ed$', 'VB'),
+            (r'.*es$', 'VB'),
+            (r'^-?[0-9]+(.[0-9]+)?$', 'NU'),
+            (r'.*', 'NN')]
+
+
+def make_tagged_sents(n_sents, seed=0):
+    """
+    Sentences whose tags depend on the previous tag, so the bigram level of the chain is exercised
+    """
+
+    random_state = random.Random(seed)
+    word_tags = {word: (random_state.choice(TAGS), random_state.choice(TAGS)) for word in WORDS}
+    sents = []
+    for i in range(n_sents):
+        sent = []
+        previous = None
+        for j in range(random_state.randint(1, 12)):
+            word = random_state.choice(WORDS)
+            tag = word_tags[word][1 if previous in ['QL', 'PN'] else 0]
+            sent.append((word, tag))
+            previous = tag
+        sents.append(sent)
+    return sents
+
+
+def make_token_sents(n_sents, seed=1):
+    """
+    Sentences mixing known words with unseen words that fall through to the regular expressions
+    """
+
+    random_state = random.Random(seed)
+    unseen = ['walking', 'wanted', 'goes', '-7', '1.25', 'zebra', '']
+    return [[random_state.choice(WORDS + unseen) for j in range(random_state.randint(0, 12))]
+            for i in range(n_sents)]
+
+
+@pytest.mark.parametrize('regex', [True, False])
+@pytest.mark.parametrize('levels', ['bigram', 'unigram'])
+def test_matches_nltk_chain(tmp_path, regex, levels):
+    train = make_tagged_sents(300)
+    tagger = nltk.RegexpTagger(PATTERNS) if regex else nltk.DefaultTagger('NN')
+    tagger = nltk.UnigramTagger(train, backoff=tagger)
+    if levels == 'bigram':
+        tagger = nltk.BigramTagger(train, backoff=tagger)
+
+    compact = CompactTagger(export_tagger(tagger, str(tmp_path / 'tagger')))
+
+    sents = make_token_sents(200)
+    assert compact.tag_sents(sents) == tagger.tag_sents(sents)
+    assert [compact.tag(sent) for sent in sents[:20]] == [tagger.tag(sent) for sent in sents[:20]]
+
+
+@pytest.mark.skipif(not (os.path.isfile(model_path('simplified_en')) and
+                         os.path.isdir(compact_model_path('simplified_en'))),
+                    reason='the simplified_en model is not installed')
+def test_matches_bundled_model():
+    tagger = load_pickled_tagger('simplified_en')
+    compact = CompactTagger(compact_model_path('simplified_en'))
+
+    sents = [sent.split() for sent in ["The cat sat on the mat .",
+                                       "I 'm loving the running , they jumped happily !",
+                                       "42 dogs ate 3.5 bones at the party yesterday",
+                                       "Unseenword walking wanted goes"]]
+    sents += make_token_sents(100)
+    assert compact.tag_sents(sents) == tagger.tag_sents(sents)
+    assert [compact.tag(sent) for sent in sents] == [tagger.tag(sent) for sent in sents]
+
+
+@pytest.mark.parametrize('token_cache_size', [100000, 5, 0])
+def test_tag_matches_nltk_chain(tmp_path, token_cache_size):
+    train = make_tagged_sents(300)
+    tagger = nltk.BigramTagger(train, backoff=nltk.UnigramTagger(train, backoff=nltk.RegexpTagger(PATTERNS)))
+
+    compact = CompactTagger(export_tagger(tagger, str(tmp_path / 'tagger')), token_cache_size=token_cache_size)
+
+    sents = make_token_sents(200)
+    expected = [tagger.tag(sent) for sent in sents]
+    # The second pass tags from the token cache
+    for i in range(2):
+        assert [compact.tag(sent) for sent in sents] == expected
+
+
+def test_lookup_matches_vocabulary(tmp_path):
+    words = ['a', 'ab', 'abc', 'b', 'café', 'cafe', 'caf', '', 'z' * 40, 'a\x00', 'Ünïcode', '日本']
+    tagger = nltk.UnigramTagger(model={word: 'NN' for word in words}, backoff=nltk.DefaultTagger('VB'))
+
+    compact = CompactTagger(export_tagger(tagger, str(tmp_path / 'tagger')), mmap=False)
+
+    assert sorted(compact.words()) == sorted(words)
+    assert compact.words() == sorted(words, key=lambda word: word.encode('utf-8'))
+    queries = words + ['aa', 'a\x00\x00', 'abcd', 'caff', 'z' * 39, 'z' * 41, '\x00', 'zzz', 'Ü', '日']
+    expected = [compact.words().index(query) if query in words else -1 for query in queries]
+    assert compact.lookup(queries).tolist() == expected
+    assert compact.lookup([]).tolist() == []
+
+
+@pytest.fixture
+def models_dir(tmp_path, monkeypatch):
+    # Point the model paths of load_tagger at a temporary models/ directory
+    monkeypatch.setattr(pos_tagging, 'model_path', lambda tagger_name: str(tmp_path / (tagger_name + '.pkl')))
+    monkeypatch.setattr(pos_tagging, 'compact_model_path', lambda tagger_name: str(tmp_path / tagger_name))
+    pos_tagging.clear_tagger_cache()
+    yield tmp_path
+    pos_tagging.clear_tagger_cache()
+
+
+def test_retraining_replaces_loaded_tagger(models_dir):
+    train = make_tagged_sents(200)
+
+    train_pos_tagger('toy', corpus=train, compact=True, seed=0, cache=False, path=str(models_dir))
+    assert is_compact_tagger(str(models_dir / 'toy'))
+    assert isinstance(pos_tagging.load_tagger('toy'), CompactTagger)
+
+    train_pos_tagger('toy', corpus=train, compact=False, seed=0, cache=False, path=str(models_dir))
+    assert not os.path.exists(str(models_dir / 'toy'))
+    tagger = pos_tagging.load_tagger('toy')
+    assert not isinstance(tagger, CompactTagger)
+
+    train_pos_tagger('toy', corpus=train, compact=True, seed=0, cache=False, path=str(models_dir))
+    compact = pos_tagging.load_tagger('toy')
+    assert isinstance(compact, CompactTagger)
+    sents = make_token_sents(50)
+    assert compact.tag_sents(sents) == tagger.tag_sents(sents)
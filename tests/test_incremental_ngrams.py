@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+"""The incremental ngram counting (ngram_pipeline(incremental=True), partial_fit and from_chunks) must give the same
+ngrams, word_frequency_matrix and vectorizer as the in memory pipeline over all the data"""
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pos_ngrams.n_grams.main import NGrams
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+def assert_same_ngrams(ngrams, expected):
+    assert ngrams.word_frequency_matrix.shape == expected.word_frequency_matrix.shape
+    assert abs(ngrams.word_frequency_matrix - expected.word_frequency_matrix).max() < 1e-12
+    assert ngrams.cv.vocabulary_ == expected.cv.vocabulary_
+    if hasattr(expected.cv, 'idf_'):
+        np.testing.assert_allclose(ngrams.cv.idf_, expected.cv.idf_)
+    assert ngrams.ngram_table.ngrams.tolist() == expected.ngram_table.ngrams.tolist()
+    np.testing.assert_allclose(ngrams.ngram_table.counts, expected.ngram_table.counts)
+    np.testing.assert_array_equal(ngrams.ngram_table.doc_freqs, expected.ngram_table.doc_freqs)
+
+
+def in_memory(data, **pipeline_args):
+    ngrams = NGrams(data)
+    ngrams.ngram_pipeline(**pipeline_args)
+    return ngrams
+
+
+@pytest.mark.parametrize('tfidf', [True, False])
+@pytest.mark.parametrize('max_features', [None, 40])
+def test_incremental_pipeline(text_data, tfidf, max_features):
+    ngrams = NGrams(text_data)
+    ngrams.ngram_pipeline(tfidf=tfidf, max_features=max_features, incremental=True)
+
+    assert_same_ngrams(ngrams, in_memory(text_data, tfidf=tfidf, max_features=max_features))
+
+
+@pytest.mark.parametrize('tfidf', [True, False])
+def test_partial_fit(text_data, tfidf):
+    ngrams = NGrams(text_data[:200])
+    ngrams.ngram_pipeline(tfidf=tfidf, max_features=40)
+    for start in range(200, len(text_data), 150):
+        ngrams.partial_fit(text_data[start:start + 150])
+        assert_same_ngrams(ngrams, in_memory(text_data[:start + 150], tfidf=tfidf, max_features=40))
+
+    assert ngrams.data.index.equals(text_data.index)
+
+
+def test_partial_fit_keeps_index(text_data):
+    text_data.index = ['mention %d' % i for i in range(len(text_data))]
+    ngrams = NGrams(text_data[:300])
+    ngrams.ngram_pipeline(max_features=40)
+    ngrams.partial_fit(text_data[300:])
+    ngrams.fortify_with_id(take_top_x=10)
+
+    assert ngrams.data.index.equals(text_data.index)
+    matrix = in_memory(text_data, max_features=40).word_frequency_matrix.tocsc()
+    for ngram_id, keys in zip(ngrams.ngrams_df['Index'][:10], ngrams.ngrams_df['Original Data Keys'][:10]):
+        expected = text_data.index[matrix[:, ngram_id].nonzero()[0]]
+        assert ngrams.data.index[keys].tolist() == sorted(expected.tolist(), key=text_data.index.get_loc)
+
+
+def test_partial_fit_rejects_repeated_index(text_data):
+    ngrams = NGrams(text_data[:300])
+    ngrams.ngram_pipeline(max_features=40)
+    expected = in_memory(text_data[:300], max_features=40)
+
+    with pytest.raises(ValueError):
+        ngrams.partial_fit(text_data[300:].reset_index(drop=True))
+
+    assert_same_ngrams(ngrams, expected)
+    assert len(ngrams.data) == 300
+    ngrams.partial_fit(text_data[300:])
+    assert_same_ngrams(ngrams, in_memory(text_data, max_features=40))
+
+
+def test_pos_partial_fit(pos_data):
+    ngrams = NGrams(pos_data[:150])
+    ngrams.ngram_pipeline(pos_tuples=True, max_features=None, incremental=True)
+    ngrams.partial_fit(pos_data[150:])
+
+    assert_same_ngrams(ngrams, in_memory(pos_data, pos_tuples=True, max_features=None))
+
+
+@pytest.mark.parametrize('two_pass', [True, False])
+@pytest.mark.parametrize('tfidf', [True, False])
+def test_from_chunks(text_data, two_pass, tfidf):
+    def chunks():
+        return (text_data[start:start + 128] for start in range(0, len(text_data), 128))
+
+    ngrams = NGrams.from_chunks(chunks if two_pass else chunks(), tfidf=tfidf, max_features=40,
+                                keep_columns=['Sentiment'])
+
+    assert_same_ngrams(ngrams, in_memory(text_data, tfidf=tfidf, max_features=40))
+    assert ngrams.data['Sentiment'].tolist() == text_data['Sentiment'].tolist()
+    assert ngrams.counter.keep_matrix is not two_pass
+
+
+def test_partial_fit_after_two_pass_from_chunks(text_data):
+    ngrams = NGrams.from_chunks(lambda: [text_data[:300], text_data[300:]])
+
+    with pytest.raises(ValueError):
+        ngrams.partial_fit(text_data[:10])
+
+
+def test_pos_from_chunks(pos_data):
+    def chunks():
+        return (pos_data[start:start + 100] for start in range(0, len(pos_data), 100))
+
+    ngrams = NGrams(pos_data[:150])
+    ngrams.ngram_pipeline(pos_tuples=True, max_features=None, incremental=True)
+    expected = in_memory(pos_data[:150], pos_tuples=True, max_features=None)
+    assert_same_ngrams(ngrams, expected)
+
+    expected = in_memory(pos_data, pos_tuples=True, max_features=None)
+    assert_same_ngrams(NGrams.from_chunks(chunks, pos_tuples=True, max_features=None), expected)
+    assert_same_ngrams(NGrams.from_chunks(chunks(), pos_tuples=True, max_features=None), expected)
+
+
+def test_pos_from_json_lines(pos_data):
+    lines = io.StringIO()
+    pos_data.to_json(lines, orient='records', lines=True)
+
+    def chunks():
+        return pd.read_json(io.StringIO(lines.getvalue()), lines=True, chunksize=100)
+
+    ngrams = NGrams.from_chunks(chunks, pos_tuples=True, max_features=None)
+
+    assert_same_ngrams(ngrams, in_memory(pos_data, pos_tuples=True, max_features=None))
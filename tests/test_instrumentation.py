@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""ProfilerSink must sum the stages that run several times and report them in the order they first ran"""
+
+import tracemalloc
+
+import pytest
+
+from pos_ngrams.instrumentation import ProfilerSink, StageRecord, get_instrumentation
+from pos_ngrams.n_grams import main
+from pos_ngrams.n_grams.main import NGrams
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+@pytest.fixture(autouse=True)
+def fixed_stopwords(monkeypatch, stopword_filter):
+    # NGrams looks its stopword filter up by language, which needs the nltk stopwords corpus
+    monkeypatch.setattr(main, 'get_stopword_filter', lambda language='english', adhoc_list=[]: stopword_filter)
+
+
+def make_record(stage, seconds, memory_delta=None, peak_memory=None, **metrics):
+    record = StageRecord(stage, **metrics)
+    record.seconds = seconds
+    record.memory_delta = memory_delta
+    record.peak_memory = peak_memory
+    return record
+
+
+def test_report():
+    profiler = ProfilerSink()
+    for record in [make_record('preprocess', 1.5, rows=100, tokens=900),
+                   make_record('count', .25, rows=100, vocabulary_size=40, memory_delta=2 ** 20, peak_memory=2 ** 21),
+                   make_record('preprocess', 1.5, rows=50, tokens=400),
+                   make_record('count', .75, rows=50, vocabulary_size=60, memory_delta=2 ** 20, peak_memory=2 ** 20),
+                   make_record('finalize', 1., rows=150, vocabulary_size=30, nnz=500)]:
+        profiler(record)
+
+    assert profiler.stages() == [
+        {'stage': 'preprocess', 'calls': 2, 'seconds': 3., 'rows': 150, 'tokens': 1300, 'vocabulary_size': None,
+         'nnz': None, 'memory_delta': None, 'peak_memory': None},
+        {'stage': 'count', 'calls': 2, 'seconds': 1., 'rows': 150, 'tokens': None, 'vocabulary_size': 60,
+         'nnz': None, 'memory_delta': 2 ** 21, 'peak_memory': 2 ** 21},
+        {'stage': 'finalize', 'calls': 1, 'seconds': 1., 'rows': 150, 'tokens': None, 'vocabulary_size': 30,
+         'nnz': 500, 'memory_delta': None, 'peak_memory': None}]
+
+    lines = profiler.report().split('\n')
+    assert lines[0].split() == ['stage', 'calls', 'seconds', '%', 'rows', 'tokens', 'vocabulary', 'nnz', 'memory',
+                                'MB', 'peak', 'MB']
+    assert lines[1].split() == ['preprocess', '2', '3.000', '60.0', '150', '1300', '-', '-', '-', '-']
+    assert lines[2].split() == ['count', '2', '1.000', '20.0', '150', '-', '60', '-', '2.0', '2.0']
+    assert lines[3].split() == ['finalize', '1', '1.000', '20.0', '150', '-', '30', '500', '-', '-']
+    assert lines[4].split() == ['total', '5.000']
+    assert len(lines) == 5
+
+    profiler.reset()
+    assert profiler.stages() == []
+    assert profiler.report().split('\n')[1].split() == ['total', '0.000']
+
+
+def test_pipeline_stages(text_data, capsys):
+    profiler = ProfilerSink(verbose=True)
+    ngrams = NGrams(text_data, sink=profiler)
+    ngrams.ngram_pipeline(preprocess_data=True, max_features=100)
+
+    stages = {stage['stage']: stage for stage in profiler.stages()}
+    assert list(stages) == ['preprocess', 'ngrams', 'token index']
+    assert stages['preprocess']['rows'] == stages['ngrams']['rows'] == len(text_data)
+    assert stages['preprocess']['tokens'] == sum(len(document.split()) for document in ngrams.data['Preprocessed'])
+    assert stages['ngrams']['vocabulary_size'] == len(ngrams.cv.vocabulary_)
+    assert stages['ngrams']['nnz'] == ngrams.word_frequency_matrix.nnz
+    assert all(stage['seconds'] >= 0 and stage['calls'] == 1 for stage in stages.values())
+
+    printed = capsys.readouterr().out.split('\n')
+    assert [line.split(':')[0] for line in printed if line] == list(stages)
+    assert [line[:20].strip() for line in profiler.report().split('\n')[1:]] == list(stages) + ['total']
+
+
+def test_chunk_stages_are_summed(text_data):
+    chunks = [text_data[:200], text_data[200:400], text_data[400:]]
+    profiler = ProfilerSink()
+    NGrams.from_chunks(chunks, preprocess_data=True, max_features=100, sink=[profiler])
+
+    stages = {stage['stage']: stage for stage in profiler.stages()}
+    assert stages['preprocess']['calls'] == 3
+    assert stages['preprocess']['rows'] == len(text_data)
+    assert stages['preprocess']['seconds'] == pytest.approx(sum(record.seconds for record in profiler.records
+                                                                if record.stage == 'preprocess'))
+
+
+def test_memory_only_while_tracing(text_data):
+    profiler = ProfilerSink()
+    NGrams(text_data, sink=profiler).ngram_pipeline(preprocess_data=True, max_features=100)
+    assert all(record.memory_delta is None and record.peak_memory is None for record in profiler.records)
+
+    profiler.reset()
+    tracemalloc.start()
+    try:
+        NGrams(text_data, sink=profiler).ngram_pipeline(preprocess_data=True, max_features=100)
+    finally:
+        tracemalloc.stop()
+    assert all(record.peak_memory >= 0 and record.memory_delta is not None for record in profiler.records)
+
+
+def test_no_sink_is_silent(text_data, capsys):
+    instrumentation = get_instrumentation(None)
+    assert not instrumentation.enabled
+    with instrumentation.stage('preprocess', rows=3) as record:
+        pass
+    assert record.seconds is None
+
+    NGrams(text_data).ngram_pipeline(preprocess_data=True, max_features=100)
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""The low memory NGrams mode keeps fewer and more compact columns, but must give the same ngrams_df,
+word_frequency_matrix and aggregates as the normal mode"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pos_ngrams.n_grams import main
+from pos_ngrams.n_grams.main import NGrams
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+@pytest.fixture(autouse=True)
+def fixed_stopwords(monkeypatch, stopword_filter):
+    # NGrams looks its stopword filter up by language, which needs the nltk stopwords corpus
+    monkeypatch.setattr(main, 'get_stopword_filter', lambda language='english', adhoc_list=[]: stopword_filter)
+
+
+def both_modes(data, keep_columns=None, **pipeline_args):
+    ngrams = NGrams(data)
+    ngrams.ngram_pipeline(preprocess_data=True, **pipeline_args)
+    lean = NGrams(data, low_memory=True, keep_columns=keep_columns)
+    lean.ngram_pipeline(preprocess_data=True, track_memory=True, **pipeline_args)
+    return ngrams, lean
+
+
+def assert_same_results(lean, ngrams):
+    pd.testing.assert_frame_equal(lean.ngrams_df, ngrams.ngrams_df)
+    assert lean.cv.vocabulary_ == ngrams.cv.vocabulary_
+    assert abs(lean.word_frequency_matrix - ngrams.word_frequency_matrix).max() == 0
+    assert lean.data['Preprocessed'].tolist() == ngrams.data['Preprocessed'].tolist()
+
+
+@pytest.mark.parametrize('tfidf', [True, False])
+def test_same_ngrams(text_data, tfidf):
+    ngrams, lean = both_modes(text_data, keep_columns=['Sentiment'], max_features=150, tfidf=tfidf)
+
+    assert_same_results(lean, ngrams)
+    assert lean.data.columns.tolist() == ['Sentiment', 'Preprocessed']
+    assert lean.data.index.equals(text_data.index)
+    pd.testing.assert_frame_equal(lean.aggregate_other_data_column('Sentiment'),
+                                  ngrams.aggregate_other_data_column('Sentiment'))
+
+    assert set(lean.memory_stats) == {'peak', 'retained', 'data', 'word_frequency_matrix', 'ngram_table', 'total'}
+    assert lean.memory_stats['peak'] >= lean.memory_stats['retained'] > 0
+    assert lean.memory_usage()['data'] < ngrams.memory_usage()['data']
+
+
+def test_same_pos_ngrams(pos_data):
+    ngrams, lean = both_modes(pos_data, min_gram=1, max_gram=3, pos_tuples=True, max_features=None, tfidf=False)
+
+    assert_same_results(lean, ngrams)
+    assert lean.data.columns.tolist() == ['Preprocessed']
+
+
+def test_same_after_partial_fit(text_data):
+    ngrams, lean = both_modes(text_data[:400], keep_columns=['Reach'], max_features=100)
+
+    ngrams.partial_fit(text_data[400:])
+    lean.partial_fit(text_data[400:])
+
+    assert_same_results(lean, ngrams)
+    assert lean.data.columns.tolist() == ['Reach', 'Preprocessed']
+    np.testing.assert_array_equal(lean.data['Reach'].values, text_data['Reach'].values)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+
+"""The ngram tables, indexes and aggregations of processes must match the plain pandas and scipy computations they
+replace"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+from pos_ngrams.n_grams.main import NGrams
+from pos_ngrams.n_grams.processes import AGGREGATE_STATS, NGramDocumentIndex, NGramTable, PosNGramVectorizer, \
+    aggregate_ngram_metadata, fortify_ngrams_with_ids, generate_ngrams, top_k_ids
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+@pytest.mark.parametrize('tfidf', [True, False])
+def test_ngram_table_matches_column_sums(text_data, tfidf):
+    table, word_frequency_matrix, cv = generate_ngrams(text_data, 1, 3, max_features=None, tfidf=tfidf)
+
+    expected = {word: (word_frequency_matrix.getcol(idx).sum(), word_frequency_matrix.getcol(idx).nnz)
+                for word, idx in cv.vocabulary_.items()}
+    assert len(table) == len(expected)
+    for ngram, count, doc_freq in zip(table.ngrams, table.counts, table.doc_freqs):
+        assert count == pytest.approx(expected[ngram][0])
+        assert doc_freq == expected[ngram][1]
+
+    ngrams_df = table.to_frame()
+    assert ngrams_df['Frequency'].is_monotonic_decreasing
+    assert ngrams_df['Ngram'].tolist() == table.ngrams[ngrams_df['Index'].values].tolist()
+
+
+def test_top_k_breaks_ties_by_id():
+    counts = np.array([3, 1, 3, 2, 3, 1, 0, 2])
+    expected = [0, 2, 4, 3, 7, 1, 5, 6]
+
+    assert top_k_ids(counts).tolist() == expected
+    for k in range(len(counts) + 2):
+        assert top_k_ids(counts, k).tolist() == expected[:k]
+    assert NGramTable(np.arange(8), counts, counts).to_frame(k=4)['Index'].tolist() == expected[:4]
+
+
+def test_fortify_matches_column_scan(text_data):
+    ngrams = NGrams(text_data)
+    ngrams.ngram_pipeline(max_features=200)
+    matrix = ngrams.word_frequency_matrix
+
+    fortified = fortify_ngrams_with_ids(ngrams.ngrams_df.copy(), matrix, take_top_x=50)
+
+    for j, (ngram, ngram_id) in enumerate(zip(fortified['Ngram'], fortified['Index'])):
+        keys = fortified['Original Data Keys'].iloc[j]
+        if j < 50:
+            expected = [i for i, e in enumerate(matrix.getcol(int(ngram_id)).toarray().ravel()) if e != 0]
+            assert keys.tolist() == expected
+            assert ngrams.documents_containing(ngram).tolist() == expected
+        else:
+            assert np.isnan(keys)
+
+
+def test_document_index_skips_explicit_zeros():
+    matrix = sparse.csr_matrix((np.array([1., 0., 2., 3.]), np.array([0, 1, 1, 0]), np.array([0, 2, 3, 4])),
+                               shape=(3, 2))
+
+    index = NGramDocumentIndex(matrix)
+
+    assert index.documents(0).tolist() == [0, 2]
+    assert index.documents(1).tolist() == [1]
+    assert index.document_counts().tolist() == [2, 1]
+
+
+def aggregation_data(seed=0):
+    """
+    A random document-ngram matrix with single document ngrams and one empty ngram, and metadata with missing values
+    and a column that is missing for every document of some ngrams
+    """
+
+    random_state = np.random.RandomState(seed)
+    dense = random_state.binomial(3, .2, size=(60, 20)).astype(float)
+    dense[:, 3] = 0
+    dense[:, 7] = 0
+    dense[11, 7] = 2
+    dense[:, 8] = 0
+    dense[[4, 9], 8] = 1
+    metadata = pd.DataFrame({'Sentiment': random_state.uniform(-1, 1, 60),
+                             'Reach': random_state.randint(0, 100, 60).astype(float)})
+    metadata.loc[random_state.rand(60) < .2, 'Sentiment'] = np.nan
+    metadata.loc[[4, 9], 'Reach'] = np.nan
+    return sparse.csr_matrix(dense), metadata
+
+
+def groupby_aggregates(matrix, metadata):
+    rows, ngram_ids = matrix.nonzero()
+    long = metadata.iloc[rows].reset_index(drop=True)
+    long['Index'] = ngram_ids.astype(np.int64)
+    aggregates = long.groupby('Index').agg(AGGREGATE_STATS)
+    aggregates.columns = [column + ' ' + stat.title() for column, stat in aggregates.columns]
+    return aggregates
+
+
+def test_aggregate_matches_groupby():
+    matrix, metadata = aggregation_data()
+
+    aggregates = aggregate_ngram_metadata(matrix, metadata)
+    expected = groupby_aggregates(matrix, metadata)
+
+    assert 3 not in expected.index
+    pd.testing.assert_frame_equal(aggregates.loc[expected.index, expected.columns], expected, check_dtype=False)
+    assert np.isnan(aggregates.loc[7, 'Sentiment Std'])
+    assert aggregates.loc[8, 'Reach Count'] == 0 and np.isnan(aggregates.loc[8, 'Reach Mean'])
+    assert aggregates.loc[3, 'Sentiment Count'] == 0 and aggregates.loc[3, 'Sentiment Sum'] == 0
+    assert aggregates.loc[3, ['Sentiment Mean', 'Sentiment Min', 'Sentiment Max', 'Sentiment Std']].isnull().all()
+
+
+def test_aggregate_subset_of_ngrams():
+    matrix, metadata = aggregation_data(seed=1)
+    ngram_ids = [12, 3, 0, 12]
+
+    aggregates = aggregate_ngram_metadata(matrix, metadata['Reach'], ngram_ids=ngram_ids, stats=['mean', 'max'])
+
+    assert aggregates.index.tolist() == ngram_ids
+    assert aggregates.columns.tolist() == ['Reach Mean', 'Reach Max']
+    pd.testing.assert_frame_equal(aggregates, aggregate_ngram_metadata(matrix, metadata[['Reach']],
+                                                                       stats=['mean', 'max']).loc[ngram_ids])
+
+
+def str_tuple_analyzer(min_n, max_n):
+    """
+    The analyzer the pos path used before the integer encoded engine, joining the repr of each (word, tag) tuple
+    """
+
+    def analyze(tokens):
+        tokens = [str(pair) for pair in tokens]
+        return [" ".join(tokens[i:i + n]) for n in range(min_n, min(max_n + 1, len(tokens) + 1))
+                for i in range(len(tokens) - n + 1)]
+    return analyze
+
+
+def ranked_counts(documents, ngram_range):
+    """
+    :return: The ngram names in CountVectorizer feature order ranked by frequency (a stable sort, so ties in name
+    order) and their counts
+    """
+
+    cv = CountVectorizer(analyzer=str_tuple_analyzer(*ngram_range))
+    counts = np.asarray(cv.fit_transform(documents).sum(axis=0)).ravel()
+    ranks = np.argsort(-counts, kind='stable')
+    return cv.get_feature_names_out()[ranks], counts[ranks]
+
+
+@pytest.mark.parametrize('ngram_range', [(1, 1), (1, 2), (2, 4), (3, 3)])
+@pytest.mark.parametrize('tfidf', [False, True])
+def test_pos_engine_matches_str_tuple_analyzer(pos_data, ngram_range, tfidf):
+    documents = pos_data['Snippet'].tolist()
+    names, counts = ranked_counts(documents, ngram_range)
+    # The largest max_features up to 50 that does not cut through a tie, where CountVectorizer's choice is defined
+    untied = max(k for k in range(1, 51) if counts[k - 1] > counts[k])
+
+    for max_features in [None, untied]:
+        vectorizer = (TfidfVectorizer if tfidf else CountVectorizer)(analyzer=str_tuple_analyzer(*ngram_range),
+                                                                     max_features=max_features)
+        expected = vectorizer.fit_transform(documents)
+        pos_vectorizer = PosNGramVectorizer(*ngram_range, max_features=max_features, tfidf=tfidf)
+        matrix = pos_vectorizer.fit_transform(documents)
+
+        assert pos_vectorizer.vocabulary_ == vectorizer.vocabulary_
+        assert matrix.shape == expected.shape
+        assert abs(matrix - expected).max() == pytest.approx(0, abs=1e-12)
+
+
+@pytest.mark.parametrize('ngram_range', [(1, 1), (2, 4)])
+def test_pos_max_features_ties_go_by_name(pos_data, ngram_range):
+    documents = pos_data['Snippet'].tolist()
+    names, counts = ranked_counts(documents, ngram_range)
+    max_features = next(k for k in range(2, len(counts)) if counts[k - 1] == counts[k] and counts[k - 2] > counts[k])
+
+    pos_vectorizer = PosNGramVectorizer(*ngram_range, max_features=max_features, tfidf=False)
+    matrix = pos_vectorizer.fit_transform(documents)
+
+    assert sorted(pos_vectorizer.vocabulary_) == sorted(names[:max_features])
+    assert set(names[counts > counts[max_features]]) <= set(pos_vectorizer.vocabulary_)
+    columns = sorted(pos_vectorizer.vocabulary_)
+    assert [pos_vectorizer.vocabulary_[name] for name in columns] == list(range(max_features))
+    assert np.asarray(matrix.sum(axis=0)).ravel().tolist() == \
+        [counts[names.tolist().index(name)] for name in columns]
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""NGrams.save and NGrams.load must round trip the ngram outputs, memory mapped or not"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pos_ngrams.n_grams.main import NGrams
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+def assert_same_outputs(loaded, ngrams):
+    assert loaded.word_frequency_matrix.shape == ngrams.word_frequency_matrix.shape
+    assert (loaded.word_frequency_matrix != ngrams.word_frequency_matrix).nnz == 0
+    assert loaded.cv.vocabulary_ == ngrams.cv.vocabulary_
+    if hasattr(ngrams.cv, 'idf_'):
+        np.testing.assert_array_equal(loaded.cv.idf_, ngrams.cv.idf_)
+    assert loaded.ngram_table.ngrams.tolist() == ngrams.ngram_table.ngrams.tolist()
+    np.testing.assert_array_equal(loaded.ngram_table.counts, ngrams.ngram_table.counts)
+    assert loaded.ngrams_df.drop(columns=['Original Data Keys'], errors='ignore')\
+        .equals(ngrams.ngrams_df.drop(columns=['Original Data Keys'], errors='ignore'))
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+@pytest.mark.parametrize('tfidf', [True, False])
+def test_round_trip(tmp_path, text_data, mmap, tfidf):
+    ngrams = NGrams(text_data)
+    ngrams.ngram_pipeline(tfidf=tfidf, max_features=50)
+    ngrams.fortify_with_id()
+    ngrams.save(str(tmp_path / 'ngrams'), data_columns=['Sentiment'])
+
+    loaded = NGrams.load(str(tmp_path / 'ngrams'), mmap=mmap)
+
+    assert_same_outputs(loaded, ngrams)
+    assert loaded.ids_enriched
+    for keys, expected in zip(loaded.ngrams_df['Original Data Keys'], ngrams.ngrams_df['Original Data Keys']):
+        np.testing.assert_array_equal(keys, expected)
+    assert loaded.data.equals(ngrams.data[['Sentiment']])
+
+    ngram = ngrams.ngrams_df['Ngram'].iloc[0]
+    np.testing.assert_array_equal(loaded.documents_containing(ngram), ngrams.documents_containing(ngram))
+    for ngrams_object in [ngrams, loaded]:
+        ngrams_object.search_on_word('cat', stemmed_ngrams=False, prefix=True)
+    assert loaded.filtered_ngrams_df['Index'].tolist() == ngrams.filtered_ngrams_df['Index'].tolist()
+
+
+def test_round_trip_pos(tmp_path, pos_data):
+    ngrams = NGrams(pos_data)
+    ngrams.ngram_pipeline(pos_tuples=True, tfidf=False, max_features=50)
+    ngrams.save(str(tmp_path / 'ngrams'))
+
+    loaded = NGrams.load(str(tmp_path / 'ngrams'))
+
+    assert_same_outputs(loaded, ngrams)
+    assert loaded.ngram_table.tokens == ngrams.ngram_table.tokens
+
+
+def test_string_index(tmp_path, text_data):
+    text_data.index = ['mention %d' % i for i in range(len(text_data))]
+    ngrams = NGrams(text_data)
+    ngrams.ngram_pipeline(max_features=50)
+    ngrams.save(str(tmp_path / 'ngrams'), data_columns=['Sentiment', 'Snippet'])
+
+    loaded = NGrams.load(str(tmp_path / 'ngrams'))
+
+    assert loaded.data.equals(ngrams.data[['Sentiment', 'Snippet']])
+
+
+def test_save_over_loaded(tmp_path, text_data):
+    path = str(tmp_path / 'ngrams')
+    ngrams = NGrams(text_data)
+    ngrams.ngram_pipeline(max_features=50)
+    ngrams.save(path)
+
+    loaded = NGrams.load(path, mmap=True)
+    loaded.save(path)
+
+    assert_same_outputs(loaded, ngrams)
+    assert_same_outputs(NGrams.load(path), ngrams)
+    assert os.listdir(str(tmp_path)) == ['ngrams']
+
+
+def test_failed_save_keeps_previous(tmp_path, text_data):
+    path = str(tmp_path / 'ngrams')
+    ngrams = NGrams(text_data)
+    ngrams.ngram_pipeline(max_features=50)
+    ngrams.save(path)
+
+    ngrams.data['Date'] = pd.Timestamp('2020-01-01')
+    with pytest.raises(ValueError):
+        ngrams.save(path, data_columns=['Date'])
+
+    assert_same_outputs(NGrams.load(path), ngrams)
+    assert os.listdir(str(tmp_path)) == ['ngrams']
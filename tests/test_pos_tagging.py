@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""The tagger registry loads each tagger once, and the batch tagging functions tag exactly as tag_snippet does"""
+
+import re
+
+import pandas as pd
+import pytest
+
+from pos_ngrams.caching import LRUCache
+from pos_ngrams.processing import pos_tagging
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+SNIPPETS = ["The cat sat on the mat. It was happy!",
+            "I'm loving the running, they jumped happily",
+            "42 dogs ate 3.5 bones at the party yesterday. Unseenword walking wanted goes?",
+            "",
+            "One"]
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    pos_tagging.clear_tagger_cache()
+    yield
+    pos_tagging.clear_tagger_cache()
+
+
+@pytest.fixture
+def split_sentences(monkeypatch):
+    # Sentences are split on end punctuation, so the tests do not need the nltk punkt data
+    monkeypatch.setattr(pos_tagging, 'tokenizer_sentence',
+                        lambda text: [sent for sent in re.split(r'(?<=[.!?])\s+', text) if sent])
+
+
+def test_load_tagger_is_cached():
+    tagger = pos_tagging.load_tagger('simplified_en')
+
+    assert pos_tagging.load_tagger('simplified_en') is tagger
+    assert pos_tagging.tagger_cache_info()['hits'] == 1
+    assert pos_tagging.tagger_cache_info()['misses'] == 1
+
+    pos_tagging.clear_tagger_cache()
+    assert pos_tagging.load_tagger('simplified_en') is not tagger
+
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2)
+    for key in ['a', 'b', 'a', 'c']:
+        cache.get_or_create(key, lambda: key.upper())
+
+    assert 'b' not in cache
+    assert cache.get('a') == 'A'
+    assert cache.info()['size'] == 2
+
+    cache.resize(1)
+    assert 'a' in cache and 'c' not in cache
+
+
+def test_tag_snippets_matches_tag_snippet(split_sentences):
+    expected = [pos_tagging.tag_snippet(snippet, 'simplified_en') for snippet in SNIPPETS]
+
+    assert pos_tagging.tag_snippets(SNIPPETS, 'simplified_en') == expected
+    assert pos_tagging.tag_df(pd.DataFrame({'Snippet': SNIPPETS}))['POS Tuples'].tolist() == expected
+
+    nltk_tagger = pos_tagging.load_pickled_tagger('simplified_en')
+    assert expected == [[pair for tokens in pos_tagging.tokenize_snippet(snippet) for pair in nltk_tagger.tag(tokens)]
+                        for snippet in SNIPPETS]
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+"""Tagger training must learn the same context tables as nltk, and reuse a cached corpus only while the corpus files
+and the tagset rules are unchanged"""
+
+import os
+import random
+
+import nltk
+import numpy as np
+import pytest
+from nltk.corpus.reader import TaggedCorpusReader
+
+from pos_ngrams import pos_train, tagsets
+from pos_ngrams.pos_train import EncodedCorpus, load_encoded_corpus, train_context_models
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+# Each word has a tag after a determiner and another elsewhere, so the bigram tables are not empty
+BROWN_WORDS = {'the': ('AT', 'AT'), 'dog': ('NN', 'VB'), 'runs': ('VBZ', 'NNS'), 'fast': ('RB', 'JJ'),
+               'walking': ('NN', 'VBG'), 'he': ('PPS', 'PPS'), 'saw': ('VBD', 'NN'), '42': ('CD', 'CD'),
+               'a': ('AT', 'AT'), 'park': ('NN', 'VB'), '.': ('.', '.'), 'fish': ('NNS', 'VB')}
+
+
+def make_brown_sents(n_sents, seed=0):
+    random_state = random.Random(seed)
+    words = sorted(BROWN_WORDS)
+    sents = []
+    for i in range(n_sents):
+        sent = []
+        previous = None
+        for j in range(random_state.randint(1, 10)):
+            word = random_state.choice(words)
+            tag = BROWN_WORDS[word][0 if previous == 'AT' else 1]
+            # Some noise, so contexts have competing tags
+            if random_state.random() < .1:
+                tag = random_state.choice(['NN', 'VB', 'JJ'])
+            sent.append((word, tag))
+            previous = tag
+        sents.append(sent)
+    return sents
+
+
+@pytest.mark.parametrize('n_jobs', [1, 3])
+@pytest.mark.parametrize('regex', [True, False])
+def test_context_models_match_nltk(n_jobs, regex):
+    encoded = EncodedCorpus.from_tagged_sents(make_brown_sents(400))
+    train_mask = np.random.RandomState(0).rand(encoded.n_sentences) < .8
+    backoff = nltk.RegexpTagger([(r'.*ing$', 'VBG'), (r'.*s$', 'NNS')]) if regex else nltk.DefaultTagger('NN')
+
+    unigram_model, bigram_model = train_context_models(encoded, train_mask, backoff, n_jobs=n_jobs)
+
+    train = encoded.tagged_sents(train_mask)
+    unigram_tagger = nltk.UnigramTagger(train, backoff=backoff)
+    bigram_tagger = nltk.BigramTagger(train, backoff=unigram_tagger)
+    assert unigram_model == unigram_tagger._context_to_tag
+    assert bigram_model == bigram_tagger._context_to_tag
+    assert bigram_model
+
+
+def write_corpus(directory, sents, n_files=3):
+    fileids = []
+    for i in range(n_files):
+        fileid = 'part%d.pos' % i
+        with open(os.path.join(str(directory), fileid), 'w') as corpus_file:
+            for sent in sents[i::n_files]:
+                corpus_file.write(' '.join(word + '/' + tag for word, tag in sent) + '\n')
+        fileids.append(fileid)
+    return TaggedCorpusReader(str(directory), fileids)
+
+
+def assert_same_corpus(encoded, expected):
+    assert encoded.tagged_sents() == expected.tagged_sents()
+
+
+@pytest.fixture
+def brown_rules():
+    yield
+    tagsets.register_tagset('brown', tagsets.BROWN_RULES)
+
+
+def test_cache_follows_corpus_files_and_rules(tmp_path, monkeypatch, brown_rules):
+    # nltk only opens corpora under its data path
+    monkeypatch.setattr(nltk.data, 'path', nltk.data.path + [str(tmp_path)])
+    (tmp_path / 'corpus').mkdir()
+    cache_dir = str(tmp_path / 'cache')
+    reader = write_corpus(tmp_path / 'corpus', make_brown_sents(60))
+    expected = load_encoded_corpus(reader, cache=False)
+
+    assert_same_corpus(load_encoded_corpus(reader, cache=cache_dir), expected)
+    cached = os.listdir(cache_dir)
+    assert len(cached) == 1
+    assert_same_corpus(EncodedCorpus.load(os.path.join(cache_dir, cached[0])), expected)
+    assert_same_corpus(load_encoded_corpus(reader, cache=cache_dir), expected)
+    assert os.listdir(cache_dir) == cached
+
+    # Editing a corpus file changes its key, so the corpus is read again
+    with open(os.path.join(str(tmp_path / 'corpus'), 'part1.pos'), 'a') as corpus_file:
+        corpus_file.write('the/AT dog/NN\n')
+    changed = load_encoded_corpus(reader, cache=cache_dir)
+    assert changed.n_sentences == expected.n_sentences + 1
+    assert len(os.listdir(cache_dir)) == 2
+
+    # So do new simplification rules
+    tagsets.register_tagset('brown', [('XX', ['NN'])] + tagsets.BROWN_RULES)
+    simplified = load_encoded_corpus(reader, cache=cache_dir)
+    assert 'XX' in simplified.tags and 'NN' not in simplified.tags
+    assert len(os.listdir(cache_dir)) == 3
+
+
+def test_list_corpus_needs_a_key(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    sents = make_brown_sents(40)
+
+    load_encoded_corpus(sents)
+    assert not os.path.exists(pos_train.corpus_cache_dir())
+
+    expected = load_encoded_corpus(sents, cache=False)
+    assert_same_corpus(load_encoded_corpus(sents, corpus_key='toy'), expected)
+    assert pos_train.corpus_cache_dir().startswith(str(tmp_path))
+    assert len(os.listdir(pos_train.corpus_cache_dir())) == 1
+    # The cached copy is served for the key, whatever the list holds
+    assert_same_corpus(load_encoded_corpus(sents[:10], corpus_key='toy'), expected)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+"""preprocess_df must give the same columns whichever way the documents are processed"""
+
+import pandas as pd
+import pytest
+
+from pos_ngrams.preprocessing.cleaning import clean_text
+from pos_ngrams.preprocessing.pipeline import TEXT_COLUMNS, PreprocessingPipeline
+from pos_ngrams.preprocessing.preprocess import preprocess_df
+from pos_ngrams.preprocessing.social_feature_extraction import extract_hashtags, extract_mentioned_users, \
+    extract_urls
+from pos_ngrams.preprocessing.stemming import stem_text
+from pos_ngrams.preprocessing.tokenizer import PosTokenStream
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+def assert_same_frame(frame, expected):
+    assert frame.columns.tolist() == expected.columns.tolist()
+    assert frame.index.equals(expected.index)
+    for column in expected.columns:
+        assert frame[column].tolist() == expected[column].tolist(), column
+
+
+def step_by_step(document, stopword_filter, remove_hashtag_words=False, remove_mentioned_authors=True,
+                 remove_urls=True, stopped_not_stemmed=False):
+    """
+    The columns of a text document built one function at a time, as preprocess_df did before the fused pipeline
+    """
+
+    text = document
+    if remove_hashtag_words:
+        text = extract_hashtags(text, remove_hashtags=True)[0]
+    if remove_mentioned_authors:
+        text = extract_mentioned_users(text, remove_users=True)[0]
+    if remove_urls:
+        text = extract_urls(text, remove_urls=True)[0]
+    cleaned = clean_text(text_string=text)
+    stemmed = stem_text(text_string=cleaned) if cleaned else cleaned
+
+    return {'Cleaned': cleaned,
+            'Hashtags': extract_hashtags(document)[1],
+            'At Mentions': extract_mentioned_users(document, remove_users=False)[1],
+            'URLs': extract_urls(document, remove_urls=False)[1],
+            'Stemmed': stemmed,
+            'Preprocessed': stopword_filter(text_string=cleaned if stopped_not_stemmed else stemmed)}
+
+
+@pytest.mark.parametrize('options', [{},
+                                     {'remove_hashtag_words': True},
+                                     {'remove_mentioned_authors': False, 'remove_urls': False},
+                                     {'stopped_not_stemmed': True}])
+def test_pipeline_matches_step_functions(text_data, stopword_filter, options):
+    pipeline = PreprocessingPipeline(stopword_filter=stopword_filter, columns=TEXT_COLUMNS, **options)
+
+    for document in text_data['Snippet']:
+        assert pipeline.process(document) == step_by_step(document, stopword_filter, **options)
+
+
+@pytest.mark.parametrize('stopped_not_stemmed', [False, True])
+def test_pos_pipeline_matches_step_functions(pos_data, stopword_filter, stopped_not_stemmed):
+    pipeline = PreprocessingPipeline(stopword_filter=stopword_filter, pos_tuples=True,
+                                     stopped_not_stemmed=stopped_not_stemmed)
+
+    for document in pos_data['Snippet']:
+        cleaned = clean_text(tokens=document, pos_tuples=True)
+        stemmed = stem_text(tokens=cleaned, pos_tuples=True)
+        expected = {'Cleaned': cleaned, 'Stemmed': stemmed,
+                    'Preprocessed': stopword_filter(tokens=stemmed, pos_tuples=True)}
+        if stopped_not_stemmed:
+            expected['Stopped'] = stopword_filter(tokens=cleaned, pos_tuples=True)
+        assert pipeline.process(document) == expected
+
+
+def test_pos_keeps_cleaned_and_stemmed_words(stopword_filter):
+    # Words changed by cleaning, repeated words and stemmed words all keep their tags
+    document = [('GREAT,', 'OT'), ('Dogs', 'NN'), ('running', 'VB'), ('!!', '.'), ('GREAT,', 'OT'), ('the', 'AT')]
+    cleaned = [('great', 'OT'), ('dogs', 'NN'), ('running', 'VB'), ('great', 'OT'), ('the', 'AT')]
+    stemmed = [('great', 'OT'), ('dog', 'NN'), ('run', 'VB'), ('great', 'OT'), ('the', 'AT')]
+
+    assert clean_text(tokens=document, pos_tuples=True) == cleaned
+    assert stem_text(tokens=cleaned, pos_tuples=True) == stemmed
+
+    stream = PosTokenStream.from_tuples(document)
+    assert clean_text(tokens=stream, pos_tuples=True) is stream
+    assert stream.to_tuples() == cleaned and len(stream) == len(cleaned)
+
+    pipeline = PreprocessingPipeline(stopword_filter=stopword_filter, pos_tuples=True, stopped_not_stemmed=True)
+    assert pipeline.process(document) == {'Cleaned': cleaned, 'Stopped': cleaned[:-1], 'Stemmed': stemmed,
+                                          'Preprocessed': stemmed[:-1]}
+
+
+URL_SNIPPETS = ['look at http://x.co/a cats running', 'see www.foo.com and https://y.org/b?c=1 now', 'no links here']
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_remove_urls(stopword_filter, n_jobs):
+    data = pd.DataFrame({'Snippet': URL_SNIPPETS})
+
+    removed = preprocess_df(data.copy(), stopword_filter=stopword_filter, columns=TEXT_COLUMNS, n_jobs=n_jobs)
+    assert removed['Cleaned'].tolist() == ['look at cats running', 'see and now', 'no links here']
+    assert removed['Stemmed'].tolist() == ['look at cat run', 'see and now', 'no link here']
+    assert removed['URLs'].tolist() == [['http://x.co/a'], ['www.foo.com', 'https://y.org/b?c=1'], []]
+
+    kept = preprocess_df(data.copy(), stopword_filter=stopword_filter, remove_urls=False, n_jobs=n_jobs)
+    assert kept['Cleaned'].tolist() == ['look at http xco a cats running', 'see wwwfoocom and https yorg bc1 now',
+                                        'no links here']
+    assert 'URLs' not in kept.columns
+
+
+@pytest.mark.parametrize('pos_tuples', [False, True])
+def test_parallel_matches_serial(text_data, pos_data, stopword_filter, pos_tuples):
+    data = (pos_data if pos_tuples else text_data)[:250]
+    data.index = ['mention %d' % i for i in range(len(data) - 1, -1, -1)]
+
+    serial = preprocess_df(data.copy(), pos_tuples=pos_tuples, stopword_filter=stopword_filter)
+    parallel = preprocess_df(data.copy(), pos_tuples=pos_tuples, stopword_filter=stopword_filter, n_jobs=2,
+                             chunksize=37)
+
+    assert_same_frame(parallel, serial)
+    assert parallel.index.tolist() == data.index.tolist()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+"""preprocess_df with a PreprocessCache must give the same output as without, whether the documents are cached or
+not"""
+
+import pandas as pd
+import pytest
+
+from pos_ngrams.preprocessing.preprocess import preprocess_df
+from pos_ngrams.preprocessing.preprocess_cache import PreprocessCache
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+def assert_same_frame(frame, expected):
+    assert frame.columns.tolist() == expected.columns.tolist()
+    assert frame.index.equals(expected.index)
+    for column in expected.columns:
+        assert frame[column].tolist() == expected[column].tolist(), column
+
+
+@pytest.mark.parametrize('pos_tuples', [False, True])
+def test_matches_uncached(tmp_path, text_data, pos_data, stopword_filter, pos_tuples):
+    data = pos_data if pos_tuples else text_data
+    expected = preprocess_df(data.copy(), pos_tuples=pos_tuples, stopword_filter=stopword_filter)
+
+    with PreprocessCache(str(tmp_path / 'cache.sqlite')) as cache:
+        first = preprocess_df(data.copy(), pos_tuples=pos_tuples, stopword_filter=stopword_filter, cache=cache)
+        assert cache.hits == 0
+        second = preprocess_df(data.copy(), pos_tuples=pos_tuples, stopword_filter=stopword_filter, cache=cache)
+        assert cache.misses == len(data)
+        assert cache.hits == len(data)
+
+    assert_same_frame(first, expected)
+    assert_same_frame(second, expected)
+
+
+def test_partly_cached(tmp_path, text_data, stopword_filter):
+    path = str(tmp_path / 'cache.sqlite')
+    preprocess_df(text_data[:200].copy(), stopword_filter=stopword_filter, cache=path)
+
+    cached = preprocess_df(text_data.copy(), stopword_filter=stopword_filter, cache=path, columns=['Preprocessed'])
+
+    assert_same_frame(cached, preprocess_df(text_data.copy(), stopword_filter=stopword_filter,
+                                            columns=['Preprocessed']))
+
+
+def test_configurations_are_separate(tmp_path, text_data, stopword_filter):
+    path = str(tmp_path / 'cache.sqlite')
+    options = [{'remove_urls': False},
+               {'remove_hashtag_words': True},
+               {'language': 'spanish'},
+               {'columns': ['Cleaned', 'URLs', 'Preprocessed']}]
+
+    for option in [{}] + options:
+        cached = preprocess_df(text_data.copy(), stopword_filter=stopword_filter, cache=path, **option)
+        assert_same_frame(cached, preprocess_df(text_data.copy(), stopword_filter=stopword_filter, **option))
+
+
+def test_duplicates_and_low_memory(tmp_path, text_data, stopword_filter):
+    data = pd.concat([text_data, text_data[:100]], ignore_index=True)
+    expected = preprocess_df(data.copy(), stopword_filter=stopword_filter, low_memory=True)
+
+    with PreprocessCache(str(tmp_path / 'cache.sqlite')) as cache:
+        cached = preprocess_df(data.copy(), stopword_filter=stopword_filter, low_memory=True, cache=cache)
+        assert cache.info()['size'] == text_data['Snippet'].nunique()
+
+    for column in expected.columns:
+        assert cached[column].astype(object).tolist() == expected[column].astype(object).tolist(), column
+
+
+def test_eviction(tmp_path, text_data, stopword_filter):
+    with PreprocessCache(str(tmp_path / 'cache.sqlite'), max_bytes=4096) as cache:
+        cached = preprocess_df(text_data.copy(), stopword_filter=stopword_filter, cache=cache)
+        assert cache.info()['bytes'] <= 4096
+
+    assert_same_frame(cached, preprocess_df(text_data.copy(), stopword_filter=stopword_filter))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+"""search_on_word must match whole tokens of the ngrams, so art finds "the art" but not "party" """
+
+import ast
+
+import pandas as pd
+import pytest
+
+from pos_ngrams.n_grams.main import NGrams
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+SNIPPETS = ['the art show', 'a party at the art party', 'smart art', 'party on', 'apartment party art', 'start']
+
+
+@pytest.fixture
+def ngrams():
+    ngrams = NGrams(pd.DataFrame({'Snippet': SNIPPETS}))
+    ngrams.ngram_pipeline(min_gram=1, max_gram=2, tfidf=False, max_features=None)
+    return ngrams
+
+
+def found(ngrams):
+    return sorted(ngrams.filtered_ngrams_df['Ngram'].tolist())
+
+
+def test_whole_tokens(ngrams):
+    ngrams.search_on_word('art', stemmed_ngrams=False)
+
+    assert found(ngrams) == ['art', 'art party', 'art show', 'party art', 'smart art', 'the art']
+    assert found(ngrams) == sorted(ngram for ngram in ngrams.ngrams_df['Ngram'] if 'art' in ngram.split())
+    assert 'party' not in found(ngrams) and 'smart' not in found(ngrams) and 'start' not in found(ngrams)
+
+
+def test_several_words_and_no_match(ngrams):
+    ngrams.search_on_word('party art', stemmed_ngrams=False)
+    assert found(ngrams) == ['art party', 'party art']
+
+    ngrams.search_on_word(['show', 'on'], stemmed_ngrams=False, operator='or')
+    assert found(ngrams) == ['art show', 'on', 'party on', 'show']
+
+    ngrams.search_on_word('par', stemmed_ngrams=False)
+    assert found(ngrams) == []
+    assert ngrams.filtered_ngrams_df.columns.tolist() == ngrams.ngrams_df.columns.tolist()
+
+    ngrams.search_on_word('par', stemmed_ngrams=False, prefix=True)
+    assert found(ngrams) == sorted(ngram for ngram in ngrams.ngrams_df['Ngram']
+                                   if any(token.startswith('par') for token in ngram.split()))
+
+
+def test_pos_tokens():
+    data = pd.DataFrame({'Snippet': [[(word, 'NN') for word in snippet.split()] for snippet in SNIPPETS]})
+    ngrams = NGrams(data)
+    ngrams.ngram_pipeline(min_gram=1, max_gram=2, pos_tuples=True, tfidf=False, max_features=None)
+
+    ngrams.search_on_word('art', stemmed_ngrams=False)
+
+    words = [[word for word, tag in ast.literal_eval('[' + ngram.replace(') (', '), (') + ']')]
+             for ngram in ngrams.ngrams_df['Ngram']]
+    expected = sorted(ngram for ngram, ngram_words in zip(ngrams.ngrams_df['Ngram'], words) if 'art' in ngram_words)
+    assert found(ngrams) == expected
+    assert len(expected) == 6
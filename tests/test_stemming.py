@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+"""The shared stemmers and the token stem cache must stem exactly as a fresh snowball stemmer does"""
+
+import pytest
+from nltk.stem import SnowballStemmer
+
+from pos_ngrams.preprocessing import stemming
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+TOKENS = ['running', 'runs', 'ran', 'happily', 'parties', 'party', 'cats', 'café', '42', '', 'running']
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    stemming.clear_stem_cache()
+    yield
+    stemming.set_stem_cache_size(200000)
+    stemming.clear_stem_cache()
+
+
+def test_stemmer_is_shared():
+    assert stemming.get_stemmer('english') is stemming.get_stemmer('english')
+    assert stemming.get_stemmer('english') is not stemming.get_stemmer('spanish')
+
+
+@pytest.mark.parametrize('maxsize', [None, 3, 0])
+def test_cache_matches_stemmer(maxsize):
+    stemming.set_stem_cache_size(maxsize)
+    stemmer = SnowballStemmer('english')
+
+    for i in range(2):
+        assert stemming.stem_tokens(TOKENS) == [stemmer.stem(token) for token in TOKENS]
+
+    info = stemming.stem_cache_info()
+    assert info['size'] == (len(set(TOKENS)) if maxsize is None else maxsize)
+    if maxsize is None:
+        assert info['hits'] == len(TOKENS) + 1
+    assert stemming.stem_text(text_string='running parties') == 'run parti'
+
+
+def test_invalid_language():
+    with pytest.raises(ValueError):
+        stemming.get_stemmer('klingon')
+    with pytest.raises(NameError):
+        stemming.stem_text(text_string='running', language='klingon')
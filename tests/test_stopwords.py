@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+"""The precompiled stopword filters must remove the same words as the set built by create_stopwords_set, and each
+configuration is only compiled once"""
+
+import pandas as pd
+import pytest
+
+from pos_ngrams.preprocessing.tokenizer import PosTokenStream
+from pos_ngrams.processing import stopwords
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+LANGUAGE_WORDS = {'english': ['the', 'on', 'a'], 'spanish': ['el', 'la']}
+
+
+@pytest.fixture
+def language_words(monkeypatch):
+    # The language lists stand in for the nltk stopwords corpus, so the tests do not need it to be installed
+    def create_stopwords_set(basic_language, adhoc_list=[], ignore_nltk=False):
+        return set(LANGUAGE_WORDS[basic_language]) | set(adhoc_list)
+
+    monkeypatch.setattr(stopwords, 'create_stopwords_set', create_stopwords_set)
+    monkeypatch.setattr(stopwords, '_STOPWORD_FILTERS', {})
+
+
+def test_filter_is_compiled_once(language_words):
+    stopword_filter = stopwords.get_stopword_filter('english', adhoc_list=['cat', 'mat', 'cat'])
+
+    assert stopwords.get_stopword_filter('english', adhoc_list=['mat', 'cat']) is stopword_filter
+    assert stopwords.get_stopword_filter('english') is not stopword_filter
+    assert stopwords.get_stopword_filter('spanish', adhoc_list=['cat', 'mat']) is not stopword_filter
+    assert stopword_filter.stopwords_set == {'the', 'on', 'a', 'cat', 'mat'}
+
+
+def test_removal(language_words):
+    text = 'the cat sat on the mat a fine mat'
+    pos_tuples = [(word, 'NN') for word in text.split()]
+    expected = ['sat', 'fine']
+
+    assert stopwords.stopword_removal(text_string=text, adhoc_list=['cat', 'mat']) == " ".join(expected)
+    assert stopwords.stopword_removal(tokens=text.split(), adhoc_list=['cat', 'mat']) == expected
+    assert stopwords.stopword_removal(tokens=pos_tuples, pos_tuples=True, adhoc_list=['cat', 'mat']) == \
+        [(word, 'NN') for word in expected]
+
+    stream = PosTokenStream.from_tuples(pos_tuples)
+    assert stopwords.stopword_removal(tokens=stream, adhoc_list=['cat', 'mat']).to_tuples() == \
+        [(word, 'NN') for word in expected]
+
+
+def test_from_words_and_series():
+    stopword_filter = stopwords.StopwordFilter.from_words(['the', 'on'])
+    series = pd.Series(['the cat', 'on the mat', ''], index=[5, 3, 9], name='Cleaned')
+
+    filtered = stopword_filter.filter_series(series)
+
+    assert filtered.tolist() == ['cat', 'mat', '']
+    assert filtered.index.tolist() == [5, 3, 9]
+    assert filtered.name == 'Cleaned'
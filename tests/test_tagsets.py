@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+"""The compiled tagset rules must simplify every tag exactly as the if/elif functions they replace"""
+
+import itertools
+import string
+
+import pytest
+from nltk.tag.mapping import _UNIVERSAL_TAGS
+
+from pos_ngrams import tagsets
+from pos_ngrams.pos_train import EncodedCorpus
+from pos_ngrams.tagsets import TagsetMapper, get_tagset_mapper, register_tagset
+
+__author__ = "Peter J Usherwood"
+__python_version__ = "3.6"
+
+
+def old_simplify_brown_tags(tag):
+    NP = ['NP']  # proper noun
+    NN = ['NR', 'NN']  # noun
+    VB = ['VB', 'DO', 'EX', 'HV', 'BE', 'DI', 'HV']  # verb
+    NU = ['CD', 'OD']  # numbers
+    AD = ['JJ']  # adjective
+    QL = ['QL', 'DT', 'WQ']  # qualifier
+    AV = ['RB', 'RN', 'RP']  # adverb
+    NG = ['*:']  # negator
+    PN = ['PN', 'PP', 'PR', 'WP']  # pronoun
+
+    tag = tag[:2]
+
+    if tag in NP:
+        tag = 'NP'
+    elif tag in list(string.punctuation):
+        tag = tag
+    elif tag in NN:
+        tag = 'NN'
+    elif tag in VB:
+        tag = 'VB'
+    elif tag in NU:
+        tag = 'NU'
+    elif tag in AD:
+        tag = 'AD'
+    elif tag in QL:
+        tag = 'QL'
+    elif tag in AV:
+        tag = 'AV'
+    elif tag in NG:
+        tag = '*:'
+    elif tag in PN:
+        tag = 'PN'
+    else:
+        tag = 'OT'
+
+    return tag
+
+
+def old_simplify_parole_tags(tag):
+    NP = ['NP']  # proper noun
+    NN = ['NC']  # noun
+    VB = ['VS', 'VM', 'VA']  # verb
+    NU = ['Z', 'Zm', 'Zp']  # numbers
+    AD = ['AO', 'AQ']  # adjective
+    QL = []  # qualifier
+    AV = ['RG', 'RN']  # adverb
+    NG = []  # negator
+
+    tag = tag[:2]
+
+    if tag in NP:
+        tag = 'NP'
+    elif tag in list(string.punctuation):
+        tag = tag
+    elif tag in NN:
+        tag = 'NN'
+    elif tag in VB:
+        tag = 'VB'
+    elif tag in NU:
+        tag = 'NU'
+    elif tag in AD:
+        tag = 'AD'
+    elif tag in QL:
+        tag = 'QL'
+    elif tag in AV:
+        tag = 'AV'
+    elif tag in NG:
+        tag = '*:'
+    else:
+        tag = 'OT'
+
+    return tag
+
+
+def old_simplify_tags_es(tag):
+    NP = ['NP']  # proper noun
+    NN = ['NC', 'W', 'NP']  # noun
+    VB = ['VA', 'VM', 'VS']  # verb
+    NU = ['Z', 'Zd', 'Zm', 'Zp']  # numbers
+    AD = ['JJ']  # adjective
+    QL = ['DA', 'DD', 'DI', 'DT', 'PD', 'PI']  # qualifier
+    AV = ['RG', 'RN']  # adverb
+    PN = ['DP', 'PX', 'P0', 'PP', 'PR', 'PT']  # pronoun
+    PU = ['Fa', 'Fc', 'Fd', 'Fe', 'Fg', 'Fh', 'Fi', 'Fp', 'Fr', 'Fr', 'Fp', 'Fr', 'Fs', 'Fx', 'Fz']
+
+    tag = tag[:2]
+
+    if tag in NP:
+        tag = 'NP'
+    elif tag in PU:
+        tag = '.'
+    elif tag in NN:
+        tag = 'NN'
+    elif tag in VB:
+        tag = 'VB'
+    elif tag in NU:
+        tag = 'NU'
+    elif tag in AD:
+        tag = 'AD'
+    elif tag in QL:
+        tag = 'QL'
+    elif tag in AV:
+        tag = 'AV'
+    elif tag in PN:
+        tag = 'PN'
+    else:
+        tag = 'OT'
+
+    return tag
+
+
+OLD_FUNCTIONS = {'brown': old_simplify_brown_tags, 'parole': old_simplify_parole_tags, 'es': old_simplify_tags_es}
+
+# The tags of the Brown corpus, the nltk data is not needed to list them
+BROWN_BASE_TAGS = ['(', ')', '*', ',', '--', '.', ':', "'", "''", '``', 'ABL', 'ABN', 'ABX', 'AP', 'AP$', 'AT', 'BE',
+                   'BED', 'BEDZ', 'BEG', 'BEM', 'BEN', 'BER', 'BEZ', 'CC', 'CD', 'CD$', 'CS', 'DO', 'DOD', 'DOZ', 'DT',
+                   'DT$', 'DTI', 'DTS', 'DTX', 'EX', 'FW', 'HV', 'HVD', 'HVG', 'HVN', 'HVZ', 'IN', 'JJ', 'JJ$', 'JJR',
+                   'JJS', 'JJT', 'MD', 'NIL', 'NN', 'NN$', 'NNS', 'NNS$', 'NP', 'NP$', 'NPS', 'NPS$', 'NR', 'NR$',
+                   'NRS', 'OD', 'PN', 'PN$', 'PP$', 'PP$$', 'PPL', 'PPLS', 'PPO', 'PPS', 'PPSS', 'QL', 'QLP', 'RB',
+                   'RB$', 'RBR', 'RBT', 'RN', 'RP', 'TO', 'UH', 'VB', 'VBD', 'VBG', 'VBN', 'VBZ', 'WDT', 'WP$', 'WPO',
+                   'WPS', 'WQL', 'WRB']
+# Headline, title and cited forms, negations, contractions and foreign words
+BROWN_TAGS = sorted(set(BROWN_BASE_TAGS +
+                        [tag + suffix for tag in BROWN_BASE_TAGS for suffix in ['-HL', '-TL', '-NC', '*']] +
+                        ['FW-' + tag for tag in BROWN_BASE_TAGS] +
+                        ['PPS+BEZ', 'PPSS+MD', 'MD*', 'DO*', 'BEZ*', 'WDT+BEZ', 'NN+BEZ', 'PPSS+HV', '*-HL', 'NIL',
+                         '*:', '*:X']))
+# Every string of up to two printable characters, the rules only look at the first two characters of a tag
+SHORT_TAGS = [''] + [''.join(chars) for n in [1, 2] for chars in itertools.product(string.printable[:-5], repeat=n)]
+
+
+@pytest.mark.parametrize('tag', BROWN_TAGS + list(_UNIVERSAL_TAGS))
+@pytest.mark.parametrize('tagset', ['brown', 'parole', 'es'])
+def test_named_tags_match_old_functions(tagset, tag):
+    assert get_tagset_mapper(tagset)(tag) == OLD_FUNCTIONS[tagset](tag)
+
+
+@pytest.mark.parametrize('tagset', ['brown', 'parole', 'es'])
+def test_every_prefix_matches_old_functions(tagset):
+    expected = [OLD_FUNCTIONS[tagset](tag) for tag in SHORT_TAGS]
+
+    mapper = get_tagset_mapper(tagset)
+    assert mapper.map_tags(SHORT_TAGS) == expected
+    assert mapper.map_tags([tag + 'X-TL' for tag in SHORT_TAGS if len(tag) == 2]) == \
+        [OLD_FUNCTIONS[tagset](tag + 'X-TL') for tag in SHORT_TAGS if len(tag) == 2]
+
+
+@pytest.mark.parametrize('tagset', ['brown', 'es'])
+def test_map_encoded_matches_old_functions(tagset):
+    sents = [[(str(i), tag) for i, tag in enumerate(BROWN_TAGS[start:start + 7])]
+             for start in range(0, len(BROWN_TAGS), 7)]
+
+    simplified = get_tagset_mapper(tagset).map_encoded(EncodedCorpus.from_tagged_sents(sents))
+
+    assert simplified.tagged_sents() == [[(word, OLD_FUNCTIONS[tagset](tag)) for word, tag in sent] for sent in sents]
+
+
+def test_register_tagset(monkeypatch):
+    monkeypatch.setattr(tagsets, '_TAGSETS', dict(tagsets._TAGSETS))
+    mapper = register_tagset('test_upos', [('N', ['NOUN', 'PROP']), ('V', ['VERB', 'AUX'])], default='X',
+                             prefix_length=4)
+
+    assert get_tagset_mapper('test_upos') is mapper
+    assert mapper.map_tags(['NOUN', 'PROPN', 'AUX', 'ADJ', 'VERBS']) == ['N', 'N', 'V', 'X', 'V']
+    assert mapper.fingerprint == TagsetMapper([('N', ['NOUN', 'PROP']), ('V', ['VERB', 'AUX'])], default='X',
+                                              prefix_length=4).fingerprint
+    assert mapper.fingerprint != TagsetMapper([('N', ['NOUN'])], default='X', prefix_length=4).fingerprint
+    with pytest.raises(ValueError):
+        get_tagset_mapper('klingon')